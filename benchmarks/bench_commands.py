@@ -0,0 +1,150 @@
+"""命令级基准测试 - 对本地模拟的 GitHub 计时 /pm check、/pm update <插件>、/pm update ALL
+
+用法:
+    python benchmarks/bench_commands.py --sizes 10,100,1000 --latency-ms 20
+    python benchmarks/bench_commands.py --sizes 100 --latency-ms 20 --record /tmp/cassettes
+    python benchmarks/bench_commands.py --sizes 100 --replay /tmp/cassettes --latency-scale 0.5
+
+每个规模、每个场景都使用全新的插件目录和新加载的插件管理器模块，输出墙钟时间、
+API请求数、raw下载数和 tracemalloc 峰值内存。
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_github import FakeGitHub  # noqa: E402
+from harness import (  # noqa: E402
+    Measurement, Workspace, base_config, close_providers, install_fake_github,
+    load_plugin_module, run_command, unload_plugin_module,
+)
+
+OWNER = "bench"
+SCENARIOS = ("check", "update_one", "update_all")
+
+
+def plugin_files(index: int, version: str, file_kb: int) -> Dict[str, bytes]:
+    """合成插件的文件内容"""
+    manifest = {'manifest_version': 1, 'name': f"BenchPlugin{index}", 'version': version,
+                'repository_url': f"https://github.com/{OWNER}/plugin_{index}"}
+    return {
+        '_manifest.json': json.dumps(manifest).encode("utf-8"),
+        'plugin.py': (f"# bench plugin {index} {version}\n" + "x = 1\n" * (file_kb * 1024 // 6)).encode("utf-8"),
+        'README.md': f"# BenchPlugin{index}\n".encode("utf-8"),
+    }
+
+
+def build_fixture(server: FakeGitHub, size: int, outdated_fraction: float, file_kb: int,
+                  monorepo: bool) -> Workspace:
+    """生成 size 个本地插件（均为 1.0.0），其中 outdated_fraction 比例的插件在远程为 1.1.0"""
+    workspace = Workspace()
+    outdated = int(size * outdated_fraction)
+    monorepo_files: Dict[str, bytes] = {}
+    for i in range(size):
+        remote_version = "1.1.0" if i < outdated else "1.0.0"
+        files = plugin_files(i, remote_version, file_kb)
+        if monorepo:
+            repository_url = f"https://github.com/{OWNER}/monorepo/tree/HEAD/plugin_{i}"
+            monorepo_files.update({f"plugin_{i}/{name}": content for name, content in files.items()})
+        else:
+            repository_url = f"https://github.com/{OWNER}/plugin_{i}"
+            server.add_repository(OWNER, f"plugin_{i}", files)
+        workspace.add_plugin(f"plugin_{i}", f"BenchPlugin{i}", "1.0.0", repository_url,
+                             {'plugin.py': b"# old\n"})
+    if monorepo:
+        server.add_repository(OWNER, "monorepo", monorepo_files)
+    return workspace
+
+
+async def run_scenario(args: argparse.Namespace, size: int, scenario: str) -> Dict[str, Any]:
+    server = FakeGitHub(latency=args.latency_ms / 1000, error_rate=args.error_rate,
+                        rate_limit=args.rate_limit, seed=args.seed)
+    workspace = build_fixture(server, size, args.outdated_fraction, args.file_kb, args.monorepo)
+    module = load_plugin_module(workspace)
+    config = base_config()
+    if args.replay:
+        # 回放时不启动模拟服务器，所有响应来自录制文件
+        config['transport'] = {'mode': 'replay', 'cassette': str(Path(args.replay) / f"{size}_{scenario}.json"),
+                               'latency_scale': args.latency_scale}
+        module.GitHubProvider.min_request_interval = args.request_interval
+    else:
+        install_fake_github(module, await server.start(), args.request_interval)
+        if args.record:
+            config['transport'] = {'mode': 'record', 'cassette': str(Path(args.record) / f"{size}_{scenario}.json")}
+    cmdline = {"check": "/pm check", "update_one": "/pm update BenchPlugin0", "update_all": "/pm update ALL"}[scenario]
+    try:
+        server.reset_counters()
+        with Measurement(trace_memory=not args.no_memory) as measurement:
+            (success, _, _), sent = await run_command(module, cmdline, config)
+        return {
+            'size': size, 'scenario': scenario, 'success': success,
+            'wall_seconds': round(measurement.wall_seconds, 4),
+            'api_calls': None if args.replay else server.api_calls,
+            'raw_calls': None if args.replay else server.raw_calls,
+            'errors': None if args.replay else server.errors,
+            'peak_mb': round(measurement.peak_bytes / 1024 / 1024, 2),
+            'messages': len(sent),
+        }
+    finally:
+        await close_providers(module)
+        await server.stop()
+        unload_plugin_module(module)
+        workspace.cleanup()
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    header = f"{'N':>6}  {'场景':<11} {'成功':<4} {'耗时(s)':>9} {'API':>6} {'raw':>6} {'错误':>5} {'峰值(MB)':>9}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        counts = ["-" if row[key] is None else row[key] for key in ('api_calls', 'raw_calls', 'errors')]
+        lines.append(f"{row['size']:>6}  {row['scenario']:<11} {'是' if row['success'] else '否':<4} "
+                     f"{row['wall_seconds']:>9.3f} {counts[0]:>6} {counts[1]:>6} "
+                     f"{counts[2]:>5} {row['peak_mb']:>9.2f}")
+    return "\n".join(lines)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="插件管理器命令基准测试")
+    parser.add_argument("--sizes", default="10,100,1000", help="合成插件数量，逗号分隔")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"要运行的场景: {', '.join(SCENARIOS)}")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="模拟服务器每个请求的延迟（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回502的比例")
+    parser.add_argument("--rate-limit", type=int, default=5000, help="模拟的GitHub API限额")
+    parser.add_argument("--outdated-fraction", type=float, default=0.5, help="远程有新版本的插件比例")
+    parser.add_argument("--file-kb", type=int, default=4, help="每个插件 plugin.py 的大小（KB）")
+    parser.add_argument("--monorepo", action="store_true", help="所有插件放在同一个仓库的子目录中")
+    parser.add_argument("--request-interval", type=float, default=0.0,
+                        help="GitHub API最小请求间隔（秒），默认0以测量插件管理器自身开销")
+    parser.add_argument("--record", metavar="DIR", help="把模拟服务器的响应录制到目录中（每个规模和场景一个文件）")
+    parser.add_argument("--replay", metavar="DIR", help="不启动模拟服务器，从 --record 录制的目录回放")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="回放时录制耗时的缩放倍数，0 表示不等待")
+    parser.add_argument("--no-memory", action="store_true", help="不启用tracemalloc（减少测量开销）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    return parser.parse_args(argv)
+
+
+async def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        print(f"未知场景: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+    rows = []
+    for size in sizes:
+        for scenario in scenarios:
+            rows.append(await run_scenario(args, size, scenario))
+            if not args.json:
+                print(format_table(rows[-1:]).splitlines()[-1], flush=True)
+    print(json.dumps(rows, ensure_ascii=False, indent=2) if args.json else "\n" + format_table(rows))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -0,0 +1,116 @@
+"""热重载基准测试 - 对宿主注册表的替身测量每个插件的重载耗时
+
+用法:
+    python benchmarks/bench_reload.py --sizes 10,100 --helpers 5 --file-kb 16
+
+每个合成插件由 plugin.py 和若干个被它导入的辅助模块组成。先通过 StubPluginRegistry 加载全部插件，
+再把磁盘上的代码改为新版本，逐个调用 reload_plugin_directory，检查注册的实例确实来自新代码，
+并统计每个插件的重载耗时。
+"""
+import argparse
+import asyncio
+import json
+import math
+import statistics
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from harness import (  # noqa: E402
+    StubPluginRegistry, Workspace, base_config, create_command, load_plugin_module, unload_plugin_module,
+)
+
+
+def plugin_files(index: int, version: int, helpers: int, file_kb: int) -> Dict[str, bytes]:
+    """合成插件的文件：plugin.py 通过相对导入使用 helpers 个辅助模块"""
+    filler = "x = 1\n" * (file_kb * 1024 // 6)
+    files = {f"helper_{k}.py": f"VERSION = {version}\n{filler}".encode("utf-8") for k in range(helpers)}
+    imports = "".join(f"from . import helper_{k}\n" for k in range(helpers))
+    files['plugin.py'] = (
+        "from src.plugin_system import BasePlugin, BaseCommand, register_plugin\n"
+        f"{imports}\n"
+        f"class BenchCommand{index}(BaseCommand):\n"
+        f"    command_name = 'bench_{index}'\n\n"
+        "@register_plugin\n"
+        f"class BenchPlugin{index}(BasePlugin):\n"
+        f"    plugin_name = 'bench_plugin_{index}'\n"
+        f"    VERSION = {version}\n\n"
+        "    def get_plugin_components(self):\n"
+        f"        return [BenchCommand{index}]\n\n"
+        f"{filler}"
+    ).encode("utf-8")
+    return files
+
+
+async def bench_size(size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    workspace = Workspace()
+    module = None
+    registry = StubPluginRegistry(workspace.plugins_dir)
+    try:
+        plugin_dirs = [workspace.add_plugin(f"plugin_{i}", f"BenchPlugin{i}", "1.0.0", "",
+                                            plugin_files(i, 1, args.helpers, args.file_kb))
+                       for i in range(size)]
+        for plugin_dir in plugin_dirs:
+            await registry.load(plugin_dir)
+        module = load_plugin_module(workspace)
+        module.PLUGIN_REGISTRY = registry
+        create_command(module, base_config())
+
+        for i, plugin_dir in enumerate(plugin_dirs):
+            for name, content in plugin_files(i, 2, args.helpers, args.file_kb).items():
+                (plugin_dir / name).write_bytes(content)
+
+        timings: List[float] = []
+        for plugin_dir in plugin_dirs:
+            timings.append(await module.reload_plugin_directory(registry, plugin_dir))
+
+        # 新实例和它导入的辅助模块都应来自新代码
+        reloaded = sum(1 for i in range(size)
+                       if getattr(registry.instances.get(f"bench_plugin_{i}"), 'VERSION', None) == 2
+                       and all(getattr(sys.modules.get(f"{registry.PACKAGE}.plugin_{i}.helper_{k}"), 'VERSION', None) == 2
+                               for k in range(args.helpers)))
+        timings_ms = sorted(t * 1000 for t in timings)
+        return {
+            'size': size, 'reloaded': reloaded,
+            'total_ms': round(sum(timings_ms), 3),
+            'mean_ms': round(statistics.mean(timings_ms), 3),
+            'p90_ms': round(timings_ms[max(0, math.ceil(len(timings_ms) * 0.9) - 1)], 3),
+            'max_ms': round(timings_ms[-1], 3),
+        }
+    finally:
+        if module is not None:
+            unload_plugin_module(module)
+        for name in [name for name in sys.modules if name.startswith(registry.PACKAGE)]:
+            del sys.modules[name]
+        workspace.cleanup()
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    header = f"{'N':>6} {'成功':>6} {'总计(ms)':>11} {'平均(ms)':>10} {'P90(ms)':>10} {'最大(ms)':>10}"
+    lines = [header, "-" * 60]
+    for row in rows:
+        lines.append(f"{row['size']:>6} {row['reloaded']:>6} {row['total_ms']:>11.2f} {row['mean_ms']:>10.3f}"
+                     f" {row['p90_ms']:>10.3f} {row['max_ms']:>10.3f}")
+    return "\n".join(lines)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="插件热重载基准测试")
+    parser.add_argument("--sizes", default="10,100", help="合成插件数量，逗号分隔")
+    parser.add_argument("--helpers", type=int, default=3, help="每个插件导入的辅助模块数")
+    parser.add_argument("--file-kb", type=int, default=4, help="每个模块的大小（KB）")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    return parser.parse_args(argv)
+
+
+async def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    rows = [await bench_size(int(s), args) for s in args.sizes.split(",") if s.strip()]
+    print(json.dumps(rows, ensure_ascii=False, indent=2) if args.json else format_table(rows))
+    return 0 if all(row['reloaded'] == row['size'] for row in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
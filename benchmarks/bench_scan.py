@@ -0,0 +1,185 @@
+"""扫描与设置的微基准测试 - 不涉及网络，测量大量插件时的启动与列表开销
+
+用法:
+    python benchmarks/bench_scan.py --sizes 10,100,1000,10000
+
+生成合成插件目录（manifest 大小不一、部分 manifest 为损坏的JSON、带多层资源目录），
+分别测量以下操作在冷/热页缓存下的耗时：
+
+- scan:         _scan_plugins 扫描插件目录
+- load_settings: _load_settings 读取 plugin_settings.json
+- auto_update:  读取一次设置后对所有插件调用 _get_plugin_auto_update_setting（与 /pm list 相同）
+- list:         /pm list 生成消息（包含扫描）
+- lookup:       建立插件名索引后，对拼写错误的名称给出建议（PluginIndex.suggest）
+
+冷缓存通过 posix_fadvise(DONTNEED) 逐个文件清除页缓存实现，只影响文件内容，
+目录项和inode缓存仍然是热的；以root运行并加上 --drop-caches 时改为写入
+/proc/sys/vm/drop_caches，得到完全冷的结果。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from harness import Workspace, base_config, create_command, load_plugin_module, unload_plugin_module  # noqa: E402
+
+OPERATIONS = ("scan", "load_settings", "auto_update", "list", "lookup")
+
+
+def build_tree(workspace: Workspace, size: int, args: argparse.Namespace) -> None:
+    """生成 size 个合成插件以及对应的 plugin_settings.json"""
+    rng = random.Random(args.seed)
+    auto_update: Dict[str, bool] = {}
+    last_checked: Dict[str, int] = {}
+    for i in range(size):
+        name = f"BenchPlugin{i}"
+        plugin_dir = workspace.add_plugin(f"plugin_{i}", name, "1.0.0", f"https://github.com/bench/plugin_{i}",
+                                          {'plugin.py': b"x = 1\n" * 64})
+        manifest_path = plugin_dir / "_manifest.json"
+        if rng.random() < args.broken_fraction:
+            manifest_path.write_text('{"name": "' + name + '", "version": ', encoding="utf-8")
+        else:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            manifest['description'] = "描述" * rng.randint(0, args.manifest_kb * 512)
+            manifest['keywords'] = [f"kw{k}" for k in range(rng.randint(0, 20))]
+            manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        asset_dir = plugin_dir / "assets"
+        for level in range(args.depth):
+            asset_dir = asset_dir / f"level_{level}"
+            asset_dir.mkdir(parents=True, exist_ok=True)
+            for k in range(args.assets_per_level):
+                (asset_dir / f"asset_{k}.bin").write_bytes(os.urandom(rng.randint(64, 4096)))
+        auto_update[name] = i % 2 == 0
+        last_checked[name] = int(time.time()) - i
+    settings_path = workspace.manager_dir / "plugin_settings.json"
+    settings_path.write_text(json.dumps({'auto_update': auto_update, 'last_checked': last_checked},
+                                        ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def evict_page_cache(root: Path, drop_caches: bool) -> None:
+    """尽可能让 root 下的文件离开页缓存"""
+    os.sync()
+    if drop_caches:
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            fd = os.open(os.path.join(dirpath, filename), os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+def operation(command, name: str) -> Callable[[], Any]:
+    plugins_dir = command._get_plugins_directory()
+    if name == "scan":
+        return lambda: command._scan_plugins(plugins_dir)
+    if name == "load_settings":
+        return command._load_settings
+    if name == "auto_update":
+        plugins = command._scan_plugins(plugins_dir)
+        def read_all() -> List[bool]:
+            settings = command._load_settings()
+            return [command._get_plugin_auto_update_setting(p.name, settings) for p in plugins]
+        return read_all
+    if name == "lookup":
+        index = module_index(command)
+        queries = [f"BenchPlugn{i}" for i in range(0, len(index.records), max(1, len(index.records) // 100))]
+        return lambda: [index.suggest(query) for query in queries]
+    if name == "list":
+        def render() -> None:
+            command.sent.clear()
+            asyncio.run(command._list_plugins())
+        return render
+    raise ValueError(name)
+
+
+def module_index(command):
+    """不带缓存地重新建立插件索引"""
+    if hasattr(command, '_plugin_index'):
+        del command._plugin_index
+    return command._get_plugin_index()
+
+
+def timed(func: Callable[[], Any]) -> float:
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def bench_size(size: int, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    workspace = Workspace()
+    try:
+        build_tree(workspace, size, args)
+        module = load_plugin_module(workspace)
+        command = create_command(module, base_config(logging={'level': 'ERROR'}))
+        rows = []
+        for name in args.operations:
+            func = operation(command, name)
+            evict_page_cache(workspace.plugins_dir, args.drop_caches)
+            cold = timed(func)
+            warm = [timed(func) for _ in range(args.repeat)]
+            rows.append({'size': size, 'operation': name, 'cold_ms': round(cold * 1000, 3),
+                         'warm_median_ms': round(statistics.median(warm) * 1000, 3),
+                         'warm_min_ms': round(min(warm) * 1000, 3)})
+        unload_plugin_module(module)
+        return rows
+    finally:
+        workspace.cleanup()
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    header = f"{'N':>6}  {'操作':<14}{'冷(ms)':>11}{'热中位(ms)':>13}{'热最小(ms)':>13}"
+    lines = [header, "-" * 60]
+    for row in rows:
+        lines.append(f"{row['size']:>6}  {row['operation']:<14}{row['cold_ms']:>11.2f}"
+                     f"{row['warm_median_ms']:>13.2f}{row['warm_min_ms']:>13.2f}")
+    return "\n".join(lines)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="插件扫描与设置读取的微基准测试")
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="合成插件数量，逗号分隔")
+    parser.add_argument("--operations", default=",".join(OPERATIONS), help=f"要测量的操作: {', '.join(OPERATIONS)}")
+    parser.add_argument("--broken-fraction", type=float, default=0.05, help="manifest为损坏JSON的插件比例")
+    parser.add_argument("--manifest-kb", type=int, default=4, help="manifest描述字段的最大大小（KB）")
+    parser.add_argument("--depth", type=int, default=3, help="资源目录的层数")
+    parser.add_argument("--assets-per-level", type=int, default=2, help="每层资源目录中的文件数")
+    parser.add_argument("--repeat", type=int, default=5, help="热缓存下重复测量的次数")
+    parser.add_argument("--drop-caches", action="store_true", help="通过 /proc/sys/vm/drop_caches 清空缓存（需要root）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args(argv)
+    args.operations = [s.strip() for s in args.operations.split(",") if s.strip()]
+    unknown = set(args.operations) - set(OPERATIONS)
+    if unknown:
+        parser.error(f"未知操作: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    rows: List[Dict[str, Any]] = []
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        rows.extend(bench_size(size, args))
+        if not args.json:
+            print(format_table(rows[-len(args.operations):]), flush=True)
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
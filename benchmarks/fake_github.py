@@ -0,0 +1,191 @@
+"""本地模拟的 GitHub 服务器 - 提供 contents / git trees / commits / rate_limit / raw 接口
+
+路由以 /api 代替 https://api.github.com，以 /raw 代替 https://raw.githubusercontent.com，
+由 harness 中的会话包装把插件管理器发出的请求改写到这里。
+可配置每个请求的延迟、随机错误率和API限额，并统计API与raw请求次数。
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+
+class FakeRepository:
+    """内存中的仓库：路径 -> 文件内容"""
+
+    def __init__(self, owner: str, name: str, files: Dict[str, bytes]):
+        self.owner = owner
+        self.name = name
+        self.files = files
+        self.commit = hashlib.sha1(b"".join(files[p] for p in sorted(files))).hexdigest()
+
+    @staticmethod
+    def blob_sha(content: bytes) -> str:
+        return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+    def raw_url(self, path: str) -> str:
+        return f"https://raw.githubusercontent.com/{self.owner}/{self.name}/HEAD/{path}"
+
+    def directories(self) -> List[str]:
+        dirs = set()
+        for path in self.files:
+            parts = path.split("/")[:-1]
+            for i in range(1, len(parts) + 1):
+                dirs.add("/".join(parts[:i]))
+        return sorted(dirs)
+
+    def list_directory(self, path: str) -> Optional[List[Dict]]:
+        prefix = f"{path}/" if path else ""
+        if path and path not in self.directories():
+            return None
+        entries: Dict[str, Dict] = {}
+        for file_path, content in self.files.items():
+            if not file_path.startswith(prefix):
+                continue
+            rest = file_path[len(prefix):]
+            name = rest.split("/", 1)[0]
+            if "/" in rest:
+                entries.setdefault(name, {'name': name, 'path': prefix + name, 'type': 'dir', 'size': 0,
+                                          'download_url': None, 'sha': None})
+            else:
+                entries[name] = {'name': name, 'path': file_path, 'type': 'file', 'size': len(content),
+                                 'download_url': self.raw_url(file_path), 'sha': self.blob_sha(content)}
+        return [entries[name] for name in sorted(entries)]
+
+    def tree(self) -> List[Dict]:
+        items = [{'path': d, 'type': 'tree', 'sha': None} for d in self.directories()]
+        items += [{'path': p, 'type': 'blob', 'size': len(c), 'sha': self.blob_sha(c)} for p, c in self.files.items()]
+        return sorted(items, key=lambda item: item['path'])
+
+
+class FakeGitHub:
+    """模拟 GitHub 的 aiohttp 服务器"""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, rate_limit: int = 5000, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.reset_at = int(time.time()) + 3600
+        self.random = random.Random(seed)
+        self.repositories: Dict[str, FakeRepository] = {}
+        self.api_calls = 0
+        self.raw_calls = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    def add_repository(self, owner: str, name: str, files: Dict[str, bytes]) -> FakeRepository:
+        repo = FakeRepository(owner, name, files)
+        self.repositories[f"{owner}/{name}"] = repo
+        return repo
+
+    def reset_counters(self) -> None:
+        self.api_calls = self.raw_calls = self.errors = self.bytes_sent = 0
+        self.remaining = self.rate_limit
+
+    # ---- 服务器生命周期 ----
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/api/rate_limit", self._rate_limit)
+        app.router.add_get("/api/repos/{owner}/{repo}/contents/{path:.*}", self._contents)
+        app.router.add_get("/api/repos/{owner}/{repo}/git/trees/{ref}", self._trees)
+        app.router.add_get("/api/repos/{owner}/{repo}/commits/{ref}", self._commits)
+        app.router.add_get("/raw/{owner}/{repo}/{ref}/{path:.*}", self._raw)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{bound_port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # ---- 公共处理 ----
+
+    def _rate_headers(self) -> Dict[str, str]:
+        return {'X-RateLimit-Limit': str(self.rate_limit), 'X-RateLimit-Remaining': str(self.remaining),
+                'X-RateLimit-Reset': str(self.reset_at)}
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        is_api = request.path.startswith("/api/")
+        if is_api:
+            self.api_calls += 1
+        else:
+            self.raw_calls += 1
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=502, text="bad gateway")
+        if is_api and request.path != "/api/rate_limit":
+            if self.remaining <= 0:
+                return web.json_response({'message': 'API rate limit exceeded'}, status=403,
+                                         headers=self._rate_headers())
+            self.remaining -= 1
+        response = await handler(request)
+        if is_api:
+            response.headers.update(self._rate_headers())
+        if response.body is not None:
+            self.bytes_sent += len(response.body)
+        return response
+
+    def _json(self, request: web.Request, data) -> web.Response:
+        body = json.dumps(data).encode("utf-8")
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(body=body, content_type="application/json", headers={'ETag': etag})
+
+    def _repository(self, request: web.Request) -> FakeRepository:
+        repo = self.repositories.get(f"{request.match_info['owner']}/{request.match_info['repo']}")
+        if repo is None:
+            raise web.HTTPNotFound(text=json.dumps({'message': 'Not Found'}), content_type="application/json")
+        return repo
+
+    # ---- 路由 ----
+
+    async def _rate_limit(self, request: web.Request) -> web.Response:
+        core = {'limit': self.rate_limit, 'remaining': self.remaining, 'reset': self.reset_at}
+        return web.json_response({'resources': {'core': core}, 'rate': core})
+
+    async def _contents(self, request: web.Request) -> web.Response:
+        repo = self._repository(request)
+        path = request.match_info['path'].strip("/")
+        if path in repo.files:
+            content = repo.files[path]
+            return self._json(request, {'name': path.rsplit("/", 1)[-1], 'path': path, 'type': 'file',
+                                        'size': len(content), 'sha': repo.blob_sha(content),
+                                        'encoding': 'base64', 'content': base64.b64encode(content).decode(),
+                                        'download_url': repo.raw_url(path)})
+        listing = repo.list_directory(path)
+        if listing is None:
+            raise web.HTTPNotFound(text=json.dumps({'message': 'Not Found'}), content_type="application/json")
+        return self._json(request, listing)
+
+    async def _trees(self, request: web.Request) -> web.Response:
+        repo = self._repository(request)
+        return self._json(request, {'sha': repo.commit, 'tree': repo.tree(), 'truncated': False})
+
+    async def _commits(self, request: web.Request) -> web.Response:
+        repo = self._repository(request)
+        return self._json(request, {'sha': repo.commit})
+
+    async def _raw(self, request: web.Request) -> web.Response:
+        repo = self._repository(request)
+        content = repo.files.get(request.match_info['path'])
+        if content is None:
+            raise web.HTTPNotFound(text="404: Not Found")
+        return web.Response(body=content, content_type="application/octet-stream")
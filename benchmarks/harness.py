@@ -0,0 +1,253 @@
+"""基准测试公共部分 - 在宿主之外加载插件管理器并执行命令
+
+- 把 stubs 目录加入 sys.path，替代 MaiBot 的 src.plugin_system
+- 在临时目录中生成插件目录（插件管理器副本 + N 个合成插件）
+- 改写会话请求地址，把 GitHub 的请求发往本地的 FakeGitHub
+- 提供宿主插件注册表的替身，用于测量热重载
+"""
+import gc
+import importlib.util
+import itertools
+import json
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+STUBS_DIR = BENCH_DIR / "stubs"
+
+if str(STUBS_DIR) not in sys.path:
+    sys.path.insert(0, str(STUBS_DIR))
+
+_module_counter = itertools.count()
+
+
+class FakeChatStream:
+    def __init__(self, user_id: str, stream_type: str = "private"):
+        self.stream_id = f"{stream_type}:{user_id}"
+        self.user_id = user_id
+        self.type = stream_type
+
+
+class FakeMessage:
+    def __init__(self, user_id: str = "10000"):
+        self.chat_stream = FakeChatStream(user_id)
+
+
+def base_config(**overrides: Any) -> Dict[str, Any]:
+    """基准测试使用的插件配置：管理员为 10000，关闭共享缓存和追踪，日志只保留警告"""
+    config: Dict[str, Any] = {
+        'plugin': {'enabled': True},
+        'admin': {'qq_list': [10000]},
+        'cache': {'enabled': False},
+        'quota': {'enabled': True, 'reserve_calls': 0},
+        'logging': {'level': 'WARNING'},
+        'tracing': {'enabled': False},
+    }
+    for section, values in overrides.items():
+        config.setdefault(section, {}).update(values)
+    return config
+
+
+class Workspace:
+    """临时插件目录：plugins/Plugin_manager/plugin.py 以及合成插件 plugins/plugin_{i}"""
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = Path(root) if root else Path(tempfile.mkdtemp(prefix="pm_bench_"))
+        self.plugins_dir = self.root / "plugins"
+        self.manager_dir = self.plugins_dir / "Plugin_manager"
+        self.manager_dir.mkdir(parents=True, exist_ok=True)
+        shutil.copy(REPO_ROOT / "plugin.py", self.manager_dir / "plugin.py")
+        # 插件管理器自身不参与检查，避免向真实仓库发请求
+        manifest = json.loads((REPO_ROOT / "_manifest.json").read_text(encoding="utf-8"))
+        manifest['repository_url'] = ""
+        (self.manager_dir / "_manifest.json").write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+
+    def add_plugin(self, directory: str, name: str, version: str = "1.0.0", repository_url: str = "",
+                   files: Optional[Dict[str, bytes]] = None) -> Path:
+        plugin_dir = self.plugins_dir / directory
+        plugin_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {'manifest_version': 1, 'name': name, 'version': version, 'repository_url': repository_url}
+        (plugin_dir / "_manifest.json").write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        for file_name, content in (files or {}).items():
+            (plugin_dir / file_name).write_bytes(content)
+        return plugin_dir
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def load_plugin_module(workspace: Workspace):
+    """以独立的模块名加载工作区中的插件管理器，模块级状态（连接池、指标等）互不影响"""
+    module_name = f"pm_bench_plugin_{next(_module_counter)}"
+    spec = importlib.util.spec_from_file_location(module_name, workspace.manager_dir / "plugin.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def unload_plugin_module(module) -> None:
+    sys.modules.pop(module.__name__, None)
+
+
+class RewritingSession:
+    """包装 aiohttp 会话，把 GitHub 的地址改写到本地服务器，其余接口原样转发"""
+
+    def __init__(self, session, base_url: str):
+        self._session = session
+        self._rewrites = [
+            ("https://api.github.com/", f"{base_url}/api/"),
+            ("https://raw.githubusercontent.com/", f"{base_url}/raw/"),
+        ]
+
+    def _rewrite(self, url: str) -> str:
+        for prefix, target in self._rewrites:
+            if url.startswith(prefix):
+                return target + url[len(prefix):]
+        return url
+
+    def get(self, url: str, **kwargs: Any):
+        return self._session.get(self._rewrite(str(url)), **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._session, name)
+
+
+def install_fake_github(module, base_url: str, request_interval: float = 0.0) -> None:
+    """让插件管理器的所有提供者通过 RewritingSession 访问本地服务器
+
+    包装的是底层会话，录制模式下录制文件中保存的仍是原始的 GitHub 地址。
+    """
+    original = module.SourceProvider._create_session
+
+    def _create_session(provider):
+        return RewritingSession(original(provider), base_url)
+
+    module.SourceProvider._create_session = _create_session
+    module.GitHubProvider.min_request_interval = request_interval
+
+
+async def close_providers(module) -> None:
+    for provider in list(module._SOURCE_PROVIDERS.values()):
+        await provider.close()
+    module._SOURCE_PROVIDERS.clear()
+
+
+def create_command(module, config: Dict[str, Any], user_id: str = "10000"):
+    """创建一个命令实例并应用日志/追踪配置，用于直接调用命令内部的方法"""
+    command = module.PluginManagerCommand(message=FakeMessage(user_id), plugin_config=config)
+    module._configure_logging(command.get_config)
+    module.TRACER.configure(command.get_config)
+    return command
+
+
+async def run_command(module, cmdline: str, config: Dict[str, Any],
+                      user_id: str = "10000") -> Tuple[Tuple[bool, Optional[str], bool], List[str]]:
+    """执行一条 /pm 命令，返回 (命令返回值, 发送的消息列表)"""
+    command = module.PluginManagerCommand(message=FakeMessage(user_id), plugin_config=config)
+    match = re.match(module.PluginManagerCommand.command_pattern, cmdline)
+    command.matched_groups = match.groupdict() if match else {}
+    result = await command.execute()
+    return result, command.sent
+
+
+class StubPluginRegistry:
+    """宿主插件注册表的替身，接口与插件管理器的 PluginRegistry 一致
+
+    插件模块以 bench_plugins.<目录名>.plugin 导入，register_plugin 登记的插件类在注册时实例化，
+    组件保存在 components 中。
+    """
+
+    PACKAGE = "bench_plugins"
+
+    def __init__(self, plugins_dir: Path):
+        self.plugins_dir = Path(plugins_dir).resolve()
+        self.plugin_paths: Dict[str, str] = {}
+        self.instances: Dict[str, Any] = {}
+        self.components: Dict[str, List[Any]] = {}
+
+    def registered_names(self, plugin_dir: Path) -> List[str]:
+        target = str(Path(plugin_dir).resolve())
+        return [name for name, path in self.plugin_paths.items() if path == target]
+
+    async def unregister(self, plugin_name: str) -> bool:
+        self.plugin_paths.pop(plugin_name, None)
+        self.instances.pop(plugin_name, None)
+        return self.components.pop(plugin_name, None) is not None
+
+    def import_plugin(self, plugin_dir: Path) -> bool:
+        from src.plugin_system import registered_plugins
+
+        plugin_dir = Path(plugin_dir).resolve()
+        if self.PACKAGE not in sys.modules:
+            root = types.ModuleType(self.PACKAGE)
+            root.__path__ = [str(self.plugins_dir)]
+            sys.modules[self.PACKAGE] = root
+        package_name = f"{self.PACKAGE}.{plugin_dir.name}"
+        if package_name not in sys.modules:
+            package = types.ModuleType(package_name)
+            package.__path__ = [str(plugin_dir)]
+            sys.modules[package_name] = package
+        module_name = f"{package_name}.plugin"
+        spec = importlib.util.spec_from_file_location(module_name, plugin_dir / "plugin.py")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except Exception:
+            sys.modules.pop(module_name, None)
+            return False
+        for name, cls in registered_plugins.items():
+            if cls.__module__ == module_name:
+                self.plugin_paths[name] = str(plugin_dir)
+        return True
+
+    async def register(self, plugin_name: str) -> bool:
+        from src.plugin_system import registered_plugins
+
+        cls = registered_plugins.get(plugin_name)
+        if cls is None or plugin_name not in self.plugin_paths:
+            return False
+        instance = cls(plugin_dir=self.plugin_paths[plugin_name], config={})
+        self.instances[plugin_name] = instance
+        self.components[plugin_name] = instance.get_plugin_components()
+        return True
+
+    async def load(self, plugin_dir: Path) -> List[str]:
+        """首次加载插件目录，返回注册的插件名"""
+        if not self.import_plugin(plugin_dir):
+            return []
+        names = self.registered_names(plugin_dir)
+        for name in names:
+            await self.register(name)
+        return names
+
+
+class Measurement:
+    """记录一段代码的耗时和 tracemalloc 峰值内存"""
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.wall_seconds = 0.0
+        self.peak_bytes = 0
+
+    def __enter__(self) -> "Measurement":
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.start()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.wall_seconds = time.perf_counter() - self._started
+        if self.trace_memory:
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
@@ -0,0 +1,66 @@
+"""基准测试用的 src.plugin_system 替身 - 只实现插件管理器用到的部分"""
+from typing import Any, Dict, List, Optional
+
+
+def _lookup(config: Dict[str, Any], key: str, default: Any = None) -> Any:
+    current: Any = config
+    for part in key.split("."):
+        if not isinstance(current, dict) or part not in current:
+            return default
+        current = current[part]
+    return current
+
+
+class ComponentInfo:
+    def __init__(self, name: str = ""):
+        self.name = name
+
+
+class ConfigField:
+    def __init__(self, type: Any = None, default: Any = None, description: str = "", **kwargs: Any):
+        self.type = type
+        self.default = default
+        self.description = description
+
+
+class BasePlugin:
+    def __init__(self, plugin_dir: Optional[str] = None, config: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        self.plugin_dir = plugin_dir
+        self.config = config or {}
+
+    def get_config(self, key: str, default: Any = None) -> Any:
+        return _lookup(self.config, key, default)
+
+
+# register_plugin 登记的插件类: 插件名 -> 类，供 harness.StubPluginRegistry 重新注册
+registered_plugins: Dict[str, type] = {}
+
+
+def register_plugin(cls):
+    registered_plugins[getattr(cls, 'plugin_name', None) or cls.__name__] = cls
+    return cls
+
+
+class BaseCommand:
+    """命令基类替身，send_text 的内容保存在 sent 中"""
+
+    command_name = ""
+    command_description = ""
+    command_pattern = ""
+
+    def __init__(self, message: Any = None, plugin_config: Optional[Dict[str, Any]] = None):
+        self.message = message
+        self.plugin_config = plugin_config or {}
+        self.matched_groups: Dict[str, Any] = {}
+        self.sent: List[str] = []
+
+    def get_config(self, key: str, default: Any = None) -> Any:
+        return _lookup(self.plugin_config, key, default)
+
+    async def send_text(self, text: str) -> bool:
+        self.sent.append(text)
+        return True
+
+    @classmethod
+    def get_command_info(cls) -> ComponentInfo:
+        return ComponentInfo(cls.command_name)
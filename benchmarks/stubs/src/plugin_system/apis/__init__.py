@@ -0,0 +1,16 @@
+"""基准测试用的 chat_api / person_api 替身"""
+from typing import Any, Dict
+
+
+class chat_api:
+    @staticmethod
+    def get_stream_info(chat_stream: Any) -> Dict[str, Any]:
+        return {'user_id': getattr(chat_stream, 'user_id', None)}
+
+    @staticmethod
+    def get_stream_type(chat_stream: Any) -> str:
+        return getattr(chat_stream, 'type', 'private')
+
+
+class person_api:
+    pass
@@ -2,13 +2,27 @@
 import os
 import json
 import aiohttp
+from aiohttp import web
 import asyncio
 import shutil
 import tempfile
 import ssl
 import time
 import base64
-from typing import List, Tuple, Type, Optional, Dict, Any
+import random
+import re
+import contextvars
+import contextlib
+import collections
+import functools
+import logging
+import logging.handlers
+import queue
+import sys
+import atexit
+import importlib
+import inspect
+from typing import List, Tuple, Type, Optional, Dict, Any, Callable, Awaitable, Union, Set, FrozenSet
 from pathlib import Path
 
 from src.plugin_system import (
@@ -23,6 +37,3087 @@ from src.plugin_system.apis import chat_api, person_api
 # 插件管理器版本
 PLUGIN_MANAGER_VERSION = "1.1.2"
 
+
+# ---- 日志 ----
+# 所有日志都在 plugin_manager 下按子系统划分，经队列交给后台线程输出，调用方不会阻塞在标准输出上
+
+LOGGER_NAME = "plugin_manager"
+LOG_SUBSYSTEMS = ("command", "network", "sources", "cache", "update", "services")
+PLAIN_LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+
+class JsonLogFormatter(logging.Formatter):
+    """每条日志输出为一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _setup_log_queue() -> Tuple[logging.Handler, logging.handlers.QueueListener]:
+    """为 plugin_manager 日志器安装队列处理器，重复加载模块时替换旧的监听线程"""
+    root_logger = logging.getLogger(LOGGER_NAME)
+    previous = getattr(root_logger, "_plugin_manager_listener", None)
+    if previous is not None:
+        atexit.unregister(previous.stop)
+        previous.stop()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    output_handler = logging.StreamHandler(sys.stdout)
+    output_handler.setFormatter(logging.Formatter(PLAIN_LOG_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, output_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(logging.INFO)
+    root_logger.propagate = False
+    root_logger._plugin_manager_listener = listener
+    return output_handler, listener
+
+
+_LOG_OUTPUT_HANDLER, _LOG_LISTENER = _setup_log_queue()
+_LOGGING_CONFIG: Optional[Tuple] = None
+
+
+def _configure_logging(get_config: Callable[..., Any]) -> None:
+    """按配置设置日志级别、需要调试输出的子系统和输出格式，配置未变化时直接返回"""
+    global _LOGGING_CONFIG
+    level = str(get_config("logging.level", "INFO")).upper()
+    json_output = bool(get_config("logging.json", False))
+    debug_subsystems = tuple(sorted(str(name) for name in get_config("logging.debug_subsystems", [])))
+    config = (level, json_output, debug_subsystems)
+    if config == _LOGGING_CONFIG:
+        return
+    _LOGGING_CONFIG = config
+    logging.getLogger(LOGGER_NAME).setLevel(getattr(logging, level, logging.INFO))
+    for name in LOG_SUBSYSTEMS:
+        logging.getLogger(f"{LOGGER_NAME}.{name}").setLevel(logging.DEBUG if name in debug_subsystems else logging.NOTSET)
+    _LOG_OUTPUT_HANDLER.setFormatter(JsonLogFormatter() if json_output else logging.Formatter(PLAIN_LOG_FORMAT))
+
+
+command_logger = logging.getLogger(f"{LOGGER_NAME}.command")
+network_logger = logging.getLogger(f"{LOGGER_NAME}.network")
+source_logger = logging.getLogger(f"{LOGGER_NAME}.sources")
+cache_logger = logging.getLogger(f"{LOGGER_NAME}.cache")
+update_logger = logging.getLogger(f"{LOGGER_NAME}.update")
+service_logger = logging.getLogger(f"{LOGGER_NAME}.services")
+
+
+class RetryPolicy:
+    """网络请求重试策略 - 按错误类型分别配置，带上限的指数退避和随机抖动"""
+
+    # 错误类型 -> (最大尝试次数, 基础等待秒数, 最大等待秒数)
+    DEFAULT_RULES: Dict[str, Tuple[int, float, float]] = {
+        "timeout": (3, 1.0, 10.0),
+        "server_error": (4, 1.0, 30.0),
+        "secondary_rate_limit": (3, 30.0, 120.0),
+        "connection_reset": (4, 0.5, 8.0),
+    }
+    SERVER_ERROR_STATUSES = {500, 502, 503, 504}
+
+    def __init__(self, rules: Optional[Dict[str, Tuple[int, float, float]]] = None):
+        self.rules = dict(self.DEFAULT_RULES)
+        if rules:
+            self.rules.update(rules)
+
+    def max_attempts(self, error_class: str) -> int:
+        """获取某类错误的最大尝试次数（包含首次请求）"""
+        return self.rules.get(error_class, (1, 0.0, 0.0))[0]
+
+    def classify_exception(self, exc: BaseException) -> Optional[str]:
+        """将异常归类为可重试的错误类型，不可重试时返回None"""
+        if isinstance(exc, asyncio.TimeoutError):
+            return "timeout"
+        if isinstance(exc, (aiohttp.ServerDisconnectedError, aiohttp.ClientPayloadError,
+                            aiohttp.ClientConnectionError, ConnectionResetError)):
+            return "connection_reset"
+        return None
+
+    async def classify_response(self, response: aiohttp.ClientResponse) -> Optional[str]:
+        """将HTTP响应归类为可重试的错误类型，成功或不可重试时返回None"""
+        if response.status in self.SERVER_ERROR_STATUSES:
+            return "server_error"
+        if response.status == 429:
+            return "secondary_rate_limit"
+        if response.status == 403:
+            if response.headers.get('Retry-After'):
+                return "secondary_rate_limit"
+            # 主限额耗尽时只在重置时间落在等待上限内时才重试
+            if response.headers.get('X-RateLimit-Remaining') == '0':
+                wait = self.parse_rate_limit_reset(response.headers)
+                max_delay = self.rules["secondary_rate_limit"][2]
+                return "secondary_rate_limit" if wait is not None and wait <= max_delay else None
+            try:
+                body = (await response.text()).lower()
+            except Exception:
+                return None
+            if "secondary rate limit" in body or "abuse" in body:
+                return "secondary_rate_limit"
+        return None
+
+    @staticmethod
+    def parse_retry_after(headers) -> Optional[float]:
+        """解析Retry-After头（秒数或HTTP日期）"""
+        value = headers.get('Retry-After') if headers else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            from email.utils import parsedate_to_datetime
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except Exception:
+            return None
+
+    @staticmethod
+    def parse_rate_limit_reset(headers) -> Optional[float]:
+        """解析X-RateLimit-Reset头，返回距离重置的秒数"""
+        value = headers.get('X-RateLimit-Reset') if headers else None
+        try:
+            return max(0.0, float(value) - time.time()) if value else None
+        except ValueError:
+            return None
+
+    def compute_delay(self, error_class: str, attempt: int, headers=None) -> Optional[float]:
+        """计算第attempt次失败后的等待时间，服务器要求的等待超过上限时返回None表示放弃"""
+        _, base_delay, max_delay = self.rules[error_class]
+        # 全抖动: 在 [0, min(上限, 基础 * 2^(n-1))] 中随机取值，避免多个实例同步重试
+        delay = random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+        server_wait = self.parse_retry_after(headers)
+        if server_wait is None and error_class == "secondary_rate_limit":
+            server_wait = self.parse_rate_limit_reset(headers)
+        if server_wait is not None:
+            if server_wait > max_delay:
+                return None
+            delay = server_wait + random.uniform(0, base_delay)
+        return delay
+
+
+# 所有网络请求共用的默认重试策略
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+# 流式下载时每次写入磁盘的块大小
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class DownloadSizeExceeded(Exception):
+    """下载内容超过单文件或单次更新的大小上限"""
+
+
+class DownloadBudget:
+    """单次插件更新的下载字节预算，同时限制单个文件大小和本次更新的总大小"""
+
+    def __init__(self, max_file_bytes: int, max_total_bytes: int):
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.used_bytes = 0
+
+    def check_file_size(self, file_name: str, size: Optional[int]) -> None:
+        """在下载前根据已知大小（文件列表或Content-Length）检查单文件上限"""
+        if size is not None and self.max_file_bytes and size > self.max_file_bytes:
+            raise DownloadSizeExceeded(
+                f"文件 {file_name} 大小 {size} 字节超过单文件上限 {self.max_file_bytes} 字节"
+            )
+
+    def consume(self, file_name: str, file_bytes: int, chunk_bytes: int) -> None:
+        """记录新写入的字节，file_bytes 为该文件累计写入的字节数"""
+        self.check_file_size(file_name, file_bytes)
+        self.used_bytes += chunk_bytes
+        if self.max_total_bytes and self.used_bytes > self.max_total_bytes:
+            raise DownloadSizeExceeded(
+                f"下载文件 {file_name} 时本次更新下载量超过上限 {self.max_total_bytes} 字节"
+            )
+
+    def release(self, chunk_bytes: int) -> None:
+        """服务器不支持续传而需要从头下载时，退回已计入的字节"""
+        self.used_bytes = max(0, self.used_bytes - chunk_bytes)
+
+
+class MirrorStats:
+    """各下载镜像的延迟统计 - 持久化到磁盘，用于镜像排序和对冲请求的触发时间"""
+
+    MAX_SAMPLES = 50
+    FAILURE_PENALTY = 30.0  # 失败按30秒记录，让不可用的镜像自然排到后面
+    DEFAULT_HEDGE_DELAY = 2.0  # 样本不足时的对冲等待秒数
+    MIN_SAMPLES_FOR_P90 = 5
+
+    def __init__(self, stats_file: Path):
+        self.stats_file = stats_file
+        self._samples: Optional[Dict[str, List[float]]] = None
+        self._dirty = False
+
+    def _load(self) -> Dict[str, List[float]]:
+        if self._samples is None:
+            self._samples = {}
+            if self.stats_file.exists():
+                try:
+                    with open(self.stats_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    self._samples = {k: [float(x) for x in v][-self.MAX_SAMPLES:] for k, v in data.items()}
+                except Exception as e:
+                    cache_logger.warning(f"读取镜像统计文件失败: {e}")
+        return self._samples
+
+    def record(self, key: str, latency: float, ok: bool = True) -> None:
+        """记录一次请求的首字节延迟，失败时记为惩罚值"""
+        samples = self._load().setdefault(key, [])
+        samples.append(latency if ok else max(latency, self.FAILURE_PENALTY))
+        del samples[:-self.MAX_SAMPLES]
+        self._dirty = True
+
+    def percentile(self, key: str, q: float) -> Optional[float]:
+        samples = sorted(self._load().get(key, []))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(q * (len(samples) - 1))))
+        return samples[index]
+
+    def hedge_delay(self, key: str) -> float:
+        """对冲等待时间: 当前镜像的p90延迟，样本不足时使用默认值"""
+        if len(self._load().get(key, [])) < self.MIN_SAMPLES_FOR_P90:
+            return self.DEFAULT_HEDGE_DELAY
+        return min(10.0, max(0.2, self.percentile(key, 0.9)))
+
+    def order(self, keys: List[str]) -> List[str]:
+        """按中位延迟从快到慢排序，没有样本的镜像保持配置顺序并优先尝试"""
+        position = {key: i for i, key in enumerate(keys)}
+        def sort_key(key: str) -> Tuple[float, int]:
+            median = self.percentile(key, 0.5)
+            return (-1.0 if median is None else median, position[key])
+        return sorted(keys, key=sort_key)
+
+    def save(self) -> None:
+        if not self._dirty or self._samples is None:
+            return
+        try:
+            with open(self.stats_file, 'w', encoding='utf-8') as f:
+                json.dump(self._samples, f, ensure_ascii=False, indent=2)
+            self._dirty = False
+        except Exception as e:
+            cache_logger.warning(f"保存镜像统计文件失败: {e}")
+
+
+MIRROR_STATS = MirrorStats(Path(__file__).parent / "mirror_stats.json")
+
+# 镜像模板中可用的占位符: {owner} {repo} {ref} {path} {raw_url}
+RAW_GITHUB_URL_TEMPLATE = "https://raw.githubusercontent.com/{owner}/{repo}/{ref}/{path}"
+GITHUB_HOSTS = ("github.com", "api.github.com", "raw.githubusercontent.com")
+
+
+class MetricsRegistry:
+    """进程内指标 - 计数器、直方图和仪表，可按 Prometheus 文本格式输出
+
+    每个指标可带标签，同名指标的不同标签组合分别统计。仪表也可以注册为回调，在输出时再取值。
+    """
+
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+    def __init__(self):
+        self._types: Dict[str, Tuple[str, str]] = {}  # 指标名 -> (类型, 说明)
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._values: Dict[str, Dict[Tuple[Tuple[str, str], ...], Any]] = {}
+        self._callbacks: Dict[str, Callable[[], float]] = {}
+
+    def describe(self, name: str, metric_type: str, help_text: str,
+                 buckets: Optional[Tuple[float, ...]] = None) -> None:
+        self._types[name] = (metric_type, help_text)
+        if metric_type == "histogram":
+            self._buckets[name] = buckets or self.DEFAULT_BUCKETS
+        self._values.setdefault(name, {})
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        if name not in self._types:
+            self.describe(name, "counter", "")
+        series = self._values[name]
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        self._values.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def set_callback(self, name: str, callback: Callable[[], float]) -> None:
+        """注册在输出时才取值的仪表"""
+        self._callbacks[name] = callback
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        buckets = self._buckets.get(name, self.DEFAULT_BUCKETS)
+        key = tuple(sorted(labels.items()))
+        series = self._values.setdefault(name, {})
+        state = series.get(key)
+        if state is None:
+            state = series[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                state['buckets'][i] += 1
+        state['sum'] += value
+        state['count'] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels: str):
+        """记录代码块耗时到直方图"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started, **labels)
+
+    def get(self, name: str) -> Dict[Tuple[Tuple[str, str], ...], Any]:
+        """某个指标所有标签组合的当前值"""
+        if name in self._callbacks:
+            return {(): self._callbacks[name]()}
+        return dict(self._values.get(name, {}))
+
+    def histogram_summary(self, name: str) -> Tuple[int, float, Optional[float]]:
+        """合并所有标签后的 (次数, 平均值, p90上界)"""
+        buckets = self._buckets.get(name, self.DEFAULT_BUCKETS)
+        count, total, merged = 0, 0.0, [0] * len(buckets)
+        for state in self._values.get(name, {}).values():
+            count += state['count']
+            total += state['sum']
+            merged = [a + b for a, b in zip(merged, state['buckets'])]
+        if not count:
+            return 0, 0.0, None
+        p90 = next((bound for bound, n in zip(buckets, merged) if n >= count * 0.9), None)
+        return count, total / count, p90
+
+    @staticmethod
+    def _format_labels(key: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+        parts = [f'{k}="{str(v)}"' for k, v in key] + ([extra] if extra else [])
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        lines = []
+        for name, (metric_type, help_text) in self._types.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for key, value in self.get(name).items():
+                if metric_type != "histogram":
+                    lines.append(f"{name}{self._format_labels(key)} {value}")
+                    continue
+                for bound, n in zip(self._buckets[name], value['buckets']):
+                    bucket_labels = self._format_labels(key, f'le="{bound}"')
+                    lines.append(f"{name}_bucket{bucket_labels} {n}")
+                bucket_labels = self._format_labels(key, 'le="+Inf"')
+                lines.append(f"{name}_bucket{bucket_labels} {value['count']}")
+                lines.append(f"{name}_sum{self._format_labels(key)} {value['sum']}")
+                lines.append(f"{name}_count{self._format_labels(key)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+METRICS.describe("plugin_manager_http_requests_total", "counter", "插件源HTTP请求数（按提供者和状态码）")
+METRICS.describe("plugin_manager_download_bytes_total", "counter", "下载的字节数")
+METRICS.describe("plugin_manager_cache_hits_total", "counter", "共享缓存和ETag命中次数")
+METRICS.describe("plugin_manager_retries_total", "counter", "网络重试次数")
+METRICS.describe("plugin_manager_index_hits_total", "counter", "从插件索引获取版本的次数")
+METRICS.describe("plugin_manager_check_seconds", "histogram", "检查单个插件远程版本的耗时")
+METRICS.describe("plugin_manager_update_seconds", "histogram", "更新单个插件的耗时")
+METRICS.describe("plugin_manager_download_seconds", "histogram", "下载单个文件的耗时")
+METRICS.describe("plugin_manager_github_quota_remaining", "gauge", "GitHub API剩余请求次数")
+METRICS.describe("plugin_manager_pending_jobs", "gauge", "等待执行的后台任务数（推迟的检查和Webhook更新）")
+METRICS.describe("plugin_manager_reload_seconds", "histogram", "热重载单个插件的耗时")
+
+
+class TraceSpan:
+    """一段计时区间，包含名称、开始时间、耗时、属性和子区间"""
+
+    __slots__ = ("name", "attributes", "start", "wall_start", "duration", "children")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.start = time.monotonic()
+        self.wall_start = time.time()
+        self.duration: Optional[float] = None
+        self.children: List["TraceSpan"] = []
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'start': self.wall_start,
+            'duration': self.duration,
+            'attributes': self.attributes,
+            'children': [child.to_dict() for child in self.children],
+        }
+
+
+class Tracer:
+    """轻量的命令执行追踪 - 嵌套计时区间，最近的若干次追踪保存在环形缓冲区中
+
+    没有父区间时开启的区间即为一次追踪的根，结束后放入缓冲区。并发的子任务会继承创建时的当前区间。
+    """
+
+    def __init__(self, capacity: int = 20):
+        self.enabled = True
+        self.traces: collections.deque = collections.deque(maxlen=capacity)
+        self._current: contextvars.ContextVar[Optional[TraceSpan]] = contextvars.ContextVar("pm_trace_span", default=None)
+
+    def configure(self, get_config: Callable[..., Any]) -> None:
+        self.enabled = bool(get_config("tracing.enabled", True))
+        capacity = max(1, int(get_config("tracing.buffer_size", 20)))
+        if capacity != self.traces.maxlen:
+            self.traces = collections.deque(self.traces, maxlen=capacity)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes: Any):
+        if not self.enabled:
+            yield TraceSpan(name, attributes)
+            return
+        parent = self._current.get()
+        span = TraceSpan(name, attributes)
+        if parent is not None:
+            parent.children.append(span)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.duration = time.monotonic() - span.start
+            self._current.reset(token)
+            if parent is None:
+                self.traces.append(span)
+
+    def annotate(self, **attributes: Any) -> None:
+        """给当前区间添加属性（没有进行中的区间时忽略）"""
+        span = self._current.get()
+        if span is not None:
+            span.set(**attributes)
+
+    def traced(self, name: str, attributes: Optional[Callable[..., Dict[str, Any]]] = None):
+        """装饰器: 把函数（同步或异步）的每次调用记录为一个区间，attributes 根据调用参数生成属性"""
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name, **(attributes(*args, **kwargs) if attributes else {})):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name, **(attributes(*args, **kwargs) if attributes else {})):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def export_jsonl(self, path: Path) -> int:
+        """把缓冲区中的追踪按每行一条写入JSONL文件，返回条数"""
+        traces = list(self.traces)
+        with open(path, 'w', encoding='utf-8') as f:
+            for trace in traces:
+                f.write(json.dumps(trace.to_dict(), ensure_ascii=False) + "\n")
+        return len(traces)
+
+    @staticmethod
+    def format_waterfall(trace: TraceSpan, width: int = 20, max_rows: int = 40) -> str:
+        """用文本条形图展示各区间相对根区间的开始位置和耗时"""
+        total = trace.duration or 1e-9
+        rows: List[str] = []
+        hidden = 0
+
+        def walk(span: TraceSpan, depth: int) -> None:
+            nonlocal hidden
+            if len(rows) >= max_rows:
+                hidden += 1
+            else:
+                offset = min(width - 1, int((span.start - trace.start) / total * width))
+                length = max(1, min(width - offset, round((span.duration or 0) / total * width)))
+                details = " ".join(f"{k}={v}" for k, v in span.attributes.items() if v not in ("", None))
+                bar = " " * offset + "█" * length + " " * (width - offset - length)
+                rows.append(f"`{bar}` {(span.duration or 0) * 1000:.0f}ms {'  ' * depth}{span.name} {details}".rstrip())
+            for child in span.children:
+                walk(child, depth + 1)
+
+        walk(trace, 0)
+        if hidden:
+            rows.append(f"… 另有 {hidden} 个区间未显示")
+        return "\n".join(rows)
+
+
+TRACER = Tracer()
+
+
+# 当前命令执行期间的网络统计（重试次数等），每条命令在 execute 开始时重新设置
+_REQUEST_STATS: contextvars.ContextVar[Dict[str, int]] = contextvars.ContextVar("pm_request_stats")
+
+# 当前任务中最近一次插件源返回的错误状态码，局域网缓存服务据此区分“不存在”和“上游故障”
+_UPSTREAM_ERROR_STATUS: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("pm_upstream_error_status",
+                                                                                     default=None)
+
+# 为True时GitHub不使用配置的镜像（镜像/CDN在推送后的一段时间内可能仍返回旧内容），Webhook触发的检查和更新使用
+_BYPASS_MIRRORS: contextvars.ContextVar[bool] = contextvars.ContextVar("pm_bypass_mirrors", default=False)
+
+# 收到Webhook通知后远程版本已过期的仓库地址，下次检查时绕过插件索引、共享缓存和镜像直接查询API
+_STALE_REPOSITORIES: Set[str] = set()
+
+
+def _count_request_stat(name: str, amount: int = 1) -> None:
+    """为当前命令累加一项网络统计"""
+    METRICS.inc(f"plugin_manager_{name}_total", amount)
+    stats = _REQUEST_STATS.get(None)
+    if stats is not None:
+        stats[name] = stats.get(name, 0) + amount
+
+
+def _create_ssl_context() -> ssl.SSLContext:
+    """创建禁用证书验证的SSL上下文（部分主机缺少根证书）"""
+    ssl_context = ssl.create_default_context()
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+    return ssl_context
+
+
+class SharedCache:
+    """同一主机上多个MaiBot进程共享的缓存目录 - 远程版本、ETag和下载的文件内容
+
+    读取不加锁：所有写入都先写临时文件再原子替换，读者总能看到完整的文件；
+    写入同一个key前需要持有该key的文件锁，保证只有一个进程在填充，其余进程等待后直接命中。
+    """
+
+    LOCK_TIMEOUT = 120.0  # 等待其他进程填充的最长时间，超时后不再等待直接自行加载
+    LOCK_POLL_INTERVAL = 0.05
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+
+    def _path(self, namespace: str, key: str, suffix: str = "") -> Path:
+        import hashlib
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.cache_dir / namespace / digest[:2] / f"{digest}{suffix}"
+
+    def _atomic_write(self, path: Path, write: Callable[[Path], None]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = path.with_name(f"{path.name}.{os.getpid()}.{id(write)}.tmp")
+        try:
+            write(temp_file)
+            for attempt in range(5):
+                try:
+                    os.replace(temp_file, path)
+                    return
+                except PermissionError:
+                    # Windows下目标文件正被其他进程读取时无法替换，稍后重试
+                    if attempt == 4:
+                        raise
+                    time.sleep(0.05)
+        finally:
+            if temp_file.exists():
+                temp_file.unlink()
+
+    def read_json(self, namespace: str, key: str, max_age: Optional[float] = None) -> Optional[Any]:
+        """读取缓存的JSON值，不存在、损坏或超过 max_age 秒时返回None"""
+        path = self._path(namespace, key, ".json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if max_age is not None and time.time() - record.get('stored_at', 0) > max_age:
+            return None
+        return record.get('value')
+
+    def write_json(self, namespace: str, key: str, value: Any) -> None:
+        record = {'stored_at': time.time(), 'value': value}
+        data = json.dumps(record, ensure_ascii=False).encode('utf-8')
+        self._atomic_write(self._path(namespace, key, ".json"), lambda p: p.write_bytes(data))
+
+    def delete(self, namespace: str, key: str) -> None:
+        try:
+            self._path(namespace, key, ".json").unlink()
+        except OSError:
+            pass
+
+    @staticmethod
+    def _blob_matches(path: Path, digest: str) -> bool:
+        """按git对象格式（"blob <大小>\\0" + 内容）重新计算哈希，判断文件内容是否与 digest 一致"""
+        import hashlib
+        algorithm = {40: "sha1", 64: "sha256"}.get(len(digest))
+        if algorithm is None:
+            return False
+        hasher = hashlib.new(algorithm)
+        with open(path, 'rb') as f:
+            hasher.update(f"blob {os.fstat(f.fileno()).st_size}\0".encode("ascii"))
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest() == digest.lower()
+
+    def blob_path(self, digest: str) -> Optional[Path]:
+        """按内容哈希查找缓存的文件，内容与哈希不符的文件会被删除"""
+        path = self._path("blobs", digest)
+        try:
+            if self._blob_matches(path, digest):
+                return path
+        except OSError:
+            return None
+        cache_logger.warning(f"共享缓存中的文件与哈希不符，已丢弃: {digest}")
+        with contextlib.suppress(OSError):
+            path.unlink()
+        return None
+
+    def put_blob(self, digest: str, source: Path) -> None:
+        """缓存下载的文件，只有内容与哈希一致时才写入"""
+        if not self._blob_matches(source, digest):
+            cache_logger.debug(f"文件内容与哈希不符，不写入共享缓存: {digest}")
+            return
+        self._atomic_write(self._path("blobs", digest), lambda p: shutil.copyfile(source, p))
+
+    @staticmethod
+    def _try_lock(fd: int) -> bool:
+        try:
+            if os.name == "nt":
+                import msvcrt
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _unlock(fd: int) -> None:
+        try:
+            if os.name == "nt":
+                import msvcrt
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        except OSError:
+            pass
+
+    @contextlib.asynccontextmanager
+    async def lock(self, namespace: str, key: str):
+        """获取某个key的写锁（跨进程），等待期间不阻塞事件循环"""
+        lock_path = self._path(namespace, key, ".lock")
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT)
+        locked = False
+        try:
+            deadline = time.monotonic() + self.LOCK_TIMEOUT
+            while True:
+                locked = self._try_lock(fd)
+                if locked:
+                    break
+                if time.monotonic() > deadline:
+                    cache_logger.warning(f"等待共享缓存锁超时: {namespace}/{key}")
+                    break
+                await asyncio.sleep(self.LOCK_POLL_INTERVAL)
+            yield
+        finally:
+            if locked:
+                self._unlock(fd)
+            os.close(fd)
+
+    async def get_or_fill_json(self, namespace: str, key: str, max_age: Optional[float],
+                               loader: Callable[[], Awaitable[Any]]) -> Any:
+        """读取缓存，未命中时在写锁内调用 loader 填充；loader 返回None时不写入"""
+        value = self.read_json(namespace, key, max_age)
+        if value is not None:
+            _count_request_stat("cache_hits")
+            return value
+        async with self.lock(namespace, key):
+            # 等锁期间其他进程可能已经填充
+            value = self.read_json(namespace, key, max_age)
+            if value is not None:
+                _count_request_stat("cache_hits")
+                return value
+            value = await loader()
+            if value is not None:
+                self.write_json(namespace, key, value)
+            return value
+
+
+_SHARED_CACHES: Dict[str, Optional[SharedCache]] = {}
+
+
+def _default_cache_dir() -> Path:
+    """当前用户的缓存目录（Windows 为 %LOCALAPPDATA%，其他系统为 $XDG_CACHE_HOME 或 ~/.cache）"""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or str(Path.home() / "AppData" / "Local")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base) / "maibot_plugin_manager"
+
+
+def _prepare_private_directory(path: Path) -> bool:
+    """创建只有当前用户可以访问的目录；已存在时检查属主，不是当前用户（或是符号链接）时返回False"""
+    try:
+        path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if os.name == "nt":
+            return True
+        if path.is_symlink():
+            cache_logger.warning(f"共享缓存目录是符号链接，已停用共享缓存: {path}")
+            return False
+        info = path.stat()
+        if info.st_uid != os.getuid():
+            cache_logger.warning(f"共享缓存目录不属于当前用户，已停用共享缓存: {path}")
+            return False
+        if info.st_mode & 0o077:
+            os.chmod(path, 0o700)
+        return True
+    except OSError as e:
+        cache_logger.warning(f"无法创建共享缓存目录 {path}: {e}")
+        return False
+
+
+def get_shared_cache(get_config: Callable[..., Any]) -> Optional[SharedCache]:
+    """获取配置的共享缓存，未启用或目录不安全时返回None"""
+    if not get_config("cache.enabled", True):
+        return None
+    cache_dir = str(get_config("cache.dir", "")).strip()
+    path = Path(cache_dir).expanduser() if cache_dir else _default_cache_dir()
+    key = str(path)
+    if key not in _SHARED_CACHES:
+        _SHARED_CACHES[key] = SharedCache(path) if _prepare_private_directory(path) else None
+    return _SHARED_CACHES[key]
+
+
+class CassetteMiss(Exception):
+    """回放模式下录制文件中没有对应的请求"""
+
+
+class CassetteResponse:
+    """录制或回放的响应，提供插件管理器用到的 aiohttp.ClientResponse 接口"""
+
+    def __init__(self, url: str, status: int, headers: List[Tuple[str, str]], body: bytes):
+        from multidict import CIMultiDict
+        from yarl import URL
+        self.url = URL(url)
+        self.status = status
+        self.headers = CIMultiDict(headers)
+        self._body = body
+        self.content_length = len(body)
+        self.content = self
+
+    async def iter_chunked(self, size: int):
+        for offset in range(0, len(self._body), size):
+            yield self._body[offset:offset + size]
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: Optional[str] = None) -> str:
+        return self._body.decode(encoding or 'utf-8', errors='replace')
+
+    async def json(self, content_type: Optional[str] = None) -> Any:
+        return json.loads(self._body.decode('utf-8'))
+
+    def release(self) -> None:
+        pass
+
+
+class HttpCassette:
+    """HTTP录制文件 - 按 请求地址+Range头 保存响应的状态、响应头、内容和耗时
+
+    同一请求录制了多次（例如先失败后重试成功）时按顺序回放，用完后重复最后一次。
+    不保存请求头，地址中的Token查询参数在生成键和录制前会被替换，认证信息不会写入录制文件。
+    """
+
+    SECRET_PARAMS = frozenset({'access_token', 'private_token', 'token'})
+    REDACTED = "REDACTED"
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.interactions: Dict[str, List[Dict[str, Any]]] = {}
+        self._replay_positions: Dict[str, int] = {}
+        self._dirty = False
+        if path.exists():
+            try:
+                data = json.loads(path.read_text(encoding='utf-8'))
+                for item in data.get('interactions', []):
+                    self.interactions.setdefault(item['key'], []).append(item)
+            except Exception as e:
+                network_logger.warning(f"读取HTTP录制文件失败 {path}: {e}")
+
+    @classmethod
+    def redact_url(cls, url: str) -> str:
+        """把地址中的Token查询参数替换为占位符，录制和回放使用同样的规则，因此回放时换了Token也能命中"""
+        from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+        parts = urlsplit(url)
+        if not parts.query:
+            return url
+        query = [(name, cls.REDACTED if name.lower() in cls.SECRET_PARAMS else value)
+                 for name, value in parse_qsl(parts.query, keep_blank_values=True)]
+        return urlunsplit(parts._replace(query=urlencode(query, safe='/:')))
+
+    @classmethod
+    def request_key(cls, url: str, headers: Optional[Dict[str, str]]) -> str:
+        range_header = (headers or {}).get('Range')
+        return f"GET {cls.redact_url(url)}" + (f" [{range_header}]" if range_header else "")
+
+    def record(self, key: str, url: str, status: int, headers: List[Tuple[str, str]],
+               body: bytes, elapsed: float) -> None:
+        self.interactions.setdefault(key, []).append({
+            'key': key, 'url': url, 'status': status, 'headers': headers,
+            'body': base64.b64encode(body).decode('ascii'), 'elapsed': round(elapsed, 4),
+            'recorded_at': time.time(),
+        })
+        self._dirty = True
+
+    def next_interaction(self, key: str) -> Optional[Dict[str, Any]]:
+        recorded = self.interactions.get(key)
+        if not recorded:
+            return None
+        position = self._replay_positions.get(key, 0)
+        self._replay_positions[key] = position + 1
+        return recorded[min(position, len(recorded) - 1)]
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        items = [item for recorded in self.interactions.values() for item in recorded]
+        items.sort(key=lambda item: item['recorded_at'])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(f"{self.path.name}.tmp")
+        temp_path.write_text(json.dumps({'version': 1, 'interactions': items}, ensure_ascii=False),
+                             encoding='utf-8')
+        temp_path.replace(self.path)
+        self._dirty = False
+        network_logger.info(f"已保存 {len(items)} 条HTTP录制到 {self.path}")
+
+
+class RecordingSession:
+    """录制模式：请求真实站点，读完整个响应后写入录制文件，再以录制的响应返回"""
+
+    def __init__(self, session: aiohttp.ClientSession, cassette: HttpCassette):
+        self._session = session
+        self._cassette = cassette
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs: Any) -> CassetteResponse:
+        started = time.monotonic()
+        async with self._session.get(url, headers=headers, **kwargs) as response:
+            body = await response.read()
+            status, response_headers = response.status, list(response.headers.items())
+        elapsed = time.monotonic() - started
+        self._cassette.record(HttpCassette.request_key(url, headers), HttpCassette.redact_url(url),
+                              status, response_headers, body, elapsed)
+        return CassetteResponse(url, status, response_headers, body)
+
+
+class ReplaySession:
+    """回放模式：不访问网络，按录制的耗时乘以 latency_scale 等待后返回录制的响应"""
+
+    def __init__(self, cassette: HttpCassette, latency_scale: float):
+        self._cassette = cassette
+        self._latency_scale = latency_scale
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs: Any) -> CassetteResponse:
+        item = self._cassette.next_interaction(HttpCassette.request_key(url, headers))
+        if item is None:
+            raise CassetteMiss(f"HTTP录制中没有该请求: {url}")
+        if self._latency_scale > 0 and item.get('elapsed'):
+            await asyncio.sleep(item['elapsed'] * self._latency_scale)
+        return CassetteResponse(url, item['status'], [tuple(h) for h in item['headers']],
+                                base64.b64decode(item['body']))
+
+
+_HTTP_CASSETTES: Dict[str, HttpCassette] = {}
+
+
+def get_http_cassette(get_config: Callable[..., Any]) -> Optional[HttpCassette]:
+    """录制/回放模式下获取配置的录制文件，直连模式返回None"""
+    mode = str(get_config("transport.mode", "live")).strip().lower()
+    if mode not in ("record", "replay"):
+        return None
+    cassette_path = str(get_config("transport.cassette", "")).strip()
+    path = Path(cassette_path).expanduser() if cassette_path else Path(__file__).parent / "http_cassette.json"
+    key = str(path)
+    if key not in _HTTP_CASSETTES:
+        _HTTP_CASSETTES[key] = HttpCassette(path)
+        atexit.register(_HTTP_CASSETTES[key].save)
+    return _HTTP_CASSETTES[key]
+
+
+def _wrap_transport(session: aiohttp.ClientSession, get_config: Callable[..., Any]):
+    """按 transport.mode 为会话加上录制或回放层"""
+    cassette = get_http_cassette(get_config)
+    if cassette is None:
+        return session
+    if str(get_config("transport.mode", "live")).strip().lower() == "record":
+        return RecordingSession(session, cassette)
+    return ReplaySession(cassette, float(get_config("transport.latency_scale", 1.0)))
+
+
+class RepositoryRef:
+    """解析后的仓库地址，subpath 为插件在仓库中的子目录（同一仓库发布多个插件时使用）"""
+
+    def __init__(self, url: str, host: str, owner: str, repo: str, ref: str = "HEAD", local_path: Optional[Path] = None,
+                 subpath: str = ""):
+        self.url = url
+        self.host = host
+        self.owner = owner
+        self.repo = repo
+        self.ref = ref
+        self.local_path = local_path
+        self.subpath = subpath.strip("/")
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.owner}/{self.repo}" if self.owner else self.repo
+
+    @property
+    def group_key(self) -> Tuple[str, str, str]:
+        """同一仓库同一分支的插件共享一份文件列表"""
+        return self.host, self.full_name, self.ref
+
+    def path(self, name: str) -> str:
+        """插件目录下的文件在仓库中的路径"""
+        return f"{self.subpath}/{name}" if self.subpath else name
+
+
+def _split_repository_path(parts: List[str]) -> Tuple[List[str], str, str]:
+    """把仓库地址的路径段拆分为 (仓库路径段, 分支, 子目录)
+
+    支持 /tree/<分支>/<子目录>（GitHub、Gitee）、/-/tree/<分支>/<子目录>（GitLab）
+    和 /src/branch/<分支>/<子目录>（Gitea），没有这些部分时分支为 HEAD。
+    """
+    for i in range(2, len(parts)):
+        if parts[i] in ("-", "tree", "blob", "src"):
+            rest = parts[i + 1:] if parts[i] == "-" else parts[i:]
+            if len(rest) >= 2 and rest[0] in ("tree", "blob"):
+                return parts[:i], rest[1], "/".join(rest[2:])
+            if len(rest) >= 3 and rest[0] == "src" and rest[1] in ("branch", "tag", "commit"):
+                return parts[:i], rest[2], "/".join(rest[3:])
+            return parts[:i], "HEAD", ""
+    return parts, "HEAD", ""
+
+
+class SourceProvider:
+    """插件源提供者基类 - 负责解析版本、列出文件、获取文件/归档
+
+    每个提供者实例对应一个托管站点，拥有独立的连接池和请求频率限制，
+    在多条命令之间复用，以便保持连接。
+    """
+
+    name = "base"
+    min_request_interval = 0.0  # 两次API请求之间的最小间隔（秒）
+    connection_limit = 8
+
+    def __init__(self, host: str):
+        self.host = host
+        self.get_config: Callable[..., Any] = lambda key, default=None: default
+        self.retry_policy = DEFAULT_RETRY_POLICY
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._rate_lock: Optional[asyncio.Lock] = None
+        self._last_api_call = 0.0
+
+    @classmethod
+    def matches(cls, host: str, get_config: Callable[..., Any]) -> bool:
+        """判断该提供者是否负责给定的主机名"""
+        return False
+
+    # ---- 需要子类实现的部分 ----
+
+    def parse_repository(self, repository_url: str) -> Optional[RepositoryRef]:
+        """解析仓库地址为 owner/repo，默认按 https://host/owner/repo 处理"""
+        from urllib.parse import urlparse
+        parsed = urlparse(repository_url.strip())
+        parts, ref, subpath = _split_repository_path([p for p in parsed.path.strip("/").split("/") if p])
+        if len(parts) < 2:
+            source_logger.warning(f"无效的仓库路径: {repository_url}")
+            return None
+        repo_name = parts[1][:-4] if parts[1].endswith(".git") else parts[1]
+        return RepositoryRef(repository_url, self.host, parts[0], repo_name, ref=ref, subpath=subpath)
+
+    async def resolve_version(self, repo: RepositoryRef) -> Optional[str]:
+        """获取仓库默认分支上 _manifest.json 中的版本号"""
+        raise NotImplementedError
+
+    async def list_tree(self, repo: RepositoryRef, path: str = "") -> Optional[List[Dict[str, Any]]]:
+        """列出仓库某目录下的条目，每项包含 name/path/type('file'|'dir')/size/download_url，以及可选的内容哈希 sha"""
+        raise NotImplementedError
+
+    async def list_tree_recursive(self, repo: RepositoryRef) -> Optional[List[Dict[str, Any]]]:
+        """一次请求列出整个仓库的所有条目（格式同 list_tree），不支持时返回None"""
+        return None
+
+    def archive_url(self, repo: RepositoryRef) -> Optional[str]:
+        """仓库zip归档的下载地址"""
+        return None
+
+    @staticmethod
+    def _ref_query(repo: RepositoryRef, separator: str = "?") -> str:
+        """非默认分支时附加的 ref 查询参数"""
+        return f"{separator}ref={repo.ref}" if repo.ref != "HEAD" else ""
+
+    async def resolve_commit(self, repo: RepositoryRef) -> Optional[str]:
+        """仓库默认分支最新提交的哈希，不支持时返回None"""
+        return None
+
+    def auth_headers(self, url: str) -> Dict[str, str]:
+        """该站点的认证请求头"""
+        return {}
+
+    def download_candidates(self, entry: Dict[str, Any]) -> Union[str, List[Tuple[str, str]]]:
+        """文件的下载地址，可以返回 (镜像名, 地址) 列表用于对冲请求"""
+        return entry['download_url']
+
+    # ---- 连接与请求 ----
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(ssl=_create_ssl_context(), limit=self.connection_limit)
+        return aiohttp.ClientSession(connector=connector)
+
+    def _get_session(self) -> Union[aiohttp.ClientSession, RecordingSession, ReplaySession]:
+        """获取该站点的会话，事件循环变化或会话关闭时重新创建；录制/回放模式下返回包装后的会话"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = self._create_session()
+            self._session_loop = loop
+            self._rate_lock = asyncio.Lock()
+        return _wrap_transport(self._session, self.get_config)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _rate_limit_delay(self) -> None:
+        """该站点的API调用频率限制"""
+        if not self.min_request_interval:
+            return
+        async with self._rate_lock:
+            wait = self.min_request_interval - (time.time() - self._last_api_call)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_api_call = time.time()
+
+    def _headers_for_url(self, url: str, extra_headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """生成请求头，认证信息只发送给站点自身，不泄露给第三方镜像"""
+        headers = {'User-Agent': f'MaiBot-Plugin-Manager/{PLUGIN_MANAGER_VERSION}'}
+        headers.update(self.auth_headers(url))
+        if extra_headers:
+            headers.update(extra_headers)
+        return headers
+
+    async def request(self, url: Union[str, List[Tuple[str, str]]],
+                      handler: Callable[[aiohttp.ClientResponse], Awaitable[Any]],
+                      headers: Union[Dict[str, str], Callable[[], Dict[str, str]], None] = None,
+                      timeout: Optional[aiohttp.ClientTimeout] = None,
+                      label: str = "", rate_limited: bool = False) -> Any:
+        """按重试策略发起GET请求，最终的响应（成功或不可重试的错误）交给handler处理
+
+        url 为 (镜像名, 地址) 列表时，每次尝试都在这些镜像之间进行对冲请求。
+        headers 可以是一个返回请求头的函数，便于每次重试时重新生成（例如断点续传的Range头）。
+        """
+        session = self._get_session()
+        policy = self.retry_policy
+        label = label or (url if isinstance(url, str) else url[0][1])
+        timeout = timeout or aiohttp.ClientTimeout(total=15)
+        failures: Dict[str, int] = {}  # 每类错误各自计数，互不占用重试次数
+        while True:
+            if rate_limited:
+                await self._rate_limit_delay()
+            request_headers = headers() if callable(headers) else headers
+            try:
+                if isinstance(url, str):
+                    response = await session.get(url, headers=self._headers_for_url(url, request_headers), timeout=timeout)
+                else:
+                    response = await self._hedged_get(session, url, request_headers, timeout)
+                self._record_response_metrics(response)
+                if response.status >= 400:
+                    _UPSTREAM_ERROR_STATUS.set(response.status)
+                try:
+                    error_class = await policy.classify_response(response)
+                    if error_class is None:
+                        return await handler(response)
+                    failures[error_class] = failures.get(error_class, 0) + 1
+                    if failures[error_class] >= policy.max_attempts(error_class):
+                        return await handler(response)
+                    delay = policy.compute_delay(error_class, failures[error_class], response.headers)
+                    if delay is None:
+                        return await handler(response)
+                    reason = f"HTTP {response.status}"
+                finally:
+                    response.release()
+            except Exception as e:
+                if not isinstance(e, DownloadSizeExceeded):
+                    METRICS.inc("plugin_manager_http_requests_total", provider=self.name, status="error")
+                error_class = policy.classify_exception(e)
+                if error_class is None:
+                    raise
+                failures[error_class] = failures.get(error_class, 0) + 1
+                if failures[error_class] >= policy.max_attempts(error_class):
+                    raise
+                delay = policy.compute_delay(error_class, failures[error_class])
+                reason = type(e).__name__
+
+            _count_request_stat("retries")
+            network_logger.info(f"请求 {label} 失败 ({reason}/{error_class})，{delay:.1f} 秒后重试")
+            await asyncio.sleep(delay)
+
+    def _record_response_metrics(self, response: aiohttp.ClientResponse) -> None:
+        METRICS.inc("plugin_manager_http_requests_total", provider=self.name, status=str(response.status))
+
+    async def _hedged_get(self, session: aiohttp.ClientSession, candidates: List[Tuple[str, str]],
+                          headers: Optional[Dict[str, str]],
+                          timeout: Optional[aiohttp.ClientTimeout]) -> aiohttp.ClientResponse:
+        """在多个镜像间发起对冲请求，返回最先成功响应的镜像的响应
+
+        先请求排在最前的镜像，若在其p90延迟内没有响应（或已失败），再向下一个镜像发起请求，
+        取最先返回成功状态的一方并取消其余请求。全部失败时返回最后一个错误响应或抛出最后的异常。
+        """
+        remaining = list(candidates)
+        pending: Dict[asyncio.Task, str] = {}
+        last_response: Optional[aiohttp.ClientResponse] = None
+        last_error: Optional[BaseException] = None
+
+        async def open_one(key: str, mirror_url: str) -> aiohttp.ClientResponse:
+            started = time.monotonic()
+            try:
+                response = await session.get(mirror_url, headers=self._headers_for_url(mirror_url, headers), timeout=timeout)
+            except asyncio.CancelledError:
+                # 被对冲请求取消时，已等待的时间是该镜像延迟的下限，同样记入统计
+                MIRROR_STATS.record(key, time.monotonic() - started)
+                raise
+            except Exception:
+                MIRROR_STATS.record(key, time.monotonic() - started, ok=False)
+                raise
+            MIRROR_STATS.record(key, time.monotonic() - started, ok=response.status < 400)
+            return response
+
+        def launch_next() -> None:
+            key, mirror_url = remaining.pop(0)
+            pending[asyncio.ensure_future(open_one(key, mirror_url))] = key
+
+        launch_next()
+        try:
+            while pending:
+                first_key = next(iter(pending.values()))
+                wait_time = MIRROR_STATS.hedge_delay(first_key) if remaining else None
+                done, _ = await asyncio.wait(list(pending), timeout=wait_time, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    network_logger.info(f"镜像 {first_key} 超过 {wait_time:.1f} 秒未响应，发起对冲请求")
+                    launch_next()
+                    continue
+                winner = None
+                for task in done:
+                    key = pending.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        continue
+                    response = task.result()
+                    if response.status < 400 and winner is None:
+                        network_logger.debug(f"镜像 {key} 响应最快 ({response.status})")
+                        winner = response
+                        continue
+                    if last_response is not None:
+                        last_response.release()
+                    last_response = response
+                if winner is not None:
+                    if last_response is not None:
+                        last_response.release()
+                    return winner
+                if not pending and remaining:
+                    launch_next()
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(
+                    lambda t: t.result().release() if not t.cancelled() and t.exception() is None else None
+                )
+
+        if last_response is not None:
+            return last_response
+        raise last_error if last_error else aiohttp.ClientConnectionError("没有可用的镜像")
+
+    # ---- 通用实现 ----
+
+    async def _read_json(self, url: str, label: str) -> Optional[Any]:
+        """请求站点API并解析JSON，失败时打印原因并返回None
+
+        启用共享缓存时使用ETag条件请求，内容未变化（304）时直接返回缓存的结果。
+        """
+        cache = get_shared_cache(self.get_config)
+        cached = cache.read_json("etags", url) if cache else None
+        headers = {'If-None-Match': cached['etag']} if cached else None
+
+        async def handle(response: aiohttp.ClientResponse) -> Optional[Any]:
+            if response.status == 304 and cached:
+                _count_request_stat("cache_hits")
+                return cached['body']
+            if response.status == 200:
+                body = await response.json(content_type=None)
+                etag = response.headers.get('ETag')
+                if cache and etag:
+                    cache.write_json("etags", url, {'etag': etag, 'body': body})
+                return body
+            self._log_error_response(response)
+            if response.status not in (401, 403, 404):
+                network_logger.debug(f"错误详情: {await response.text()}")
+            return None
+        return await self.request(url, handle, headers=headers, label=label, rate_limited=True)
+
+    def _log_error_response(self, response: aiohttp.ClientResponse) -> None:
+        """打印站点API的错误状态"""
+        network_logger.warning(f"{self.name} API响应状态: {response.status}")
+        if response.status == 404:
+            network_logger.warning("仓库或manifest文件不存在")
+        elif response.status == 401:
+            network_logger.warning(f"{self.name} Token无效或过期")
+
+    @staticmethod
+    def _version_from_manifest_text(text: str) -> Optional[str]:
+        manifest_data = json.loads(text)
+        version = manifest_data.get('version')
+        source_logger.debug(f"获取到远程版本: {version}")
+        return version
+
+    async def fetch_file(self, entry: Dict[str, Any], temp_path: Path, budget: DownloadBudget) -> bool:
+        """下载单个文件到 temp_path，有内容哈希时优先使用共享缓存中的副本
+
+        超过大小上限时抛出 DownloadSizeExceeded，由调用方中止整个更新。
+        """
+        cache = get_shared_cache(self.get_config)
+        digest = entry.get('sha')
+        if not cache or not digest:
+            return await self._download_file(entry, temp_path, budget)
+
+        def copy_cached() -> bool:
+            cached_path = cache.blob_path(digest)
+            if cached_path is None:
+                return False
+            size = cached_path.stat().st_size
+            budget.check_file_size(entry['name'], size)
+            budget.consume(entry['name'], size, size)
+            shutil.copyfile(cached_path, temp_path / entry['name'])
+            _count_request_stat("cache_hits")
+            cache_logger.debug(f"从共享缓存读取: {entry['name']}")
+            return True
+
+        if copy_cached():
+            return True
+        async with cache.lock("blobs", digest):
+            if copy_cached():
+                return True
+            if not await self._download_file(entry, temp_path, budget):
+                return False
+            cache.put_blob(digest, temp_path / entry['name'])
+            return True
+
+    async def _download_file(self, entry: Dict[str, Any], temp_path: Path, budget: DownloadBudget) -> bool:
+        """流式下载单个文件到磁盘，重试时通过Range头断点续传"""
+        file_name = entry['name']
+        file_path = temp_path / file_name
+        part_path = temp_path / f"{file_name}.part"
+
+        # 列表中已给出大小时提前拒绝过大的文件
+        budget.check_file_size(file_name, entry.get('size'))
+
+        # 流式下载不设总超时，只限制连接和两次读取之间的间隔，避免大文件被误判超时
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=10)
+
+        def range_headers() -> Dict[str, str]:
+            if part_path.exists() and part_path.stat().st_size > 0:
+                return {'Range': f"bytes={part_path.stat().st_size}-"}
+            return {}
+
+        async def stream_to_file(response: aiohttp.ClientResponse) -> bool:
+            offset = part_path.stat().st_size if part_path.exists() else 0
+            if response.status == 206 and offset:
+                content_range = response.headers.get('Content-Range', '')
+                if not content_range.startswith(f"bytes {offset}-"):
+                    network_logger.info(f"下载 {file_name} 的续传范围不匹配: {content_range}，从头下载")
+                    budget.release(offset)
+                    offset = 0
+                    mode = 'wb'
+                else:
+                    mode = 'ab'
+            elif response.status == 200:
+                if offset:
+                    # 服务器忽略了Range，退回已计入的字节后从头写入
+                    budget.release(offset)
+                    offset = 0
+                mode = 'wb'
+            else:
+                network_logger.warning(f"下载失败 {file_name}: {response.status}")
+                return False
+
+            if response.content_length is not None:
+                budget.check_file_size(file_name, offset + response.content_length)
+
+            written = offset
+            with open(part_path, mode) as f:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    written += len(chunk)
+                    budget.consume(file_name, written, len(chunk))
+                    f.write(chunk)
+            METRICS.inc("plugin_manager_download_bytes_total", written - offset, provider=self.name)
+            part_path.replace(file_path)
+            network_logger.debug(f"下载成功: {file_name} ({written} 字节{'，断点续传' if offset else ''})")
+            return True
+
+        try:
+            with METRICS.timer("plugin_manager_download_seconds", provider=self.name):
+                return await self.request(
+                    self.download_candidates(entry), stream_to_file,
+                    headers=range_headers, timeout=timeout, label=file_name
+                )
+        except DownloadSizeExceeded:
+            raise
+        except asyncio.TimeoutError:
+            network_logger.warning(f"下载超时 {file_name}，已达到最大重试次数")
+        except Exception as e:
+            network_logger.warning(f"下载文件 {file_name} 时出错: {e}")
+        finally:
+            if part_path.exists():
+                part_path.unlink()
+        return False
+
+    async def fetch_archive(self, repo: RepositoryRef, dest: Path, budget: DownloadBudget) -> bool:
+        """下载仓库的zip归档到 dest"""
+        url = self.archive_url(repo)
+        if not url:
+            source_logger.warning(f"{self.name} 不支持归档下载")
+            return False
+        entry = {'name': dest.name, 'download_url': url}
+        return await self.fetch_file(entry, dest.parent, budget)
+
+
+class GitHubProvider(SourceProvider):
+    """GitHub - contents API，支持镜像对冲下载"""
+
+    name = "GitHub"
+    min_request_interval = 2.0  # 最少2秒间隔避免频率限制
+
+    @classmethod
+    def matches(cls, host: str, get_config: Callable[..., Any]) -> bool:
+        return host in ("github.com", "www.github.com")
+
+    def auth_headers(self, url: str) -> Dict[str, str]:
+        from urllib.parse import urlparse
+        if (urlparse(url).hostname or "") not in GITHUB_HOSTS:
+            return {}
+        headers = {'Accept': 'application/vnd.github.v3+json'}
+        token = str(self.get_config("github.token", "")).strip()
+        if token:
+            headers['Authorization'] = f"token {token}"
+        return headers
+
+    def _get_mirror_templates(self) -> List[str]:
+        """获取配置的镜像地址模板列表"""
+        if _BYPASS_MIRRORS.get():
+            return []
+        return [m.strip() for m in self.get_config("network.mirrors", []) if str(m).strip()]
+
+    def _build_mirror_candidates(self, owner: str, repo: str, ref: str, path: str) -> List[Tuple[str, str]]:
+        """根据镜像模板展开候选地址，并按历史延迟从快到慢排序"""
+        raw_url = RAW_GITHUB_URL_TEMPLATE.format(owner=owner, repo=repo, ref=ref, path=path)
+        candidates = {}
+        for template in self._get_mirror_templates():
+            try:
+                candidates[template] = template.format(owner=owner, repo=repo, ref=ref, path=path, raw_url=raw_url)
+            except (KeyError, IndexError, ValueError) as e:
+                source_logger.warning(f"镜像模板无效 {template}: {e}")
+        return [(key, candidates[key]) for key in MIRROR_STATS.order(list(candidates))]
+
+    def download_candidates(self, entry: Dict[str, Any]) -> Union[str, List[Tuple[str, str]]]:
+        # 原始地址来自raw.githubusercontent.com时，可改由配置的镜像对冲下载，原始地址作为兜底
+        file_url = entry['download_url']
+        raw_match = re.match(r"^https://raw\.githubusercontent\.com/([^/]+)/([^/]+)/([^/]+)/(.+)$", file_url)
+        if raw_match:
+            candidates = self._build_mirror_candidates(*raw_match.groups())
+            if candidates:
+                return candidates + [("origin", file_url)]
+        return file_url
+
+    def archive_url(self, repo: RepositoryRef) -> Optional[str]:
+        return f"https://api.github.com/repos/{repo.full_name}/zipball" + (f"/{repo.ref}" if repo.ref != "HEAD" else "")
+
+    async def resolve_commit(self, repo: RepositoryRef) -> Optional[str]:
+        data = await self._read_json(f"https://api.github.com/repos/{repo.full_name}/commits/{repo.ref}",
+                                     f"{repo.full_name} 的最新提交")
+        return data.get('sha') if isinstance(data, dict) else None
+
+    async def resolve_version(self, repo: RepositoryRef) -> Optional[str]:
+        # 配置了镜像时优先通过镜像对冲获取原始manifest，全部失败再回退到GitHub API
+        candidates = self._build_mirror_candidates(repo.owner, repo.repo, repo.ref, repo.path("_manifest.json"))
+        if candidates:
+            async def parse_raw(response: aiohttp.ClientResponse) -> Optional[str]:
+                if response.status != 200:
+                    source_logger.warning(f"镜像返回错误状态: {response.status}")
+                    return None
+                return self._version_from_manifest_text(await response.text(encoding='utf-8'))
+            try:
+                version = await self.request(candidates, parse_raw, label=f"{repo.full_name} 的manifest(镜像)")
+                if version:
+                    return version
+            except Exception as e:
+                source_logger.warning(f"通过镜像获取远程版本失败 {repo.full_name}: {e}")
+
+        api_url = f"https://api.github.com/repos/{repo.full_name}/contents/{repo.path('_manifest.json')}{self._ref_query(repo)}"
+        network_logger.debug(f"请求GitHub API: {api_url}")
+        data = await self._read_json(api_url, f"{repo.full_name} 的manifest")
+        if data is None:
+            return None
+        if 'content' not in data:
+            source_logger.warning(f"响应中缺少content字段: {data}")
+            return None
+        # 解码base64内容
+        return self._version_from_manifest_text(base64.b64decode(data['content']).decode('utf-8'))
+
+    async def list_tree(self, repo: RepositoryRef, path: str = "") -> Optional[List[Dict[str, Any]]]:
+        api_url = f"https://api.github.com/repos/{repo.full_name}/contents/{path}{self._ref_query(repo)}"
+        data = await self._read_json(api_url, f"{repo.full_name} 的文件列表")
+        if not isinstance(data, list):
+            return None
+        return [
+            {'name': item['name'], 'path': item.get('path', item['name']), 'type': item['type'],
+             'size': item.get('size'), 'download_url': item.get('download_url'), 'sha': item.get('sha')}
+            for item in data
+        ]
+
+    async def list_tree_recursive(self, repo: RepositoryRef) -> Optional[List[Dict[str, Any]]]:
+        # git trees API 一次返回整个仓库，文件通过raw地址下载（可走镜像，不消耗API限额）
+        api_url = f"https://api.github.com/repos/{repo.full_name}/git/trees/{repo.ref}?recursive=1"
+        data = await self._read_json(api_url, f"{repo.full_name} 的完整文件列表")
+        if not isinstance(data, dict) or data.get('truncated') or not isinstance(data.get('tree'), list):
+            return None
+        return [
+            {'name': item['path'].rsplit("/", 1)[-1], 'path': item['path'],
+             'type': 'file' if item['type'] == 'blob' else 'dir', 'size': item.get('size'),
+             'download_url': RAW_GITHUB_URL_TEMPLATE.format(owner=repo.owner, repo=repo.repo, ref=repo.ref,
+                                                            path=item['path']) if item['type'] == 'blob' else None,
+             'sha': item.get('sha')}
+            for item in data['tree'] if item['type'] in ('blob', 'tree')
+        ]
+
+    async def get_rate_limit(self) -> Optional[Dict[str, int]]:
+        """读取 /rate_limit（该接口本身不消耗限额），返回核心API的 limit/remaining/reset"""
+        async def parse(response: aiohttp.ClientResponse) -> Optional[Dict[str, int]]:
+            if response.status != 200:
+                self._log_error_response(response)
+                return None
+            core = (await response.json()).get('resources', {}).get('core', {})
+            METRICS.set("plugin_manager_github_quota_remaining", int(core.get('remaining', 0)))
+            return {'limit': int(core.get('limit', 0)), 'remaining': int(core.get('remaining', 0)),
+                    'reset': int(core.get('reset', 0))}
+        return await self.request("https://api.github.com/rate_limit", parse, label="GitHub API限额")
+
+    def _record_response_metrics(self, response: aiohttp.ClientResponse) -> None:
+        super()._record_response_metrics(response)
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        if remaining and remaining.isdigit() and response.url.host == "api.github.com":
+            METRICS.set("plugin_manager_github_quota_remaining", int(remaining))
+
+    def _log_error_response(self, response: aiohttp.ClientResponse) -> None:
+        super()._log_error_response(response)
+        if response.status == 403:
+            # 检查速率限制头
+            remaining = response.headers.get('X-RateLimit-Remaining', '未知')
+            limit = response.headers.get('X-RateLimit-Limit', '未知')
+            reset_time = response.headers.get('X-RateLimit-Reset', '未知')
+            network_logger.warning(f"GitHub API限制 - 剩余: {remaining}/{limit}, 重置: {reset_time}")
+            if str(self.get_config("github.token", "")).strip():
+                network_logger.info("即使使用Token也遇到限制，可能需要等待")
+            else:
+                network_logger.info("未使用GitHub Token，API限制严格")
+
+
+class GiteaProvider(SourceProvider):
+    """Gitea / Forgejo（如 codeberg.org）- /api/v1 contents API，与GitHub格式基本一致"""
+
+    name = "Gitea"
+    min_request_interval = 0.5
+    token_config_key = "sources.gitea_token"
+
+    @classmethod
+    def matches(cls, host: str, get_config: Callable[..., Any]) -> bool:
+        return host in [str(h).strip().lower() for h in get_config("sources.gitea_hosts", ["codeberg.org"])]
+
+    def _api_base(self, repo: RepositoryRef) -> str:
+        return f"https://{self.host}/api/v1/repos/{repo.full_name}"
+
+    def auth_headers(self, url: str) -> Dict[str, str]:
+        from urllib.parse import urlparse
+        token = str(self.get_config(self.token_config_key, "")).strip()
+        if token and urlparse(url).hostname == self.host:
+            return {'Authorization': f"token {token}"}
+        return {}
+
+    def archive_url(self, repo: RepositoryRef) -> Optional[str]:
+        return f"{self._api_base(repo)}/archive/{repo.ref}.zip"
+
+    async def resolve_commit(self, repo: RepositoryRef) -> Optional[str]:
+        query = "limit=1&per_page=1" + ("" if repo.ref == "HEAD" else f"&sha={repo.ref}")
+        data = await self._read_json(f"{self._api_base(repo)}/commits?{query}", f"{repo.full_name} 的最新提交")
+        return data[0].get('sha') if isinstance(data, list) and data else None
+
+    async def resolve_version(self, repo: RepositoryRef) -> Optional[str]:
+        data = await self._read_json(f"{self._api_base(repo)}/contents/{repo.path('_manifest.json')}{self._ref_query(repo)}",
+                                     f"{repo.full_name} 的manifest")
+        if not data or 'content' not in data:
+            return None
+        return self._version_from_manifest_text(base64.b64decode(data['content']).decode('utf-8'))
+
+    async def list_tree(self, repo: RepositoryRef, path: str = "") -> Optional[List[Dict[str, Any]]]:
+        data = await self._read_json(f"{self._api_base(repo)}/contents/{path}{self._ref_query(repo)}",
+                                     f"{repo.full_name} 的文件列表")
+        if not isinstance(data, list):
+            return None
+        return [
+            {'name': item['name'], 'path': item.get('path', item['name']), 'type': item['type'],
+             'size': item.get('size'), 'download_url': item.get('download_url'), 'sha': item.get('sha')}
+            for item in data
+        ]
+
+    async def list_tree_recursive(self, repo: RepositoryRef) -> Optional[List[Dict[str, Any]]]:
+        data = await self._read_json(f"{self._api_base(repo)}/git/trees/{repo.ref}?recursive=1&per_page=10000",
+                                     f"{repo.full_name} 的完整文件列表")
+        if not isinstance(data, dict) or data.get('truncated') or not isinstance(data.get('tree'), list):
+            return None
+        return [
+            {'name': item['path'].rsplit("/", 1)[-1], 'path': item['path'],
+             'type': 'file' if item['type'] == 'blob' else 'dir', 'size': item.get('size'),
+             'download_url': f"{self._api_base(repo)}/raw/{item['path']}{self._ref_query(repo)}"
+             if item['type'] == 'blob' else None,
+             'sha': item.get('sha')}
+            for item in data['tree'] if item['type'] in ('blob', 'tree')
+        ]
+
+
+class GiteeProvider(GiteaProvider):
+    """Gitee - /api/v5 contents API，Token通过 access_token 查询参数传递"""
+
+    name = "Gitee"
+    token_config_key = "sources.gitee_token"
+
+    @classmethod
+    def matches(cls, host: str, get_config: Callable[..., Any]) -> bool:
+        return host in ("gitee.com", "www.gitee.com")
+
+    def _api_base(self, repo: RepositoryRef) -> str:
+        return f"https://gitee.com/api/v5/repos/{repo.full_name}"
+
+    def auth_headers(self, url: str) -> Dict[str, str]:
+        return {}
+
+    async def _read_json(self, url: str, label: str) -> Optional[Any]:
+        token = str(self.get_config(self.token_config_key, "")).strip()
+        if token:
+            url += ("&" if "?" in url else "?") + f"access_token={token}"
+        return await super()._read_json(url, label)
+
+    def archive_url(self, repo: RepositoryRef) -> Optional[str]:
+        return f"https://gitee.com/{repo.full_name}/repository/archive/{repo.ref}.zip"
+
+
+class GitLabProvider(SourceProvider):
+    """GitLab - /api/v4 repository API，支持子群组路径"""
+
+    name = "GitLab"
+    min_request_interval = 0.5
+
+    @classmethod
+    def matches(cls, host: str, get_config: Callable[..., Any]) -> bool:
+        return host in [str(h).strip().lower() for h in get_config("sources.gitlab_hosts", ["gitlab.com"])]
+
+    def parse_repository(self, repository_url: str) -> Optional[RepositoryRef]:
+        from urllib.parse import urlparse
+        parts, ref, subpath = _split_repository_path([p for p in urlparse(repository_url.strip()).path.split("/") if p])
+        path = "/".join(parts)
+        path = path[:-4] if path.endswith(".git") else path
+        if "/" not in path:
+            source_logger.warning(f"无效的仓库路径: {repository_url}")
+            return None
+        owner, repo_name = path.rsplit("/", 1)
+        return RepositoryRef(repository_url, self.host, owner, repo_name, ref=ref, subpath=subpath)
+
+    def _project_api(self, repo: RepositoryRef) -> str:
+        from urllib.parse import quote
+        return f"https://{self.host}/api/v4/projects/{quote(repo.full_name, safe='')}"
+
+    def _raw_file_url(self, repo: RepositoryRef, path: str) -> str:
+        from urllib.parse import quote
+        return f"{self._project_api(repo)}/repository/files/{quote(path, safe='')}/raw?ref={repo.ref}"
+
+    def auth_headers(self, url: str) -> Dict[str, str]:
+        from urllib.parse import urlparse
+        token = str(self.get_config("sources.gitlab_token", "")).strip()
+        if token and urlparse(url).hostname == self.host:
+            return {'PRIVATE-TOKEN': token}
+        return {}
+
+    def archive_url(self, repo: RepositoryRef) -> Optional[str]:
+        return f"{self._project_api(repo)}/repository/archive.zip?sha={repo.ref}"
+
+    async def resolve_commit(self, repo: RepositoryRef) -> Optional[str]:
+        data = await self._read_json(f"{self._project_api(repo)}/repository/commits/{repo.ref}",
+                                     f"{repo.full_name} 的最新提交")
+        return data.get('id') if isinstance(data, dict) else None
+
+    async def resolve_version(self, repo: RepositoryRef) -> Optional[str]:
+        async def parse_raw(response: aiohttp.ClientResponse) -> Optional[str]:
+            if response.status != 200:
+                self._log_error_response(response)
+                return None
+            return self._version_from_manifest_text(await response.text(encoding='utf-8'))
+        return await self.request(self._raw_file_url(repo, repo.path("_manifest.json")), parse_raw,
+                                  label=f"{repo.full_name} 的manifest", rate_limited=True)
+
+    async def list_tree(self, repo: RepositoryRef, path: str = "") -> Optional[List[Dict[str, Any]]]:
+        from urllib.parse import quote
+        url = f"{self._project_api(repo)}/repository/tree?ref={repo.ref}&per_page=100&path={quote(path, safe='')}"
+        data = await self._read_json(url, f"{repo.full_name} 的文件列表")
+        if not isinstance(data, list):
+            return None
+        return [
+            {'name': item['name'], 'path': item['path'], 'type': 'file' if item['type'] == 'blob' else 'dir',
+             'size': None, 'download_url': self._raw_file_url(repo, item['path']) if item['type'] == 'blob' else None,
+             'sha': item.get('id')}
+            for item in data
+        ]
+
+    async def list_tree_recursive(self, repo: RepositoryRef) -> Optional[List[Dict[str, Any]]]:
+        entries = []
+        for page in range(1, 51):
+            url = f"{self._project_api(repo)}/repository/tree?ref={repo.ref}&recursive=true&per_page=100&page={page}"
+            data = await self._read_json(url, f"{repo.full_name} 的完整文件列表")
+            if not isinstance(data, list):
+                return None
+            entries.extend(
+                {'name': item['name'], 'path': item['path'], 'type': 'file' if item['type'] == 'blob' else 'dir',
+                 'size': None, 'download_url': self._raw_file_url(repo, item['path']) if item['type'] == 'blob' else None,
+                 'sha': item.get('id')}
+                for item in data
+            )
+            if len(data) < 100:
+                return entries
+        return None
+
+
+class LocalPathProvider(SourceProvider):
+    """本地目录 (file://) - 直接从磁盘读取，不经过网络"""
+
+    name = "本地路径"
+
+    def parse_repository(self, repository_url: str) -> Optional[RepositoryRef]:
+        from urllib.parse import urlparse, unquote
+        parsed = urlparse(repository_url.strip())
+        local_path = Path(unquote(parsed.netloc + parsed.path) if os.name == "nt" else unquote(parsed.path))
+        if not local_path.is_dir():
+            source_logger.warning(f"本地仓库目录不存在: {local_path}")
+            return None
+        return RepositoryRef(repository_url, "", "", local_path.name, local_path=local_path)
+
+    async def resolve_version(self, repo: RepositoryRef) -> Optional[str]:
+        manifest_file = repo.local_path / repo.path("_manifest.json")
+        if not manifest_file.exists():
+            source_logger.warning("仓库或manifest文件不存在")
+            return None
+        return self._version_from_manifest_text(manifest_file.read_text(encoding='utf-8'))
+
+    async def list_tree(self, repo: RepositoryRef, path: str = "") -> Optional[List[Dict[str, Any]]]:
+        directory = repo.local_path / path if path else repo.local_path
+        if not directory.is_dir():
+            return None
+        return [
+            {'name': item.name, 'path': item.relative_to(repo.local_path).as_posix(),
+             'type': 'file' if item.is_file() else 'dir',
+             'size': item.stat().st_size if item.is_file() else None,
+             'download_url': item.as_uri() if item.is_file() else None, 'local_path': item}
+            for item in sorted(directory.iterdir())
+        ]
+
+    async def fetch_file(self, entry: Dict[str, Any], temp_path: Path, budget: DownloadBudget) -> bool:
+        source = entry['local_path']
+        budget.check_file_size(entry['name'], entry.get('size'))
+        budget.consume(entry['name'], entry.get('size') or 0, entry.get('size') or 0)
+        await asyncio.get_running_loop().run_in_executor(None, shutil.copy2, source, temp_path / entry['name'])
+        source_logger.debug(f"复制成功: {entry['name']}")
+        return True
+
+    async def fetch_archive(self, repo: RepositoryRef, dest: Path, budget: DownloadBudget) -> bool:
+        base_name = str(dest.with_suffix(""))
+        await asyncio.get_running_loop().run_in_executor(
+            None, shutil.make_archive, base_name, "zip", str(repo.local_path)
+        )
+        return dest.exists()
+
+
+class LocalMirrorProvider(LocalPathProvider):
+    """离线镜像目录 - 从本地的裸git仓库或按版本命名的zip归档读取，完全不访问网络
+
+    目录结构（<owner>/<repo> 取自仓库地址，也可以在前面加一层域名目录）:
+    - <mirror_dir>/<owner>/<repo>.git          裸git仓库，读取 HEAD
+    - <mirror_dir>/<owner>/<repo>/<版本>.zip    按版本命名的归档，可附带同名 <版本>.json manifest
+    - <mirror_dir>/<owner>/<repo>/_manifest.json 普通目录（直接作为插件源码）
+    """
+
+    name = "离线镜像"
+
+    def _mirror_root(self) -> Path:
+        return Path(str(self.get_config("offline.mirror_dir", ""))).expanduser()
+
+    def parse_repository(self, repository_url: str) -> Optional[RepositoryRef]:
+        from urllib.parse import urlparse
+        parsed = urlparse(repository_url.strip())
+        parts, _, subpath = _split_repository_path([p for p in parsed.path.strip("/").split("/") if p])
+        if len(parts) < 2:
+            source_logger.warning(f"无效的仓库路径: {repository_url}")
+            return None
+        owner, repo_name = parts[-2], parts[-1][:-4] if parts[-1].endswith(".git") else parts[-1]
+        host = (parsed.hostname or "").lower()
+        root = self._mirror_root()
+        for base in ([root / host] if host else []) + [root]:
+            for candidate in (base / owner / f"{repo_name}.git", base / owner / repo_name):
+                if candidate.is_dir():
+                    # 离线镜像只保存默认分支，地址中的分支被忽略
+                    return RepositoryRef(repository_url, host, owner, repo_name, local_path=candidate, subpath=subpath)
+        source_logger.warning(f"离线镜像中没有找到仓库 {owner}/{repo_name}（镜像目录: {root}）")
+        return None
+
+    # ---- 裸git仓库 ----
+
+    @staticmethod
+    def _is_git_repo(repo: RepositoryRef) -> bool:
+        return (repo.local_path / "HEAD").is_file() and (repo.local_path / "objects").is_dir()
+
+    async def _git(self, repo: RepositoryRef, *args: str) -> Optional[bytes]:
+        """在线程池中执行git命令，失败时返回None"""
+        import subprocess
+        if not shutil.which("git"):
+            source_logger.error("离线镜像中的裸仓库需要安装git")
+            return None
+        def run() -> subprocess.CompletedProcess:
+            return subprocess.run(["git", f"--git-dir={repo.local_path}", *args], capture_output=True)
+        result = await asyncio.get_running_loop().run_in_executor(None, run)
+        if result.returncode != 0:
+            source_logger.warning(f"git {' '.join(args)} 失败: {result.stderr.decode('utf-8', 'replace').strip()}")
+            return None
+        return result.stdout
+
+    # ---- 按版本命名的归档 ----
+
+    @staticmethod
+    def _archive_version_key(version: str) -> Tuple:
+        """按 parse_version 的规则排序（1.0.0-beta 低于 1.0.0），无法解析的文件名排在最前并按名称排序"""
+        parsed = parse_version(version)
+        return (1, parsed, version) if parsed is not None else (0, version)
+
+    def _latest_archive(self, repo: RepositoryRef) -> Optional[Path]:
+        archives = sorted(repo.local_path.glob("*.zip"), key=lambda p: self._archive_version_key(p.stem))
+        return archives[-1] if archives else None
+
+    @staticmethod
+    def _archive_prefix(names: List[str]) -> str:
+        """GitHub等平台导出的归档通常带有一层顶级目录，返回该前缀"""
+        tops = {name.split("/", 1)[0] for name in names}
+        if len(tops) == 1 and all("/" in name for name in names):
+            return tops.pop() + "/"
+        return ""
+
+    # ---- 提供者接口 ----
+
+    async def resolve_version(self, repo: RepositoryRef) -> Optional[str]:
+        if self._is_git_repo(repo):
+            content = await self._git(repo, "show", f"HEAD:{repo.path('_manifest.json')}")
+            return self._version_from_manifest_text(content.decode("utf-8")) if content else None
+        if (repo.local_path / "_manifest.json").exists():
+            return await super().resolve_version(repo)
+        archive = self._latest_archive(repo)
+        if archive is None:
+            source_logger.warning(f"离线镜像目录中没有归档: {repo.local_path}")
+            return None
+        manifest_file = archive.with_suffix(".json")
+        if manifest_file.exists() and not repo.subpath:
+            return self._version_from_manifest_text(manifest_file.read_text(encoding="utf-8"))
+        import zipfile
+        with zipfile.ZipFile(archive) as zf:
+            member = self._archive_prefix(zf.namelist()) + repo.path("_manifest.json")
+            if member in zf.namelist():
+                return self._version_from_manifest_text(zf.read(member).decode("utf-8"))
+        return archive.stem.lstrip("vV")
+
+    async def list_tree(self, repo: RepositoryRef, path: str = "") -> Optional[List[Dict[str, Any]]]:
+        path = path.strip("/")
+        if self._is_git_repo(repo):
+            # -z: 不对非ASCII路径加引号转义，记录以 \0 分隔
+            output = await self._git(repo, "ls-tree", "-z", "-l", "HEAD", "--", f"{path}/" if path else ".")
+            if output is None:
+                return None
+            entries = []
+            for record in output.decode("utf-8").split("\0"):
+                if not record:
+                    continue
+                meta, item_path = record.split("\t", 1)
+                _, item_type, object_id, size = meta.split()
+                entries.append({
+                    'name': item_path.rsplit("/", 1)[-1], 'path': item_path,
+                    'type': 'file' if item_type == 'blob' else 'dir',
+                    'size': int(size) if size.isdigit() else None,
+                    'download_url': f"{repo.local_path.as_uri()}#HEAD:{item_path}" if item_type == 'blob' else None,
+                    'sha': object_id, 'git_dir': repo.local_path, 'git_object': f"HEAD:{item_path}",
+                })
+            return entries
+        if (repo.local_path / "_manifest.json").exists():
+            return await super().list_tree(repo, path)
+        archive = self._latest_archive(repo)
+        if archive is None:
+            return None
+        import zipfile
+        with zipfile.ZipFile(archive) as zf:
+            infos = zf.infolist()
+            base = self._archive_prefix([info.filename for info in infos]) + (f"{path}/" if path else "")
+            entries: Dict[str, Dict[str, Any]] = {}
+            for info in infos:
+                if not info.filename.startswith(base) or info.filename == base:
+                    continue
+                name, _, rest = info.filename[len(base):].partition("/")
+                if rest or info.is_dir():
+                    entries.setdefault(name, {'name': name, 'path': f"{path}/{name}".strip("/"), 'type': 'dir',
+                                              'size': None, 'download_url': None})
+                else:
+                    entries[name] = {'name': name, 'path': f"{path}/{name}".strip("/"), 'type': 'file',
+                                     'size': info.file_size, 'download_url': f"{archive.as_uri()}#{info.filename}",
+                                     'zip_path': archive, 'zip_member': info.filename}
+        return list(entries.values())
+
+    async def fetch_file(self, entry: Dict[str, Any], temp_path: Path, budget: DownloadBudget) -> bool:
+        if 'local_path' in entry:
+            return await super().fetch_file(entry, temp_path, budget)
+        budget.check_file_size(entry['name'], entry.get('size'))
+        if 'git_object' in entry:
+            repo = RepositoryRef("", "", "", entry['git_dir'].name, local_path=entry['git_dir'])
+            content = await self._git(repo, "cat-file", "blob", entry['git_object'])
+            if content is None:
+                return False
+            budget.consume(entry['name'], len(content), len(content))
+            (temp_path / entry['name']).write_bytes(content)
+        else:
+            import zipfile
+            def extract() -> int:
+                with zipfile.ZipFile(entry['zip_path']) as zf, zf.open(entry['zip_member']) as src, \
+                        open(temp_path / entry['name'], 'wb') as dst:
+                    written = 0
+                    while True:
+                        chunk = src.read(DOWNLOAD_CHUNK_SIZE)
+                        if not chunk:
+                            return written
+                        written += len(chunk)
+                        budget.consume(entry['name'], written, len(chunk))
+                        dst.write(chunk)
+            await asyncio.get_running_loop().run_in_executor(None, extract)
+        source_logger.debug(f"从离线镜像读取成功: {entry['name']}")
+        return True
+
+    async def resolve_commit(self, repo: RepositoryRef) -> Optional[str]:
+        if not self._is_git_repo(repo):
+            return None
+        output = await self._git(repo, "rev-parse", "HEAD")
+        return output.decode("utf-8").strip() if output else None
+
+    async def fetch_archive(self, repo: RepositoryRef, dest: Path, budget: DownloadBudget) -> bool:
+        if self._is_git_repo(repo):
+            return await self._git(repo, "archive", "--format=zip", f"--output={dest}", "HEAD") is not None
+        archive = self._latest_archive(repo)
+        if archive is not None and not (repo.local_path / "_manifest.json").exists():
+            budget.check_file_size(dest.name, archive.stat().st_size)
+            shutil.copy2(archive, dest)
+            return True
+        return await super().fetch_archive(repo, dest, budget)
+
+
+class LanCacheProvider(SourceProvider):
+    """局域网缓存 - 通过同一网络中开启了缓存服务的插件管理器实例获取版本、文件列表和文件"""
+
+    name = "局域网缓存"
+    connection_limit = 16
+
+    def _upstream(self) -> str:
+        return str(self.get_config("lan_cache.upstream", "")).strip().rstrip("/")
+
+    def auth_headers(self, url: str) -> Dict[str, str]:
+        token = str(self.get_config("lan_cache.token", "")).strip()
+        if token and url.startswith(self._upstream()):
+            return {LAN_CACHE_TOKEN_HEADER: token}
+        return {}
+
+    def parse_repository(self, repository_url: str) -> Optional[RepositoryRef]:
+        from urllib.parse import urlparse
+        parsed = urlparse(repository_url.strip())
+        parts, ref, subpath = _split_repository_path([p for p in parsed.path.strip("/").split("/") if p])
+        owner, repo_name = (parts[-2], parts[-1]) if len(parts) >= 2 else ("", parts[-1] if parts else repository_url)
+        return RepositoryRef(repository_url, (parsed.hostname or "").lower(), owner, repo_name, ref=ref, subpath=subpath)
+
+    def _endpoint(self, action: str, repo: RepositoryRef, path: Optional[str] = None) -> str:
+        from urllib.parse import urlencode
+        query = {'url': repo.url}
+        if path is not None:
+            query['path'] = path
+        return f"{self._upstream()}/v1/{action}?{urlencode(query)}"
+
+    def archive_url(self, repo: RepositoryRef) -> Optional[str]:
+        return self._endpoint("archive", repo)
+
+    async def resolve_version(self, repo: RepositoryRef) -> Optional[str]:
+        data = await self._read_json(self._endpoint("version", repo), f"{repo.full_name} 的manifest(局域网缓存)")
+        return data.get('version') if data else None
+
+    async def list_tree(self, repo: RepositoryRef, path: str = "") -> Optional[List[Dict[str, Any]]]:
+        data = await self._read_json(self._endpoint("tree", repo, path), f"{repo.full_name} 的文件列表(局域网缓存)")
+        if not data:
+            return None
+        entries = data.get('entries', [])
+        for entry in entries:
+            if entry['type'] == 'file':
+                entry['download_url'] = self._endpoint("file", repo, entry['path'])
+        return entries
+
+
+# 局域网缓存服务的访问令牌请求头
+LAN_CACHE_TOKEN_HEADER = "X-Plugin-Manager-Token"
+
+
+class LanCacheServer:
+    """局域网更新缓存服务 - 代替局域网内的其他实例访问插件源
+
+    对外提供 /v1/version、/v1/tree、/v1/file、/v1/archive 四个接口（参数 url=仓库地址，path=文件路径），
+    manifest版本和文件列表在内存中按TTL缓存，文件内容按内容哈希缓存到磁盘，同一资源的并发请求只会访问插件源一次。
+    只代理已安装插件（以及 allowed_repositories 中）的远程HTTP仓库，必须设置访问令牌。
+    上游返回不存在时响应404，上游故障时响应502/503；失败结果短时间缓存，避免客户端重试时反复访问上游。
+    """
+
+    def __init__(self, get_config: Callable[..., Any]):
+        # 服务端自身必须直连插件源，不能再转发给上游缓存
+        self.get_config = lambda key, default=None: "" if key == "lan_cache.upstream" else get_config(key, default)
+        self.cache_dir = Path(__file__).parent / ".lan_cache"
+        self._memory: Dict[str, Tuple[float, Any, Optional[int]]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._allowed: Tuple[float, Set[str]] = (0.0, set())
+        self._runner = None
+
+    async def start(self) -> None:
+        if not str(self.get_config("lan_cache.token", "")).strip():
+            raise RuntimeError("未设置 lan_cache.token，为避免局域网内任何人通过本机访问插件源，拒绝启动")
+        app = web.Application(middlewares=[self._auth_middleware])
+        app.router.add_get("/v1/version", self._handle_version)
+        app.router.add_get("/v1/tree", self._handle_tree)
+        app.router.add_get("/v1/file", self._handle_file)
+        app.router.add_get("/v1/archive", self._handle_archive)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        host = str(self.get_config("lan_cache.host", "127.0.0.1"))
+        port = int(self.get_config("lan_cache.port", 8790))
+        await web.TCPSite(self._runner, host, port).start()
+        service_logger.info(f"局域网缓存服务已启动: http://{host}:{port}")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @property
+    def _ttl(self) -> float:
+        return float(self.get_config("lan_cache.ttl_seconds", 300))
+
+    @property
+    def _negative_ttl(self) -> float:
+        return float(self.get_config("lan_cache.negative_ttl_seconds", 30))
+
+    async def _cached(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[int]]:
+        """带TTL的内存缓存，同一个key的并发加载合并为一次，返回 (值, 失败时上游的错误状态码)
+
+        失败的结果也会缓存 negative_ttl_seconds 秒。
+        """
+        cached = self._memory.get(key)
+        if cached and cached[0] > time.time():
+            return cached[1], cached[2]
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            cached = self._memory.get(key)
+            if cached and cached[0] > time.time():
+                return cached[1], cached[2]
+            _UPSTREAM_ERROR_STATUS.set(None)
+            value = await loader()
+            status = None if value is not None else _UPSTREAM_ERROR_STATUS.get()
+            ttl = self._ttl if value is not None else self._negative_ttl
+            self._memory[key] = (time.time() + ttl, value, status)
+            return value, status
+
+    @staticmethod
+    def _upstream_error(status: Optional[int], message: str) -> web.HTTPException:
+        """按上游的错误状态选择响应：不存在为404，限流为503，其余为502"""
+        if status == 404:
+            return web.HTTPNotFound(text=message)
+        if status in (403, 429):
+            return web.HTTPServiceUnavailable(text=f"{message}（上游限流）")
+        return web.HTTPBadGateway(text=message)
+
+    def _allowed_repositories(self) -> Set[str]:
+        """允许代理的仓库：已安装插件的仓库地址和配置的额外地址，按TTL重新扫描"""
+        expires, allowed = self._allowed
+        if expires > time.time():
+            return allowed
+        command = _create_background_command(self.get_config)
+        allowed = {normalize_repository_url(p.repository_url)
+                   for p in command._scan_plugins(command._get_plugins_directory()) if p.repository_url}
+        allowed.update(normalize_repository_url(str(url)) for url in self.get_config("lan_cache.allowed_repositories", []))
+        self._allowed = (time.time() + self._ttl, allowed)
+        return allowed
+
+    def _resolve(self, request) -> Tuple[SourceProvider, RepositoryRef]:
+        from urllib.parse import urlparse
+        repository_url = request.query.get("url", "")
+        # 只代理远程HTTP仓库，file://、离线镜像和插件索引地址一律拒绝，避免读取本机文件
+        if urlparse(repository_url.strip()).scheme not in ("http", "https"):
+            raise web.HTTPBadRequest(text=f"不支持的仓库地址: {repository_url}")
+        provider = get_source_provider(repository_url, self.get_config)
+        if not isinstance(provider, tuple(SOURCE_PROVIDER_TYPES)):
+            raise web.HTTPBadRequest(text=f"不支持的仓库地址: {repository_url}")
+        if normalize_repository_url(repository_url) not in self._allowed_repositories():
+            raise web.HTTPForbidden(text=f"仓库不在允许列表中: {repository_url}")
+        repo = provider.parse_repository(repository_url)
+        if repo is None:
+            raise web.HTTPBadRequest(text=f"不支持的仓库地址: {repository_url}")
+        return provider, repo
+
+    @web.middleware
+    async def _auth_middleware(self, request, handler):
+        import hmac
+        token = str(self.get_config("lan_cache.token", "")).strip()
+        if not token or not hmac.compare_digest(request.headers.get(LAN_CACHE_TOKEN_HEADER, ""), token):
+            raise web.HTTPUnauthorized(text="令牌错误")
+        return await handler(request)
+
+    async def _handle_version(self, request):
+        provider, repo = self._resolve(request)
+        version, status = await self._cached(f"version:{repo.url}", lambda: provider.resolve_version(repo))
+        if version is None:
+            raise self._upstream_error(status, "无法获取远程版本")
+        return web.json_response({'version': version})
+
+    async def _list_tree(self, provider: SourceProvider, repo: RepositoryRef,
+                         path: str) -> Tuple[Optional[List[Dict[str, Any]]], Optional[int]]:
+        return await self._cached(f"tree:{repo.url}:{path}", lambda: provider.list_tree(repo, path))
+
+    async def _handle_tree(self, request):
+        provider, repo = self._resolve(request)
+        path = request.query.get("path", "").strip("/")
+        entries, status = await self._list_tree(provider, repo, path)
+        if entries is None:
+            raise self._upstream_error(status, "无法获取文件列表")
+        public_keys = ('name', 'path', 'type', 'size', 'sha')
+        return web.json_response({'entries': [{k: e.get(k) for k in public_keys} for e in entries]})
+
+    async def _fetch_blob(self, key: str, fetch: Callable[[Path, DownloadBudget], Awaitable[bool]]
+                          ) -> Tuple[Optional[Path], Optional[int]]:
+        """按key缓存到磁盘的内容，缺失时通过fetch下载，同一key只会下载一次；失败时返回上游的错误状态码"""
+        import hashlib
+        blob_path = self.cache_dir / "blobs" / hashlib.sha256(key.encode("utf-8")).hexdigest()
+        if blob_path.exists():
+            return blob_path, None
+        async with self._locks.setdefault(f"blob:{key}", asyncio.Lock()):
+            if blob_path.exists():
+                return blob_path, None
+            failed = self._memory.get(f"blob:{key}")
+            if failed and failed[0] > time.time():
+                return None, failed[2]
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            budget = DownloadBudget(
+                int(self.get_config("network.max_file_size_mb", 50) * 1024 * 1024),
+                int(self.get_config("network.max_update_size_mb", 200) * 1024 * 1024),
+            )
+            with tempfile.TemporaryDirectory(dir=blob_path.parent) as temp_dir:
+                temp_file = Path(temp_dir) / "blob"
+                _UPSTREAM_ERROR_STATUS.set(None)
+                if not await fetch(temp_file, budget) or not temp_file.exists():
+                    status = _UPSTREAM_ERROR_STATUS.get()
+                    self._memory[f"blob:{key}"] = (time.time() + self._negative_ttl, None, status)
+                    return None, status
+                temp_file.replace(blob_path)
+        return blob_path, None
+
+    async def _handle_file(self, request):
+        provider, repo = self._resolve(request)
+        path = request.query.get("path", "").strip("/")
+        parent, _, name = path.rpartition("/")
+        entries, status = await self._list_tree(provider, repo, parent)
+        if entries is None:
+            raise self._upstream_error(status, "无法获取文件列表")
+        entry = next((e for e in entries if e['name'] == name and e['type'] == 'file'), None)
+        if entry is None:
+            raise web.HTTPNotFound(text=f"文件不存在: {path}")
+        # 有内容哈希时按哈希缓存，否则按地址和大小缓存（TTL内的文件列表保证不会取到旧内容）
+        key = f"sha:{entry['sha']}" if entry.get('sha') else f"file:{repo.url}:{path}:{entry.get('size')}"
+
+        async def fetch(dest: Path, budget: DownloadBudget) -> bool:
+            if not await provider.fetch_file(entry, dest.parent, budget):
+                return False
+            (dest.parent / entry['name']).replace(dest)
+            return True
+
+        blob_path, status = await self._fetch_blob(key, fetch)
+        if blob_path is None:
+            raise self._upstream_error(status, f"无法下载文件: {path}")
+        return web.FileResponse(blob_path)
+
+    async def _handle_archive(self, request):
+        provider, repo = self._resolve(request)
+        version, status = await self._cached(f"version:{repo.url}", lambda: provider.resolve_version(repo))
+        if version is None:
+            raise self._upstream_error(status, "无法获取远程版本")
+        blob_path, status = await self._fetch_blob(
+            f"archive:{repo.url}:{version}", lambda dest, budget: provider.fetch_archive(repo, dest, budget)
+        )
+        if blob_path is None:
+            raise self._upstream_error(status, "无法下载归档")
+        return web.FileResponse(blob_path, headers={'Content-Type': 'application/zip'})
+
+
+# 按顺序匹配的提供者类型，file:// 、离线模式和局域网缓存单独处理
+SOURCE_PROVIDER_TYPES: List[Type[SourceProvider]] = [GitHubProvider, GiteeProvider, GitLabProvider, GiteaProvider]
+_SOURCE_PROVIDERS: Dict[Tuple[str, str], SourceProvider] = {}
+
+
+def get_source_provider(repository_url: str, get_config: Callable[..., Any]) -> Optional[SourceProvider]:
+    """根据仓库地址选择提供者，同一站点复用同一个实例（及其连接池和频率限制）"""
+    from urllib.parse import urlparse
+    if not repository_url:
+        return None
+    parsed = urlparse(repository_url.strip())
+    if get_config("offline.enabled", False):
+        # 离线模式下所有仓库都从本地镜像目录读取
+        provider_type, host = LocalMirrorProvider, "offline"
+    elif str(get_config("lan_cache.upstream", "")).strip():
+        # 指定了局域网缓存上游时，所有仓库都通过上游实例获取
+        provider_type, host = LanCacheProvider, "lan_cache"
+    elif parsed.scheme == "file":
+        provider_type, host = LocalPathProvider, ""
+    else:
+        host = (parsed.hostname or "").lower()
+        provider_type = next((t for t in SOURCE_PROVIDER_TYPES if t.matches(host, get_config)), None)
+        if provider_type is None:
+            return None
+    key = (provider_type.name, host)
+    provider = _SOURCE_PROVIDERS.get(key)
+    if provider is None:
+        provider = _SOURCE_PROVIDERS[key] = provider_type(host)
+    provider.get_config = get_config
+    return provider
+
+
+_VERSION_PATTERN = re.compile(
+    r"^[vV]?(?P<release>\d+(?:\.\d+)*)"
+    r"(?:[-_.]?(?P<prerelease>[0-9A-Za-z]+(?:[.-][0-9A-Za-z]+)*))?"
+    r"(?:\+(?P<build>[0-9A-Za-z.-]+))?$"
+)
+# PEP 440 的后发布版本：1.2.0.post1、1.2.0-r2、1.2.0post（1.2.0-1 按 semver 是预发布版本，不属于此类）
+_POST_RELEASE_PATTERN = re.compile(r"(?:post|rev|r)[.-]?(?P<number>\d*)", re.IGNORECASE)
+
+
+@functools.total_ordering
+class Version:
+    """解析后的版本号 - 支持 semver 以及 v1.2、1.2.0beta1、1.2-rc.1 等常见写法
+
+    末尾的 .0 不影响比较（1.2 == 1.2.0），带预发布标签的版本低于同号正式版，
+    预发布标签按 semver 规则逐段比较（数字段按数值，数字段低于字母段）。构建元数据（+xxx）不参与比较。
+    显式的后发布版本（1.2.0.post1、1.2.0-r2）高于同号正式版、低于下一个版本，按后发布编号比较；
+    1.2.0-1 这种只有数字的后缀按 semver 视为预发布版本。
+
+    >>> versions = ["1.2.1", "1.2.0-1", "1.2.0.post2", "1.2.0", "1.2.0-rc.1", "1.2.0.post1"]
+    >>> [v.text for v in sorted(map(parse_version, versions))]
+    ['1.2.0-1', '1.2.0-rc.1', '1.2.0', '1.2.0.post1', '1.2.0.post2', '1.2.1']
+    >>> parse_version("1.2.0-1") < parse_version("1.2.0")
+    True
+    >>> parse_version("1.2.0.post1") < parse_version("1.2.1-beta")
+    True
+    """
+
+    __slots__ = ('text', 'release', 'prerelease', 'post', '_key')
+
+    def __init__(self, text: str, release: Tuple[int, ...], prerelease: Tuple[Union[int, str], ...],
+                 post: Optional[int] = None):
+        self.text = text
+        self.release = release
+        self.prerelease = prerelease
+        self.post = post
+        trimmed = release
+        while len(trimmed) > 1 and trimmed[-1] == 0:
+            trimmed = trimmed[:-1]
+        pre_key = tuple((0, part, "") if isinstance(part, int) else (1, 0, part) for part in prerelease)
+        if post is not None:
+            self._key = (trimmed, (2, post))
+        else:
+            self._key = (trimmed, (0,) + pre_key if prerelease else (1,))
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Version) and self._key == other._key
+
+    def __lt__(self, other: "Version") -> bool:
+        return self._key < other._key
+
+    def __hash__(self) -> int:
+        return hash(self._key)
+
+    def __repr__(self) -> str:
+        return f"Version({self.text!r})"
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_version(text: str) -> Optional[Version]:
+    """解析版本号字符串，无法解析时返回None"""
+    match = _VERSION_PATTERN.match(str(text).strip())
+    if not match:
+        return None
+    release = tuple(int(part) for part in match.group('release').split("."))
+    suffix = match.group('prerelease') or ""
+    post_match = _POST_RELEASE_PATTERN.fullmatch(suffix)
+    if post_match:
+        return Version(match.group(0), release, (), int(post_match.group('number') or 0))
+    prerelease: List[Union[int, str]] = []
+    for identifier in re.split(r"[.-]", suffix):
+        # beta1 与 beta.1 等价
+        for part in re.findall(r"\d+|[A-Za-z]+", identifier):
+            prerelease.append(int(part) if part.isdigit() else part.lower())
+    return Version(match.group(0), release, tuple(prerelease))
+
+
+def compare_versions(local_version: str, remote_version: str) -> Optional[int]:
+    """比较本地与远程版本：远程较新返回1，相同返回0，远程较旧返回-1，任一方无法解析时返回None"""
+    local, remote = parse_version(local_version), parse_version(remote_version)
+    if local is None or remote is None:
+        return None
+    return (remote > local) - (remote < local)
+
+
+def remote_is_newer(local_version: str, remote_version: Optional[str]) -> bool:
+    """远程版本严格新于本地时才需要更新；版本号无法解析时退回按字符串是否不同判断"""
+    if not remote_version:
+        return False
+    order = compare_versions(local_version, remote_version)
+    return remote_version != local_version if order is None else order > 0
+
+
+def remote_is_older(local_version: str, remote_version: Optional[str]) -> bool:
+    """远程版本低于本地（本地为开发版或远程回滚）"""
+    return bool(remote_version) and compare_versions(local_version, remote_version) == -1
+
+
+class PluginRecord:
+    """已安装插件的信息（由 _scan_plugins 生成）"""
+
+    __slots__ = ('name', 'local_version', 'repository_url', 'directory_name', 'directory_path',
+                 'needs_update', 'remote_version', 'update_error', 'reload_status',
+                 'dependency_error')
+
+    def __init__(self, name: str, local_version: str, repository_url: str, directory_name: str,
+                 directory_path: Path):
+        self.name = name
+        self.local_version = local_version
+        self.repository_url = repository_url
+        self.directory_name = directory_name
+        self.directory_path = directory_path
+        self.needs_update = False
+        self.remote_version: Optional[str] = None
+        self.update_error: Optional[str] = None  # 更新中止的原因，供回复消息使用
+        self.reload_status: Optional[str] = None  # 更新后热重载的结果，供回复消息使用
+        self.dependency_error: Optional[str] = None  # 更新后安装依赖失败的原因
+
+    def __repr__(self) -> str:
+        return f"PluginRecord({self.name!r}, v{self.local_version}, {self.directory_name!r})"
+
+
+def _trigrams(text: str) -> Set[str]:
+    """小写文本的字符三元组，首尾补空格使短名称和前缀也能匹配"""
+    padded = f"  {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PluginIndex:
+    """插件查找索引 - 按插件名、目录名和配置的别名（不区分大小写）O(1) 查找，
+    找不到时通过三元组倒排索引给出相近的插件名
+    """
+
+    # 召回候选时从最少见的三元组开始，累计的候选数超过该值后不再加入更常见的三元组
+    CANDIDATE_BUDGET = 256
+
+    def __init__(self, records: List[PluginRecord], aliases: Optional[Dict[str, str]] = None):
+        self.records = records
+        self._by_key: Dict[str, PluginRecord] = {}
+        for record in records:
+            self._by_key.setdefault(record.directory_name.lower(), record)
+        for record in records:
+            self._by_key[record.name.lower()] = record
+        for alias, target in (aliases or {}).items():
+            record = self._by_key.get(str(target).strip().lower())
+            if record is None:
+                command_logger.warning(f"插件别名 {alias} 指向的插件不存在: {target}")
+                continue
+            # 别名不覆盖真实的插件名或目录名
+            self._by_key.setdefault(str(alias).strip().lower(), record)
+
+        self._keys = list(self._by_key)
+        self._key_grams = [_trigrams(key) for key in self._keys]
+        self._postings: Dict[str, List[int]] = {}
+        for position, grams in enumerate(self._key_grams):
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(position)
+
+    def get(self, query: str) -> Optional[PluginRecord]:
+        return self._by_key.get(query.strip().lower())
+
+    def suggest(self, query: str, limit: int = 3, threshold: float = 0.3) -> List[str]:
+        """按三元组的 Dice 相似度返回最接近的插件名（去重，最多 limit 个）
+
+        候选只从最少见的几个三元组召回，再用集合交集精确打分。插件数不超过 CANDIDATE_BUDGET 时
+        结果是精确的；插件很多时，只和常见三元组重合的名称不会被召回，换来的是每次查询只检查少量候选。
+        """
+        grams = _trigrams(query.strip())
+        candidates: Set[int] = set()
+        for postings in sorted((self._postings.get(gram, []) for gram in grams), key=len):
+            if candidates and len(candidates) + len(postings) > self.CANDIDATE_BUDGET:
+                break
+            candidates.update(postings)
+        scored = []
+        for position in candidates:
+            key_grams = self._key_grams[position]
+            score = 2 * len(grams & key_grams) / (len(grams) + len(key_grams))
+            if score >= threshold:
+                scored.append((score, position))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        names: List[str] = []
+        for _, position in scored:
+            name = self._by_key[self._keys[position]].name
+            if name not in names:
+                names.append(name)
+                if len(names) >= limit:
+                    break
+        return names
+
+
+def normalize_repository_url(repository_url: str) -> str:
+    """规范化仓库地址用于比较（忽略大小写、协议后的www、结尾的斜杠和.git）"""
+    url = repository_url.strip().lower().rstrip("/")
+    url = url[:-4] if url.endswith(".git") else url
+    return url.replace("://www.", "://")
+
+
+def _repository_ref(repository_url: str) -> str:
+    """仓库地址中指定的分支，没有指定时为 HEAD（默认分支）"""
+    from urllib.parse import urlparse
+    return _split_repository_path([p for p in urlparse(repository_url.strip()).path.split("/") if p])[1]
+
+
+def _repository_root_url(repository_url: str) -> str:
+    """去掉分支和子目录部分后的规范化仓库地址，用于匹配同一仓库"""
+    from urllib.parse import urlparse
+    parsed = urlparse(normalize_repository_url(repository_url))
+    parts, _, _ = _split_repository_path([p for p in parsed.path.split("/") if p])
+    return normalize_repository_url(f"{parsed.scheme}://{parsed.netloc}/{'/'.join(parts)}")
+
+
+class RegistryIndexClient:
+    """插件索引 - 一个JSON文档列出多个插件的最新版本，一次下载代替逐个仓库请求
+
+    索引格式:
+    {"format_version": 1, "generated_at": <时间戳>, "plugins": [
+        {"name": ..., "repository_url": ..., "version": ..., "commit_sha": ..., "archive_sha256": ...}, ...]}
+
+    HTTP索引使用 If-None-Match 条件请求，ETag 和对应的内容保存在客户端中；
+    启用共享缓存时同时写入共享缓存，供同一主机上的其他进程使用。
+    """
+
+    name = "插件索引"
+    FORMAT_VERSION = 1
+
+    def __init__(self):
+        # 只借用插件源的会话、重试策略和录制/回放，本身不是插件源
+        self._http = SourceProvider("registry")
+        self._http.name = self.name
+        self._etags: Dict[str, Tuple[str, Any]] = {}
+
+    async def _fetch_json(self, url: str) -> Optional[Any]:
+        """条件请求下载索引，内容未变化（304）时返回上次的内容"""
+        cache = get_shared_cache(self._http.get_config)
+        cached = self._etags.get(url)
+        if cached is None and cache is not None:
+            shared = cache.read_json("etags", url)
+            cached = (shared['etag'], shared['body']) if shared else None
+        headers = {'If-None-Match': cached[0]} if cached else None
+
+        async def handle(response: aiohttp.ClientResponse) -> Optional[Any]:
+            if response.status == 304 and cached:
+                _count_request_stat("cache_hits")
+                return cached[1]
+            if response.status != 200:
+                source_logger.warning(f"下载插件索引失败: HTTP {response.status}")
+                return None
+            body = await response.json(content_type=None)
+            etag = response.headers.get('ETag')
+            if etag:
+                self._etags[url] = (etag, body)
+                if cache is not None:
+                    cache.write_json("etags", url, {'etag': etag, 'body': body})
+            return body
+        return await self._http.request(url, handle, headers=headers, label="插件索引")
+
+    async def load(self, index_url: str, get_config: Callable[..., Any]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """下载索引（HTTP条件请求或本地文件），返回 规范化仓库地址 -> 条目"""
+        from urllib.parse import urlparse, unquote
+        self._http.get_config = get_config
+        try:
+            if index_url.startswith("file://"):
+                with open(unquote(urlparse(index_url).path), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            else:
+                data = await self._fetch_json(index_url)
+        except Exception as e:
+            source_logger.warning(f"读取插件索引失败 {index_url}: {e}")
+            return None
+        if not isinstance(data, dict) or not isinstance(data.get('plugins'), list):
+            source_logger.warning(f"插件索引格式无效: {index_url}")
+            return None
+        return {
+            normalize_repository_url(item['repository_url']): item
+            for item in data['plugins'] if item.get('repository_url') and item.get('version')
+        }
+
+
+REGISTRY_INDEX_CLIENT = RegistryIndexClient()
+
+
+async def build_registry_index(repositories: List[Tuple[str, str]], get_config: Callable[..., Any],
+                               include_archive_hash: bool = True) -> Dict[str, Any]:
+    """根据 (插件名, 仓库地址) 列表生成插件索引文档，无法访问的仓库会被跳过并记录在 errors 中"""
+    import hashlib
+    plugins = []
+    errors = []
+    for name, repository_url in repositories:
+        provider = get_source_provider(repository_url, get_config)
+        repo = provider.parse_repository(repository_url) if provider else None
+        if repo is None:
+            errors.append(f"{repository_url}: 不支持的仓库地址")
+            continue
+        try:
+            version = await provider.resolve_version(repo)
+            if not version:
+                errors.append(f"{repository_url}: 无法获取版本")
+                continue
+            archive_sha256 = None
+            if include_archive_hash:
+                with tempfile.TemporaryDirectory() as temp_dir:
+                    archive_path = Path(temp_dir) / "archive.zip"
+                    budget = DownloadBudget(0, int(get_config("network.max_update_size_mb", 200) * 1024 * 1024))
+                    if await provider.fetch_archive(repo, archive_path, budget):
+                        sha256 = hashlib.sha256()
+                        with open(archive_path, 'rb') as f:
+                            for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+                                sha256.update(chunk)
+                        archive_sha256 = sha256.hexdigest()
+            plugins.append({
+                'name': name or repo.repo,
+                'repository_url': repository_url,
+                'version': version,
+                'commit_sha': await provider.resolve_commit(repo),
+                'archive_sha256': archive_sha256,
+            })
+        except Exception as e:
+            errors.append(f"{repository_url}: {e}")
+    return {
+        'format_version': RegistryIndexClient.FORMAT_VERSION,
+        'generated_at': int(time.time()),
+        'plugins': plugins,
+        'errors': errors,
+    }
+
+
+class WebhookReceiver:
+    """Webhook接收服务 - 仓库推送或发布新版本时由GitHub通知，代替定时轮询
+
+    收到 push（插件跟踪的分支，未指定分支时为默认分支）或 release 事件后，把匹配插件的远程版本标记为过期，
+    下次检查时绕过插件索引、共享缓存和镜像直接查询API；
+    开启 auto_update 且该插件启用了自动更新时，再将其加入后台更新队列（同样不经过镜像）。
+    请求必须带有使用 webhook.secret 计算的 X-Hub-Signature-256 签名。
+    """
+
+    def __init__(self, get_config: Callable[..., Any]):
+        self.get_config = get_config
+        self._runner = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: set = set()
+        self._worker = None
+
+    async def start(self) -> None:
+        if not str(self.get_config("webhook.secret", "")).strip():
+            raise ValueError("未配置 webhook.secret，拒绝接收未签名的请求")
+        app = web.Application()
+        app.router.add_post("/webhook", self._handle_webhook)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        host = str(self.get_config("webhook.host", "127.0.0.1"))
+        port = int(self.get_config("webhook.port", 8791))
+        await web.TCPSite(self._runner, host, port).start()
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.get_running_loop().create_task(self._update_worker())
+        service_logger.info(f"Webhook接收服务已启动: http://{host}:{port}/webhook")
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _verify_signature(self, body: bytes, signature: str) -> bool:
+        import hashlib
+        import hmac
+        secret = str(self.get_config("webhook.secret", "")).strip()
+        if not secret or not signature.startswith("sha256="):
+            return False
+        expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature[len("sha256="):])
+
+    def _command(self) -> "PluginManagerCommand":
+        return _create_background_command(self.get_config)
+
+    @staticmethod
+    def _tracked_branch(repository_url: str, default_branch: str) -> str:
+        ref = _repository_ref(repository_url)
+        return default_branch if ref == "HEAD" else ref
+
+    async def _handle_webhook(self, request):
+        body = await request.read()
+        if not self._verify_signature(body, request.headers.get("X-Hub-Signature-256", "")):
+            raise web.HTTPUnauthorized(text="签名校验失败")
+
+        event = request.headers.get("X-GitHub-Event", "")
+        if event == "ping":
+            return web.json_response({'status': 'pong'})
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise web.HTTPBadRequest(text="请求内容不是有效的JSON")
+
+        repository = payload.get('repository') or {}
+        if event == "release":
+            if payload.get('action') not in ("published", "released"):
+                return web.json_response({'status': 'ignored', 'reason': f"release {payload.get('action')}"})
+        elif event != "push":
+            return web.json_response({'status': 'ignored', 'reason': f"不处理的事件: {event}"})
+
+        urls = {_repository_root_url(u) for u in (repository.get('html_url'), repository.get('clone_url')) if u}
+        command = self._command()
+        matched = [p for p in command._scan_plugins(command._get_plugins_directory())
+                   if p.repository_url and _repository_root_url(p.repository_url) in urls]
+        if event == "push":
+            # 只处理推送到插件所跟踪分支的事件，地址中没有指定分支的插件跟踪默认分支
+            default_branch = repository.get('default_branch', '')
+            matched = [p for p in matched
+                       if payload.get('ref') == f"refs/heads/{self._tracked_branch(p.repository_url, default_branch)}"]
+            if not matched:
+                return web.json_response({'status': 'ignored', 'reason': f"没有插件跟踪 {payload.get('ref')}"})
+
+        queued = []
+        cache = get_shared_cache(self.get_config)
+        settings = command._load_settings()
+        for plugin in matched:
+            _STALE_REPOSITORIES.add(plugin.repository_url)
+            provider = get_source_provider(plugin.repository_url, self.get_config)
+            if cache is not None and provider is not None:
+                cache.delete("versions", f"{provider.name}:{plugin.repository_url}")
+            if plugin.name in self._pending:
+                continue
+            # 不自动更新的插件也立即在后台重新查询一次，把最新版本写入共享缓存，
+            # 避免其他进程在此之前从镜像读到旧版本并按较长的有效期缓存
+            update = bool(self.get_config("webhook.auto_update", False)
+                          and command._get_plugin_auto_update_setting(plugin.name, settings))
+            self._pending.add(plugin.name)
+            self._queue.put_nowait((plugin.name, update))
+            if update:
+                queued.append(plugin.name)
+
+        service_logger.info(f"收到 {event} 事件: {repository.get('full_name')}，匹配插件 {[p.name for p in matched]}，排队更新 {queued}")
+        return web.json_response({'status': 'ok', 'matched': [p.name for p in matched], 'queued': queued})
+
+    async def _update_worker(self) -> None:
+        """依次重新查询排队插件的远程版本，需要时执行自动更新"""
+        while True:
+            plugin_name, update = await self._queue.get()
+            # 推送后镜像/CDN可能仍是旧内容，检查和下载都直接访问插件源
+            token = _BYPASS_MIRRORS.set(True)
+            try:
+                command = self._command()
+                plugin = next((p for p in command._scan_plugins(command._get_plugins_directory())
+                               if p.name == plugin_name), None)
+                if plugin is None:
+                    continue
+                # Webhook说明仓库刚刚变化，插件索引中的版本可能还是旧的，直接查询插件源
+                remote_version = await command._get_remote_version(plugin.repository_url, use_index=False)
+                if update and remote_is_newer(plugin.local_version, remote_version):
+                    plugin.remote_version = remote_version
+                    ok = await command._perform_plugin_update(plugin)
+                    service_logger.info(f"Webhook自动更新 {plugin_name} → v{remote_version}: {'成功' if ok else '失败'}")
+            except Exception as e:
+                service_logger.error(f"Webhook自动更新 {plugin_name} 出错: {e}")
+            finally:
+                _BYPASS_MIRRORS.reset(token)
+                self._pending.discard(plugin_name)
+
+
+def _create_background_command(get_config: Callable[..., Any]) -> "PluginManagerCommand":
+    """构造一个不绑定消息的命令对象，供后台任务复用扫描、检查和更新逻辑"""
+    command = PluginManagerCommand.__new__(PluginManagerCommand)
+    command.get_config = get_config
+    return command
+
+
+# 因API限额不足推迟的插件: 插件名 -> (计划执行时间, 是否需要更新)
+_DEFERRED_JOBS: Dict[str, Tuple[float, bool]] = {}
+_DEFERRED_TASKS: set = set()
+
+
+def _schedule_deferred(get_config: Callable[..., Any], plugin_names: List[str], run_at: float, update: bool) -> None:
+    """在限额重置后重新检查（并按需更新）被推迟的插件，已在等待中的插件不会重复排队"""
+    names = [name for name in plugin_names if name not in _DEFERRED_JOBS]
+    if not names:
+        return
+    for name in names:
+        _DEFERRED_JOBS[name] = (run_at, update)
+
+    async def run_deferred() -> None:
+        # 多等几秒，避免与GitHub的重置时间边界重合
+        await asyncio.sleep(max(0.0, run_at - time.time()) + 5)
+        command = _create_background_command(get_config)
+        checked: List[str] = []
+        try:
+            plugins = {p.name: p for p in command._scan_plugins(command._get_plugins_directory())}
+            for name in names:
+                plugin = plugins.get(name)
+                if plugin is None or not plugin.repository_url:
+                    continue
+                remote_version = await command._get_remote_version(plugin.repository_url)
+                checked.append(name)
+                if update and remote_is_newer(plugin.local_version, remote_version):
+                    plugin.remote_version = remote_version
+                    ok = await command._perform_plugin_update(plugin)
+                    service_logger.info(f"推迟的更新 {name} → v{remote_version}: {'成功' if ok else '失败'}")
+        except Exception as e:
+            service_logger.error(f"执行推迟的任务出错: {e}")
+        finally:
+            # 检查时间在全部插件处理完后一次写入设置文件
+            command._record_checked(checked)
+            for name in names:
+                _DEFERRED_JOBS.pop(name, None)
+
+    task = asyncio.get_running_loop().create_task(run_deferred())
+    _DEFERRED_TASKS.add(task)
+    task.add_done_callback(_DEFERRED_TASKS.discard)
+
+
+class MetricsServer:
+    """指标服务 - 在 /metrics 以 Prometheus 文本格式输出 METRICS"""
+
+    def __init__(self, get_config: Callable[..., Any]):
+        self.get_config = get_config
+        self._runner = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        host = str(self.get_config("metrics.host", "127.0.0.1"))
+        port = int(self.get_config("metrics.port", 8792))
+        await web.TCPSite(self._runner, host, port).start()
+        service_logger.info(f"指标服务已启动: http://{host}:{port}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_metrics(self, request):
+        return web.Response(text=METRICS.render(), content_type="text/plain", charset="utf-8",
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+
+def _count_pending_jobs() -> float:
+    webhook = _BACKGROUND_SERVICES.get("webhook")
+    queued = webhook._queue.qsize() if webhook is not None and webhook._queue is not None else 0
+    return len(_DEFERRED_JOBS) + queued
+
+
+METRICS.set_callback("plugin_manager_pending_jobs", _count_pending_jobs)
+
+
+# 已启动的后台服务（每个进程只启动一次）
+_BACKGROUND_SERVICES: Dict[str, Any] = {}
+
+
+# 后台服务: 名称 -> (启用开关的配置项, 服务类, 显示名称)
+BACKGROUND_SERVICE_TYPES = {
+    "lan_cache": ("lan_cache.serve", LanCacheServer, "局域网缓存服务"),
+    "webhook": ("webhook.enabled", WebhookReceiver, "Webhook接收服务"),
+    "metrics": ("metrics.enabled", MetricsServer, "指标服务"),
+}
+
+
+def _ensure_background_services(get_config: Callable[..., Any]) -> None:
+    """按配置启动后台服务（局域网缓存、Webhook），需要在事件循环中调用，没有运行中的循环时跳过"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    for name, (enabled_key, service_type, label) in BACKGROUND_SERVICE_TYPES.items():
+        if not get_config(enabled_key, False) or name in _BACKGROUND_SERVICES:
+            continue
+        server = service_type(get_config)
+        _BACKGROUND_SERVICES[name] = server
+
+        async def start_server(name=name, server=server, label=label) -> None:
+            try:
+                await server.start()
+            except Exception as e:
+                service_logger.error(f"启动{label}失败: {e}")
+                _BACKGROUND_SERVICES.pop(name, None)
+
+        loop.create_task(start_server())
+
+
+class AdminAuthorizer:
+    """管理员权限判定缓存
+
+    管理员列表编译为 frozenset，只在配置对象变化或 config.toml 被修改时重建；
+    config.toml 被修改时直接从文件重新解析 admin.qq_list（宿主不会自动重新加载内存中的配置），解析失败时使用 get_config；
+    私聊流的 stream_id 与用户一一对应，解析出的用户ID按 stream_id 缓存，
+    群聊流只缓存流类型，发送者仍从每条消息读取。
+    """
+
+    CONFIG_CHECK_INTERVAL = 1.0  # 两次检查 config.toml 修改时间的最小间隔（秒）
+    MAX_STREAMS = 1024
+
+    def __init__(self, config_path: Path):
+        self.config_path = config_path
+        self._admins: FrozenSet[str] = frozenset()
+        self._raw_admins: Any = None
+        self._file_admins: Optional[FrozenSet[str]] = None
+        self._config_stamp: Optional[Tuple[int, int]] = None
+        self._last_config_check = 0.0
+        self._streams: "collections.OrderedDict[str, Tuple[str, Optional[str]]]" = collections.OrderedDict()
+
+    def _stat_config(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.config_path.stat()
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _read_config_admins(self) -> Optional[FrozenSet[str]]:
+        """从 config.toml 解析 admin.qq_list，文件无法读取、解析或没有该项时返回None"""
+        try:
+            try:
+                import tomllib
+                with open(self.config_path, 'rb') as f:
+                    data = tomllib.load(f)
+            except ImportError:
+                import toml
+                data = toml.loads(self.config_path.read_text(encoding='utf-8'))
+            admin = data.get('admin')
+            if not isinstance(admin, dict) or 'qq_list' not in admin:
+                command_logger.warning(f"{self.config_path.name} 中没有 admin.qq_list，使用已加载的配置")
+                return None
+            raw = admin['qq_list']
+            if not isinstance(raw, list):
+                raise ValueError(f"admin.qq_list 应为列表，实际为 {type(raw).__name__}")
+        except Exception as e:
+            command_logger.warning(f"重新解析 {self.config_path.name} 失败，使用已加载的配置: {e}")
+            return None
+        return frozenset(str(qq).strip() for qq in raw)
+
+    def admins(self, get_config: Callable[..., Any]) -> FrozenSet[str]:
+        """当前的管理员集合"""
+        now = time.monotonic()
+        if now - self._last_config_check >= self.CONFIG_CHECK_INTERVAL:
+            self._last_config_check = now
+            stamp = self._stat_config()
+            if stamp != self._config_stamp:
+                self._file_admins = self._read_config_admins() if stamp is not None else None
+                if self._file_admins is not None:
+                    if self._config_stamp is not None:
+                        command_logger.info(f"config.toml 已修改，已重新加载管理员列表（{len(self._file_admins)} 人）")
+                    loaded = frozenset(str(qq).strip() for qq in get_config("admin.qq_list", []) or [])
+                    if loaded != self._file_admins:
+                        command_logger.info(f"config.toml 中的管理员列表与已加载的配置不同，使用文件中的列表"
+                                            f"（新增 {sorted(self._file_admins - loaded)}，"
+                                            f"移除 {sorted(loaded - self._file_admins)}）")
+                self._config_stamp = stamp
+                self._raw_admins = None
+                self._streams.clear()
+        if self._file_admins is not None:
+            return self._file_admins
+        raw = get_config("admin.qq_list", [])
+        if raw is not self._raw_admins:
+            self._raw_admins = raw
+            self._admins = frozenset(str(qq).strip() for qq in raw or [])
+        return self._admins
+
+    def resolve_stream(self, chat_stream: Any) -> Tuple[str, Optional[str]]:
+        """返回 (流类型, 私聊用户ID)，有 stream_id 的流会被缓存"""
+        stream_id = getattr(chat_stream, 'stream_id', None)
+        if stream_id is not None:
+            cached = self._streams.get(stream_id)
+            if cached is not None:
+                self._streams.move_to_end(stream_id)
+                return cached
+        stream_type = chat_api.get_stream_type(chat_stream)
+        user_id = None
+        if stream_type == "private":
+            user_id = chat_api.get_stream_info(chat_stream).get('user_id')
+            user_id = str(user_id).strip() if user_id else None
+        resolved = (stream_type, user_id)
+        if stream_id is not None:
+            self._streams[stream_id] = resolved
+            if len(self._streams) > self.MAX_STREAMS:
+                self._streams.popitem(last=False)
+        return resolved
+
+
+ADMIN_AUTHORIZER = AdminAuthorizer(Path(__file__).parent / "config.toml")
+
+
+# 验证暂存插件时在子进程中执行的脚本: argv = [插件目录, 包名, 结果标记]
+# 用桩模块替代 src.* 后导入 plugin.py，最后一行输出 标记 + JSON结果
+_VALIDATION_RESULT_MARKER = "__plugin_manager_validation__"
+_STAGED_VALIDATOR_SCRIPT = r'''
+import importlib
+import importlib.abc
+import importlib.machinery
+import json
+import sys
+import time
+import traceback
+import types
+from pathlib import Path
+
+
+class _StubMeta(type):
+    def __getattr__(cls, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _stub_class(name)
+
+    def __call__(cls, *args, **kwargs):
+        # 装饰器用法（例如 @register_plugin）原样返回被装饰的对象
+        if len(args) == 1 and not kwargs and callable(args[0]) and not isinstance(args[0], _Stub):
+            return args[0]
+        return super().__call__(*args, **kwargs)
+
+
+class _Stub(metaclass=_StubMeta):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _Stub()
+
+    def __call__(self, *args, **kwargs):
+        return _Stub()
+
+    def __iter__(self):
+        return iter(())
+
+
+def _stub_class(name):
+    return _StubMeta(name, (_Stub,), {})
+
+
+class _StubModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        value = _stub_class(name)
+        setattr(self, name, value)
+        return value
+
+
+class _StubFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname == "src" or fullname.startswith("src."):
+            return importlib.machinery.ModuleSpec(fullname, self, is_package=True)
+        return None
+
+    def create_module(self, spec):
+        return _StubModule(spec.name)
+
+    def exec_module(self, module):
+        module.__path__ = []
+
+
+def _location(error, directory):
+    if isinstance(error, SyntaxError) and error.filename:
+        return f"{Path(error.filename).name}:{error.lineno}"
+    frames = [f for f in traceback.extract_tb(error.__traceback__) if f.filename.startswith(str(directory))]
+    return f"{Path(frames[-1].filename).name}:{frames[-1].lineno}" if frames else ""
+
+
+def validate(directory, package):
+    try:
+        manifest = json.loads((directory / "_manifest.json").read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {"ok": False, "error": "缺少 _manifest.json"}
+    except ValueError as e:
+        return {"ok": False, "error": f"_manifest.json 格式错误: {e}"}
+    missing_fields = [key for key in ("name", "version") if not manifest.get(key)]
+    if missing_fields:
+        return {"ok": False, "error": f"_manifest.json 缺少字段: {', '.join(missing_fields)}"}
+    if not (directory / "plugin.py").exists():
+        return {"ok": False, "error": "缺少 plugin.py"}
+
+    sys.meta_path.insert(0, _StubFinder())
+    module = types.ModuleType(package)
+    module.__path__ = [str(directory)]
+    sys.modules[package] = module
+    sys.path.insert(0, str(directory))
+    started = time.perf_counter()
+    try:
+        importlib.import_module(f"{package}.plugin")
+    except ModuleNotFoundError as e:
+        if e.name and e.name.split(".")[0] not in (package, "src"):
+            return {"ok": True, "missing": e.name, "import_seconds": None}
+        return {"ok": False, "error": f"{_location(e, directory)} {type(e).__name__}: {e}".strip()}
+    except BaseException as e:
+        return {"ok": False, "error": f"{_location(e, directory)} {type(e).__name__}: {e}".strip()}
+    return {"ok": True, "import_seconds": time.perf_counter() - started}
+
+
+result = validate(Path(sys.argv[1]).resolve(), sys.argv[2])
+print(sys.argv[3] + json.dumps(result), flush=True)
+'''
+
+
+async def _maybe_await(value: Any) -> Any:
+    return await value if inspect.isawaitable(value) else value
+
+
+class PluginRegistry:
+    """宿主插件系统的接口 - 热重载通过它注销、重新导入和注册插件，可替换为桩实现在宿主之外测试"""
+
+    def registered_names(self, plugin_dir: Path) -> List[str]:
+        """插件目录中已注册到宿主的插件名"""
+        raise NotImplementedError
+
+    async def unregister(self, plugin_name: str) -> bool:
+        """注销插件及其全部组件"""
+        raise NotImplementedError
+
+    def import_plugin(self, plugin_dir: Path) -> bool:
+        """重新执行插件模块，register_plugin 装饰器会登记新版本的插件类"""
+        raise NotImplementedError
+
+    async def register(self, plugin_name: str) -> bool:
+        """实例化已登记的插件类并注册其组件"""
+        raise NotImplementedError
+
+
+class MaiBotPluginRegistry(PluginRegistry):
+    """通过 MaiBot 的 plugin_manager 重载插件，不同版本的接口有同步/异步之分，统一按可等待处理"""
+
+    def __init__(self):
+        from src.plugin_system.core.plugin_manager import plugin_manager
+        self._manager = plugin_manager
+
+    def registered_names(self, plugin_dir: Path) -> List[str]:
+        target = plugin_dir.resolve()
+        return [name for name, path in getattr(self._manager, 'plugin_paths', {}).items()
+                if Path(path).resolve() == target]
+
+    async def unregister(self, plugin_name: str) -> bool:
+        ok = await _maybe_await(self._manager.remove_registered_plugin(plugin_name))
+        # 旧的插件类仍留在登记表中时，重新导入的新类会被当作重复注册而忽略
+        getattr(self._manager, 'plugin_classes', {}).pop(plugin_name, None)
+        return bool(ok)
+
+    def import_plugin(self, plugin_dir: Path) -> bool:
+        return bool(self._manager._load_plugin_module_file(str(plugin_dir / "plugin.py")))
+
+    async def register(self, plugin_name: str) -> bool:
+        result = await _maybe_await(self._manager.load_registered_plugin_classes(plugin_name))
+        return bool(result[0] if isinstance(result, tuple) else result)
+
+
+# 热重载使用的宿主注册表，为None时首次使用时连接 MaiBot 的 plugin_manager；测试时可替换为桩实现
+PLUGIN_REGISTRY: Optional[PluginRegistry] = None
+
+
+def _get_plugin_registry() -> Optional[PluginRegistry]:
+    global PLUGIN_REGISTRY
+    if PLUGIN_REGISTRY is None:
+        try:
+            PLUGIN_REGISTRY = MaiBotPluginRegistry()
+        except (ImportError, AttributeError) as e:
+            update_logger.warning(f"宿主插件系统不支持热重载: {e}")
+            return None
+    return PLUGIN_REGISTRY
+
+
+def _purge_plugin_modules(plugin_dir: Path) -> List[str]:
+    """从 sys.modules 中移除插件目录下的所有模块，返回移除的模块名"""
+    directories = {str(plugin_dir.resolve()), os.path.abspath(plugin_dir)}
+    prefixes = tuple(os.path.join(directory, "") for directory in directories)
+    purged = []
+    for name, module in list(sys.modules.items()):
+        # 直接读 __dict__：缺少属性时 getattr 抛出再捕获异常，模块很多时开销明显
+        namespace = getattr(module, '__dict__', None) or {}
+        file = namespace.get('__file__')
+        if (isinstance(file, str) and file.startswith(prefixes)) or any(
+                isinstance(path, str) and (path in directories or path.startswith(prefixes))
+                for path in namespace.get('__path__') or ()):
+            del sys.modules[name]
+            purged.append(name)
+    importlib.invalidate_caches()
+    return purged
+
+
+async def reload_plugin_directory(registry: PluginRegistry, plugin_dir: Path) -> float:
+    """注销插件目录中的插件、清除其模块并重新导入注册，返回耗时（秒），失败时抛出 RuntimeError"""
+    started = time.monotonic()
+    names = registry.registered_names(plugin_dir)
+    if not names:
+        raise RuntimeError("插件当前未加载")
+    for name in names:
+        if not await registry.unregister(name):
+            raise RuntimeError(f"注销 {name} 失败")
+    purged = _purge_plugin_modules(plugin_dir)
+    update_logger.debug(f"已清除 {plugin_dir.name} 的模块: {purged}")
+    if not registry.import_plugin(plugin_dir):
+        raise RuntimeError("导入新版本失败")
+    # 新版本可能修改了插件名，以重新导入后的登记为准
+    for name in registry.registered_names(plugin_dir) or names:
+        if not await registry.register(name):
+            raise RuntimeError(f"注册 {name} 失败")
+    seconds = time.monotonic() - started
+    METRICS.observe("plugin_manager_reload_seconds", seconds)
+    return seconds
+
+
+def _command_trace_attributes(command: "PluginManagerCommand") -> Dict[str, Any]:
+    groups = command.matched_groups or {}
+    return {'command': f"/pm {groups.get('action') or ''} {groups.get('plugin_name') or ''}".strip()}
+
+
 class PluginManagerCommand(BaseCommand):
     """插件管理器命令 - 管理所有插件的更新和状态"""
     
@@ -36,9 +3131,15 @@ class PluginManagerCommand(BaseCommand):
         "🔸 `/pm check` - 检查所有插件更新\n"
         "🔸 `/pm update <插件名>` - 更新指定插件\n"
         "🔸 `/pm update ALL` - 更新所有需要更新的插件\n"
+        "🔸 `/pm reload <插件名>` - 不重启MaiBot重新加载插件\n"
         "🔸 `/pm info <插件名>` - 查看插件详细信息\n"
         "🔸 `/pm settings` - 管理插件自动更新设置\n"
         "🔸 `/pm github` - 查看GitHub配置状态\n"
+        "🔸 `/pm registry build [仓库地址...]` - 生成插件索引\n"
+        "🔸 `/pm quota` - 查看GitHub API剩余限额和预计消耗\n"
+        "🔸 `/pm stats` - 查看请求、下载和耗时统计\n"
+        "🔸 `/pm trace last|export` - 查看最近一次命令的耗时分布 / 导出追踪记录\n"
+        "🔸 `/pm profile <子命令>` - 在性能分析下执行子命令\n"
         "🔸 `/pm help` - 显示此帮助信息\n\n"
         "💡 **提示**\n"
         "• 默认忽略 'Hello World 示例插件'\n"
@@ -48,20 +3149,29 @@ class PluginManagerCommand(BaseCommand):
     )
     intercept_message = True
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._last_api_call = 0
-        self._min_api_interval = 2.0  # 最少2秒间隔避免频率限制
-
     async def execute(self) -> Tuple[bool, Optional[str], bool]:
         """执行插件管理器命令"""
+        _REQUEST_STATS.set({})
+        _configure_logging(self.get_config)
+        TRACER.configure(self.get_config)
+        _ensure_background_services(self.get_config)
+        with TRACER.span("execute", **_command_trace_attributes(self)):
+            try:
+                return await self._execute()
+            finally:
+                cassette = get_http_cassette(self.get_config)
+                if cassette is not None:
+                    cassette.save()
+
+    async def _execute(self) -> Tuple[bool, Optional[str], bool]:
+        """检查权限并分发到各个子命令"""
         try:
             # 首先检查管理员权限
             if not await self._check_admin_permission():
                 try:
                     await self.send_text("❌ 权限不足，只有管理员可以使用插件管理器。")
                 except Exception as e:
-                    print(f"发送权限错误消息失败: {e}")
+                    command_logger.error(f"发送权限错误消息失败: {e}")
                 return False, "权限不足", True
 
             # 安全获取匹配的参数
@@ -74,43 +3184,59 @@ class PluginManagerCommand(BaseCommand):
                 try:
                     await self.send_text(self.command_help)
                 except Exception as e:
-                    print(f"发送帮助信息失败: {e}")
+                    command_logger.error(f"发送帮助信息失败: {e}")
                 return True, "已发送帮助信息", True
 
-            # 处理不同动作
-            if action == "list":
-                return await self._list_plugins()
-            elif action == "check":
-                return await self._check_updates()
-            elif action == "update":
-                return await self._update_plugin(plugin_name)
-            elif action == "info":
-                return await self._plugin_info(plugin_name)
-            elif action == "settings":
-                return await self._manage_settings(plugin_name)
-            elif action == "github":
-                return await self._show_github_status()
-            elif action == "help":
-                try:
-                    await self.send_text(self.command_help)
-                except Exception as e:
-                    print(f"发送帮助信息失败: {e}")
-                return True, "已发送帮助信息", True
-            else:
-                try:
-                    await self.send_text(f"❌ 未知命令: {action}\n请使用 `/pm help` 查看可用命令。")
-                except Exception as e:
-                    print(f"发送未知命令错误失败: {e}")
-                return False, f"未知命令: {action}", True
+            return await self._dispatch(action, plugin_name)
 
         except Exception as e:
             error_msg = f"❌ 命令执行出错: {str(e)}"
             try:
                 await self.send_text(error_msg)
             except Exception as send_e:
-                print(f"发送错误消息也失败了: {send_e}")
+                command_logger.error(f"发送错误消息也失败了: {send_e}")
             return False, error_msg, True
 
+    async def _dispatch(self, action: str, plugin_name: str) -> Tuple[bool, Optional[str], bool]:
+        """按动作调用对应的子命令"""
+        # 处理不同动作
+        if action == "list":
+            return await self._list_plugins()
+        elif action == "check":
+            return await self._check_updates()
+        elif action == "update":
+            return await self._update_plugin(plugin_name)
+        elif action == "reload":
+            return await self._reload_command(plugin_name)
+        elif action == "info":
+            return await self._plugin_info(plugin_name)
+        elif action == "settings":
+            return await self._manage_settings(plugin_name)
+        elif action == "github":
+            return await self._show_github_status()
+        elif action == "registry":
+            return await self._manage_registry(plugin_name)
+        elif action == "quota":
+            return await self._show_quota()
+        elif action == "stats":
+            return await self._show_stats()
+        elif action == "trace":
+            return await self._show_trace(plugin_name)
+        elif action == "profile":
+            return await self._profile_command(plugin_name)
+        elif action == "help":
+            try:
+                await self.send_text(self.command_help)
+            except Exception as e:
+                command_logger.error(f"发送帮助信息失败: {e}")
+            return True, "已发送帮助信息", True
+        else:
+            try:
+                await self.send_text(f"❌ 未知命令: {action}\n请使用 `/pm help` 查看可用命令。")
+            except Exception as e:
+                command_logger.error(f"发送未知命令错误失败: {e}")
+            return False, f"未知命令: {action}", True
+
     async def _show_github_status(self) -> Tuple[bool, Optional[str], bool]:
         """显示GitHub配置状态"""
         try:
@@ -151,6 +3277,218 @@ class PluginManagerCommand(BaseCommand):
             await self.send_text(error_msg)
             return False, error_msg, True
 
+    async def _show_quota(self) -> Tuple[bool, Optional[str], bool]:
+        """显示GitHub API剩余限额、重置时间和批量命令的预计消耗"""
+        try:
+            provider = self._get_github_provider()
+            quota = await provider.get_rate_limit() if provider else None
+            if quota is None:
+                await self.send_text("❌ 无法获取GitHub API限额（离线模式、使用局域网缓存或网络不可用）")
+                return False, "无法获取限额", True
+
+            plugins = [p for p in self._scan_plugins(self._get_plugins_directory()) if p.repository_url]
+            check_calls = sum([await self._estimate_api_calls(p, False) for p in plugins])
+            update_calls = sum([await self._estimate_api_calls(p, True) for p in plugins])
+            reserve = int(self.get_config("quota.reserve_calls", 5))
+            auth_status = "🔑 使用认证" if self._get_github_config().get('token') else "⚠️ 未认证"
+
+            message = "📉 **GitHub API 限额**\n\n"
+            message += f"{auth_status}\n"
+            message += f"📊 剩余: {quota['remaining']}/{quota['limit']}（保留 {reserve} 次）\n"
+            message += f"⏰ 重置时间: {self._format_reset_time(quota['reset'])}\n\n"
+            message += "📈 **预计消耗**\n"
+            message += f"• `/pm check`: {check_calls} 次\n"
+            message += f"• `/pm update ALL`: 最多 {update_calls} 次\n"
+            if check_calls > quota['remaining'] - reserve:
+                message += "⚠️ 限额不足以检查所有插件，超出部分将推迟到重置后\n"
+            if _DEFERRED_JOBS:
+                message += f"\n⏸️ **推迟的任务** ({len(_DEFERRED_JOBS)})\n"
+                for name, (run_at, update) in sorted(_DEFERRED_JOBS.items(), key=lambda item: item[1][0]):
+                    message += f"• {name}: {'检查并更新' if update else '检查'}于 {self._format_reset_time(int(run_at))}\n"
+
+            await self.send_text(message)
+            return True, f"剩余限额 {quota['remaining']}/{quota['limit']}", True
+
+        except Exception as e:
+            error_msg = f"❌ 获取API限额时出错: {str(e)}"
+            await self.send_text(error_msg)
+            return False, error_msg, True
+
+    async def _show_stats(self) -> Tuple[bool, Optional[str], bool]:
+        """显示进程启动以来的指标汇总"""
+        try:
+            def total(name: str) -> float:
+                return sum(METRICS.get(name).values())
+
+            requests_by_status: Dict[str, float] = {}
+            for labels, value in METRICS.get("plugin_manager_http_requests_total").items():
+                status = dict(labels).get('status', '')
+                requests_by_status[status] = requests_by_status.get(status, 0) + value
+
+            message = "📈 **插件管理器统计**（本次启动以来）\n\n"
+            message += f"🌐 HTTP请求: {int(sum(requests_by_status.values()))} 次"
+            if requests_by_status:
+                message += "（" + ", ".join(f"{status}: {int(n)}" for status, n in sorted(requests_by_status.items())) + "）"
+            message += "\n"
+            message += f"📥 下载: {total('plugin_manager_download_bytes_total') / 1024 / 1024:.2f} MB\n"
+            message += f"💾 缓存命中: {int(total('plugin_manager_cache_hits_total'))} 次\n"
+            message += f"🔁 网络重试: {int(total('plugin_manager_retries_total'))} 次\n"
+            message += f"📇 插件索引命中: {int(total('plugin_manager_index_hits_total'))} 次\n\n"
+
+            message += "⏱️ **耗时**\n"
+            for name, label in (("plugin_manager_check_seconds", "检查版本"),
+                                ("plugin_manager_update_seconds", "更新插件"),
+                                ("plugin_manager_download_seconds", "下载文件")):
+                count, average, p90 = METRICS.histogram_summary(name)
+                if count:
+                    p90_text = f"{p90:g} 秒内" if p90 is not None else "超过最大分桶"
+                    message += f"• {label}: {count} 次，平均 {average:.2f} 秒，90% {p90_text}\n"
+                else:
+                    message += f"• {label}: 暂无数据\n"
+
+            quota = METRICS.get("plugin_manager_github_quota_remaining").get(())
+            message += f"\n📉 GitHub剩余限额: {int(quota) if quota is not None else '未知'}\n"
+            message += f"⏸️ 等待中的后台任务: {int(_count_pending_jobs())}\n"
+            if "metrics" in _BACKGROUND_SERVICES:
+                host = self.get_config("metrics.host", "127.0.0.1")
+                port = self.get_config("metrics.port", 8792)
+                message += f"🔗 指标地址: http://{host}:{port}/metrics\n"
+
+            await self.send_text(message)
+            return True, "已显示统计", True
+
+        except Exception as e:
+            error_msg = f"❌ 获取统计时出错: {str(e)}"
+            await self.send_text(error_msg)
+            return False, error_msg, True
+
+    async def _profile_command(self, args: str) -> Tuple[bool, Optional[str], bool]:
+        """在 cProfile 和 tracemalloc 下执行一条子命令，报告累计耗时最多的函数、内存峰值和最大的分配位置
+
+        原始的 .prof 文件保存在插件目录下，可以用 pstats 或 snakeviz 等工具进一步查看。
+        """
+        import cProfile
+        import pstats
+        import tracemalloc
+        try:
+            parts = args.split(None, 1)
+            if not parts or parts[0].lower() in ("profile", "help"):
+                await self.send_text("❌ 参数格式错误。使用: `/pm profile <子命令> [参数]`，例如 `/pm profile check`")
+                return False, "参数格式错误", True
+            action = parts[0].lower()
+            sub_args = parts[1].strip() if len(parts) > 1 else ""
+            top_n = max(1, int(self.get_config("profile.top_n", 10)))
+
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            profiler = cProfile.Profile()
+            wall_started = time.monotonic()
+            profiler.enable()
+            try:
+                result = await self._dispatch(action, sub_args)
+            finally:
+                profiler.disable()
+                elapsed = time.monotonic() - wall_started
+                _, peak_memory = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot().filter_traces([
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                ])
+                if started_tracing:
+                    tracemalloc.stop()
+
+            profile_file = Path(__file__).parent / f"profile_{time.strftime('%Y%m%d_%H%M%S')}_{action}.prof"
+            profiler.dump_stats(str(profile_file))
+
+            stats = pstats.Stats(profiler)
+            entries = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top_n]
+            message = f"🔬 **性能分析**: /pm {action} {sub_args}".rstrip() + "\n"
+            message += f"⏱️ 总耗时: {elapsed:.2f} 秒，内存峰值: {peak_memory / 1024 / 1024:.2f} MB\n\n"
+            message += f"📊 **累计耗时前 {len(entries)} 的函数**\n"
+            for (file_name, line, function), (_, calls, _, cumulative, _) in entries:
+                location = f"{Path(file_name).name}:{line}" if line else file_name
+                message += f"• {cumulative:.3f}s ×{calls} {function} ({location})\n"
+            message += f"\n🧠 **分配最多的位置**\n"
+            for stat in snapshot.statistics("lineno")[:top_n]:
+                frame = stat.traceback[0]
+                message += f"• {stat.size / 1024:.1f} KB ×{stat.count} {Path(frame.filename).name}:{frame.lineno}\n"
+            message += f"\n📄 {profile_file}"
+            await self.send_text(message)
+            return result
+
+        except Exception as e:
+            error_msg = f"❌ 性能分析时出错: {str(e)}"
+            await self.send_text(error_msg)
+            return False, error_msg, True
+
+    async def _show_trace(self, args: str) -> Tuple[bool, Optional[str], bool]:
+        """`/pm trace last` 显示最近一次追踪的瀑布图，`/pm trace export` 导出全部追踪为JSONL"""
+        try:
+            sub_action = args.strip().lower() or "last"
+            if sub_action == "export":
+                trace_file = Path(__file__).parent / "traces.jsonl"
+                count = TRACER.export_jsonl(trace_file)
+                await self.send_text(f"✅ 已导出 {count} 条追踪记录\n📄 {trace_file}")
+                return True, f"已导出 {count} 条追踪记录", True
+            if sub_action != "last":
+                await self.send_text("❌ 参数格式错误。使用: `/pm trace last` 或 `/pm trace export`")
+                return False, "参数格式错误", True
+
+            if not TRACER.traces:
+                await self.send_text("📭 暂无追踪记录")
+                return True, "暂无追踪记录", True
+            trace = TRACER.traces[-1]
+            title = trace.attributes.get('command', trace.name)
+            started = time.strftime('%H:%M:%S', time.localtime(trace.wall_start))
+            message = f"🧭 **最近一次追踪**: {title}\n🕒 {started}，总耗时 {(trace.duration or 0):.2f} 秒\n\n"
+            message += TRACER.format_waterfall(trace)
+            await self.send_text(message)
+            return True, "已显示追踪记录", True
+
+        except Exception as e:
+            error_msg = f"❌ 获取追踪记录时出错: {str(e)}"
+            await self.send_text(error_msg)
+            return False, error_msg, True
+
+    @staticmethod
+    def _format_reset_time(reset: int) -> str:
+        minutes = max(0, int(reset - time.time()) // 60)
+        return f"{time.strftime('%H:%M:%S', time.localtime(reset))}（约 {minutes} 分钟后）"
+
+    async def _manage_registry(self, args: str) -> Tuple[bool, Optional[str], bool]:
+        """插件索引管理: `/pm registry build [仓库地址...]` 生成索引文件"""
+        try:
+            parts = args.split()
+            if not parts or parts[0].lower() != "build":
+                await self.send_text("❌ 参数格式错误。使用: `/pm registry build [仓库地址...]`")
+                return False, "参数格式错误", True
+
+            if len(parts) > 1:
+                repositories = [("", url) for url in parts[1:]]
+            else:
+                # 未指定仓库时使用所有已安装插件的仓库
+                plugins = self._scan_plugins(self._get_plugins_directory())
+                repositories = [(p.name, p.repository_url) for p in plugins if p.repository_url]
+
+            await self.send_text(f"🔄 正在为 {len(repositories)} 个仓库生成插件索引...")
+            index = await build_registry_index(repositories, self.get_config)
+            index_file = Path(__file__).parent / "registry_index.json"
+            with open(index_file, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False, indent=2)
+
+            message = f"✅ **插件索引已生成**\n收录 {len(index['plugins'])}/{len(repositories)} 个仓库\n📄 {index_file}\n"
+            if index['errors']:
+                message += "\n⚠️ **跳过的仓库**\n" + "\n".join(f"• {e}" for e in index['errors'])
+            await self.send_text(message)
+            return True, f"已生成插件索引: {len(index['plugins'])} 个插件", True
+
+        except Exception as e:
+            error_msg = f"❌ 生成插件索引时出错: {str(e)}"
+            await self.send_text(error_msg)
+            return False, error_msg, True
+
     def _get_github_config(self) -> Dict[str, str]:
         """获取GitHub配置"""
         return {
@@ -158,83 +3496,43 @@ class PluginManagerCommand(BaseCommand):
             'token': self.get_config("github.token", "").strip()
         }
 
-    def _get_github_headers(self) -> Dict[str, str]:
-        """获取GitHub API请求头"""
-        github_config = self._get_github_config()
-        headers = {
-            'User-Agent': 'MaiBot-Plugin-Manager/1.1.2',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-        
-        # 如果有token，使用token认证
-        if github_config.get('token'):
-            headers['Authorization'] = f"token {github_config['token']}"
-            
-        return headers
-
+    @TRACER.traced("admin_check")
     async def _check_admin_permission(self) -> bool:
-        """检查用户是否为管理员 - 使用聊天API正确获取用户信息"""
+        """检查用户是否为管理员 - 管理员列表和聊天流解析结果由 ADMIN_AUTHORIZER 缓存"""
         try:
-            # 获取配置的管理员QQ号列表
-            admin_qq_list = self.get_config("admin.qq_list", [])
-            if not admin_qq_list:
-                print("管理员QQ列表为空，拒绝访问")
+            admins = ADMIN_AUTHORIZER.admins(self.get_config)
+            if not admins:
+                command_logger.warning("管理员QQ列表为空，拒绝访问")
                 return False
 
-            # 获取当前聊天流信息
+            # 获取当前聊天流
             message_obj = getattr(self, 'message', None)
-            if not message_obj:
-                print("无法获取message对象")
-                return False
-
-            # 获取聊天流
             chat_stream = getattr(message_obj, 'chat_stream', None)
             if not chat_stream:
-                print("无法获取chat_stream")
+                command_logger.warning("无法获取message或chat_stream")
                 return False
 
-            # 使用聊天API获取流信息
-            stream_info = chat_api.get_stream_info(chat_stream)
-            print(f"聊天流信息: {stream_info}")
-
-            # 根据聊天流类型获取用户ID
-            user_id = None
-            stream_type = chat_api.get_stream_type(chat_stream)
-            
-            if stream_type == "private":
-                # 私聊：直接从流信息获取用户ID
-                user_id = stream_info.get('user_id')
-                print(f"私聊用户ID: {user_id}")
-            elif stream_type == "group":
-                # 群聊：需要从消息发送者获取用户ID
+            # 私聊：用户ID来自流信息；群聊：从消息发送者获取
+            stream_type, user_id = ADMIN_AUTHORIZER.resolve_stream(chat_stream)
+            if stream_type == "group":
                 sender_info = getattr(message_obj, 'sender_info', None)
-                if sender_info:
-                    user_id = getattr(sender_info, 'user_id', None)
-                    print(f"群聊发送者用户ID: {user_id}")
-            else:
-                print(f"未知聊天流类型: {stream_type}")
+                sender_id = getattr(sender_info, 'user_id', None) if sender_info else None
+                user_id = str(sender_id).strip() if sender_id else None
+            elif stream_type != "private":
+                command_logger.warning(f"未知聊天流类型: {stream_type}")
                 return False
 
             if not user_id:
-                print("无法获取用户ID")
+                command_logger.warning("无法获取用户ID")
                 return False
 
-            # 转换为字符串比较
-            user_id_str = str(user_id).strip()
-            admin_qq_str_list = [str(qq).strip() for qq in admin_qq_list]
-            
-            print(f"权限检查 - 用户ID: '{user_id_str}', 管理员列表: {admin_qq_str_list}")
-            
-            # 精确匹配检查
-            is_admin = user_id_str in admin_qq_str_list
-            print(f"权限检查结果: {is_admin}")
-            
+            is_admin = user_id in admins
+            if not is_admin:
+                command_logger.debug(f"用户 {user_id} 不是管理员")
             return is_admin
 
         except Exception as e:
-            print(f"检查管理员权限时出错: {e}")
-            import traceback
-            traceback.print_exc()
+            command_logger.exception(f"检查管理员权限时出错: {e}")
             return False
 
     async def _list_plugins(self) -> Tuple[bool, Optional[str], bool]:
@@ -249,10 +3547,11 @@ class PluginManagerCommand(BaseCommand):
 
             # 构建插件列表消息
             message = "📦 **已安装插件列表**\n\n"
+            settings = self._load_settings()
             for plugin in plugins:
-                status = "🟢 最新" if not plugin.get("needs_update", False) else "🟡 可更新"
-                auto_update_status = "✅" if self._get_plugin_auto_update_setting(plugin['name']) else "❌"
-                message += f"• {plugin['name']} v{plugin['local_version']} {status} {auto_update_status}\n"
+                status = "🟢 最新" if not plugin.needs_update else "🟡 可更新"
+                auto_update_status = "✅" if self._get_plugin_auto_update_setting(plugin.name, settings) else "❌"
+                message += f"• {plugin.name} v{plugin.local_version} {status} {auto_update_status}\n"
 
             message += f"\n💡 共找到 {len(plugins)} 个插件"
             message += "\n🔧 使用 `/pm check` 检查更新，`/pm update <插件名>` 更新插件"
@@ -282,39 +3581,48 @@ class PluginManagerCommand(BaseCommand):
 
             # 串行检查所有插件的更新（避免GitHub API限制）
             update_available = []
+            downgrades = []
             check_results = []
             
-            # 创建 SSL 上下文以禁用证书验证
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
             github_config = self._get_github_config()
             auth_status = "🔑 使用认证" if github_config.get('token') else "⚠️ 未认证"
-            
+
+            # API限额不足以检查全部插件时，只检查优先级高的，其余推迟到限额重置后
+            _, deferred, quota = await self._plan_github_quota(
+                [p for p in plugins if p.repository_url], include_update=False)
+            deferred_names = {p.name for p in deferred}
+            if deferred:
+                _schedule_deferred(self.get_config, list(deferred_names), quota['reset'], update=False)
+
             # 串行检查所有插件，避免GitHub API限制
             for plugin in plugins:
                 try:
-                    # 添加延迟避免API限制
-                    await self._rate_limit_delay()
-                    
                     # 只使用 repository_url 字段
-                    repository_url = plugin.get('repository_url', '')
+                    repository_url = plugin.repository_url
                     if not repository_url:
-                        check_results.append(f"🔴 {plugin['name']}: v{plugin['local_version']} (无仓库地址)")
+                        check_results.append(f"🔴 {plugin.name}: v{plugin.local_version} (无仓库地址)")
+                        continue
+                    if plugin.name in deferred_names:
+                        check_results.append(f"⏸️ {plugin.name}: v{plugin.local_version} (API限额不足，已推迟)")
                         continue
                     
-                    remote_version = await self._get_remote_version(repository_url, ssl_context)
-                    if remote_version and remote_version != plugin['local_version']:
-                        plugin['remote_version'] = remote_version
-                        plugin['needs_update'] = True
+                    remote_version = await self._get_remote_version(repository_url)
+                    if not remote_version:
+                        check_results.append(f"🔴 {plugin.name}: v{plugin.local_version} (无法获取远程版本)")
+                    elif remote_is_newer(plugin.local_version, remote_version):
+                        plugin.remote_version = remote_version
+                        plugin.needs_update = True
                         update_available.append(plugin)
-                        check_results.append(f"🟡 {plugin['name']}: v{plugin['local_version']} → v{remote_version}")
+                        check_results.append(f"🟡 {plugin.name}: v{plugin.local_version} → v{remote_version}")
+                    elif remote_is_older(plugin.local_version, remote_version):
+                        downgrades.append(plugin)
+                        check_results.append(f"🔻 {plugin.name}: v{plugin.local_version} (远程 v{remote_version} 较旧，不会降级)")
                     else:
-                        check_results.append(f"🟢 {plugin['name']}: v{plugin['local_version']} (最新)")
+                        check_results.append(f"🟢 {plugin.name}: v{plugin.local_version} (最新)")
                 except Exception as e:
-                    check_results.append(f"🔴 {plugin['name']}: v{plugin['local_version']} (检查失败)")
-                    print(f"检查插件 {plugin['name']} 更新失败: {e}")
+                    check_results.append(f"🔴 {plugin.name}: v{plugin.local_version} (检查失败)")
+                    command_logger.warning(f"检查插件 {plugin.name} 更新失败: {e}")
+            self._record_checked([p.name for p in plugins if p.repository_url and p.name not in deferred_names])
 
             # 构建统一的结果消息
             result_message = "📊 **插件更新检查结果**\n\n"
@@ -323,9 +3631,12 @@ class PluginManagerCommand(BaseCommand):
             if update_available:
                 result_message += "🟡 **可更新插件**\n"
                 for plugin in update_available:
-                    result_message += f"• {plugin['name']}: v{plugin['local_version']} → v{plugin['remote_version']}\n"
+                    result_message += f"• {plugin.name}: v{plugin.local_version} → v{plugin.remote_version}\n"
                 result_message += "\n"
             
+            if downgrades:
+                result_message += f"🔻 **{len(downgrades)} 个插件的远程版本低于本地**（本地为开发版或远程已回滚），不会自动降级\n\n"
+
             # 添加所有插件状态
             result_message += "📋 **所有插件状态**\n"
             for result in check_results:
@@ -333,6 +3644,9 @@ class PluginManagerCommand(BaseCommand):
             
             # 添加操作提示
             result_message += f"\n🎯 **检查完成**\n"
+            result_message += self._format_network_summary()
+            if deferred:
+                result_message += f"⏸️ {len(deferred)} 个插件推迟到 {self._format_reset_time(quota['reset'])} 自动检查\n"
             if update_available:
                 result_message += f"发现 {len(update_available)} 个可更新插件\n\n"
                 result_message += f"💡 使用 `/pm update ALL` 更新所有插件\n"
@@ -348,13 +3662,17 @@ class PluginManagerCommand(BaseCommand):
             await self.send_text(error_msg)
             return False, error_msg, True
 
-    async def _rate_limit_delay(self):
-        """API调用频率限制"""
-        current_time = time.time()
-        time_since_last_call = current_time - self._last_api_call
-        if time_since_last_call < self._min_api_interval:
-            await asyncio.sleep(self._min_api_interval - time_since_last_call)
-        self._last_api_call = time.time()
+    def _format_network_summary(self) -> str:
+        """生成网络重试与缓存命中统计说明，都没有时返回空字符串"""
+        stats = _REQUEST_STATS.get({})
+        summary = ""
+        if stats.get("retries"):
+            summary += f"🔁 网络重试: {stats['retries']} 次\n"
+        if stats.get("cache_hits"):
+            summary += f"💾 缓存命中: {stats['cache_hits']} 次\n"
+        if stats.get("index_hits"):
+            summary += f"📇 来自插件索引: {stats['index_hits']} 个\n"
+        return summary
 
     async def _update_plugin(self, plugin_name: str) -> Tuple[bool, Optional[str], bool]:
         """更新指定插件或所有插件"""
@@ -363,55 +3681,70 @@ class PluginManagerCommand(BaseCommand):
                 await self.send_text("❌ 请指定要更新的插件名或使用 ALL 更新所有插件。")
                 return False, "未指定插件名", True
 
-            plugins_dir = self._get_plugins_directory()
-            plugins = self._scan_plugins(plugins_dir)
+            plugins = self._get_plugin_index().records
             
             if plugin_name.upper() == "ALL":
                 # 先检查所有需要更新的插件
                 plugins_to_update = []
-                ssl_context = ssl.create_default_context()
-                ssl_context.check_hostname = False
-                ssl_context.verify_mode = ssl.CERT_NONE
-                
+                downgrades = []
                 checking_message = "🔄 **正在检查所有插件的更新状态...**"
                 await self.send_text(checking_message)
-                
+
+                # 限额不足时，推迟的插件在重置后自动检查并更新
+                plugins, deferred, quota = await self._plan_github_quota(
+                    [p for p in plugins if p.repository_url], include_update=False)
+
                 for plugin in plugins:
-                    # 添加延迟避免API限制
-                    await self._rate_limit_delay()
-                    
                     # 只使用 repository_url 字段
-                    repository_url = plugin.get('repository_url', '')
+                    repository_url = plugin.repository_url
                     if not repository_url:
                         continue
                     
-                    remote_version = await self._get_remote_version(repository_url, ssl_context)
-                    if remote_version and remote_version != plugin['local_version']:
-                        plugin['remote_version'] = remote_version
-                        plugin['needs_update'] = True
+                    remote_version = await self._get_remote_version(repository_url)
+                    if remote_is_newer(plugin.local_version, remote_version):
+                        plugin.remote_version = remote_version
+                        plugin.needs_update = True
                         plugins_to_update.append(plugin)
+                    elif remote_is_older(plugin.local_version, remote_version):
+                        downgrades.append(f"{plugin.name} (本地 v{plugin.local_version}，远程 v{remote_version})")
+                self._record_checked([p.name for p in plugins])
+
+                plugins_to_update, deferred_updates, update_quota = await self._plan_github_quota(
+                    plugins_to_update, include_update=True)
+                deferred += deferred_updates
+                quota = quota or update_quota
+                deferred_message = ""
+                if deferred:
+                    _schedule_deferred(self.get_config, [p.name for p in deferred], quota['reset'], update=True)
+                    deferred_message = (f"⏸️ API限额不足，以下插件推迟到 {self._format_reset_time(quota['reset'])} 检查并更新: "
+                                        f"{', '.join(p.name for p in deferred)}\n")
+                if downgrades:
+                    deferred_message += f"🔻 远程版本低于本地，已跳过: {', '.join(downgrades)}\n"
 
                 if not plugins_to_update:
-                    await self.send_text("🟢 所有插件均为最新版本，无需更新。")
+                    await self.send_text(deferred_message or "🟢 所有插件均为最新版本，无需更新。")
                     return True, "无需更新", True
 
+                await self._prefetch_repository_trees(plugins_to_update)
                 update_message = f"🔄 **开始更新 {len(plugins_to_update)} 个插件**\n\n"
                 await self.send_text(update_message)
 
+                # 全部下载到暂存目录后统一验证，再逐个替换
                 success_count = 0
                 update_results = []
-                for plugin in plugins_to_update:
-                    try:
-                        if await self._perform_plugin_update(plugin):
-                            success_count += 1
-                            update_results.append(f"✅ {plugin['name']} → v{plugin['remote_version']}")
-                        else:
-                            update_results.append(f"❌ {plugin['name']} 更新失败")
-                    except Exception as e:
-                        update_results.append(f"❌ {plugin['name']} 更新出错: {str(e)}")
+                for plugin, ok in zip(plugins_to_update, await self._perform_plugin_updates(plugins_to_update)):
+                    if ok:
+                        success_count += 1
+                        notes = [note for note in (plugin.dependency_error, plugin.reload_status) if note]
+                        update_results.append(f"✅ {plugin.name} → v{plugin.remote_version}" +
+                                              (f"（{'；'.join(notes)}）" if notes else ""))
+                    else:
+                        update_results.append(f"❌ {plugin.name} 更新失败" +
+                                              (f": {plugin.update_error}" if plugin.update_error else ""))
 
                 # 统一发送更新结果
-                result_message = f"🎉 **批量更新完成**\n成功: {success_count}/{len(plugins_to_update)}\n\n"
+                result_message = f"🎉 **批量更新完成**\n成功: {success_count}/{len(plugins_to_update)}\n"
+                result_message += self._format_network_summary() + deferred_message + "\n"
                 for result in update_results:
                     result_message += f"{result}\n"
                 
@@ -420,49 +3753,48 @@ class PluginManagerCommand(BaseCommand):
 
             else:
                 # 更新指定插件
-                target_plugin = None
-                for plugin in plugins:
-                    if plugin['name'].lower() == plugin_name.lower():
-                        target_plugin = plugin
-                        break
-
+                target_plugin = await self._find_plugin(plugin_name)
                 if not target_plugin:
-                    await self.send_text(f"❌ 未找到插件: {plugin_name}")
                     return False, f"插件未找到: {plugin_name}", True
+                plugin_name = target_plugin.name
 
                 # 检查是否需要更新
-                ssl_context = ssl.create_default_context()
-                ssl_context.check_hostname = False
-                ssl_context.verify_mode = ssl.CERT_NONE
-                
-                # 添加延迟避免API限制
-                await self._rate_limit_delay()
-                
                 # 只使用 repository_url 字段
-                repository_url = target_plugin.get('repository_url', '')
+                repository_url = target_plugin.repository_url
                 if not repository_url:
                     await self.send_text(f"❌ 插件 {plugin_name} 没有配置仓库地址")
                     return False, "无仓库地址", True
                 
-                remote_version = await self._get_remote_version(repository_url, ssl_context)
+                remote_version = await self._get_remote_version(repository_url)
                 if not remote_version:
                     await self.send_text(f"❌ 无法获取 {plugin_name} 的远程版本信息")
                     return False, "无法获取远程版本", True
 
-                if remote_version == target_plugin['local_version']:
-                    await self.send_text(f"🟢 {plugin_name} 已是最新版本 (v{remote_version})")
+                if remote_is_older(target_plugin.local_version, remote_version):
+                    await self.send_text(f"🔻 {plugin_name} 的远程版本 v{remote_version} 低于本地 v{target_plugin.local_version}，"
+                                         f"不会降级")
+                    return True, "远程版本较旧", True
+                if not remote_is_newer(target_plugin.local_version, remote_version):
+                    await self.send_text(f"🟢 {plugin_name} 已是最新版本 (v{target_plugin.local_version})")
                     return True, "插件已是最新", True
 
-                target_plugin['remote_version'] = remote_version
-                await self.send_text(f"🔄 开始更新插件: {plugin_name} (v{target_plugin['local_version']} → v{remote_version})")
+                target_plugin.remote_version = remote_version
+                await self.send_text(f"🔄 开始更新插件: {plugin_name} (v{target_plugin.local_version} → v{remote_version})")
                 
                 if await self._perform_plugin_update(target_plugin):
-                    success_msg = f"✅ **更新成功**\n{plugin_name} 已更新到 v{remote_version}"
+                    success_msg = f"✅ **更新成功**\n{plugin_name} 已更新到 v{remote_version}\n"
+                    if target_plugin.dependency_error:
+                        success_msg += f"⚠️ {target_plugin.dependency_error}\n"
+                    if target_plugin.reload_status:
+                        success_msg += f"🔁 {target_plugin.reload_status}\n"
+                    success_msg += self._format_network_summary()
                     await self.send_text(success_msg)
                     return True, f"插件更新成功: {plugin_name}", True
                 else:
                     error_msg = f"❌ 更新插件失败: {plugin_name}"
-                    await self.send_text(error_msg)
+                    if target_plugin.update_error:
+                        error_msg += f"\n{target_plugin.update_error}"
+                    await self.send_text(f"{error_msg}\n{self._format_network_summary()}".strip())
                     return False, error_msg, True
 
         except Exception as e:
@@ -470,6 +3802,19 @@ class PluginManagerCommand(BaseCommand):
             await self.send_text(error_msg)
             return False, error_msg, True
 
+    async def _reload_command(self, plugin_name: str) -> Tuple[bool, Optional[str], bool]:
+        """热重载指定插件，新代码无需重启MaiBot即可生效"""
+        if not plugin_name:
+            await self.send_text("❌ 请指定要重新加载的插件名，例如 `/pm reload 海龟汤`")
+            return False, "未指定插件名", True
+        plugin = await self._find_plugin(plugin_name)
+        if not plugin:
+            return False, f"插件未找到: {plugin_name}", True
+        status = await self._reload_plugin(plugin)
+        ok = status.startswith("已热重载")
+        await self.send_text(f"{'🔁' if ok else '⚠️'} {plugin.name}: {status}")
+        return ok, status, True
+
     async def _plugin_info(self, plugin_name: str) -> Tuple[bool, Optional[str], bool]:
         """查看插件详细信息"""
         try:
@@ -477,39 +3822,28 @@ class PluginManagerCommand(BaseCommand):
                 await self.send_text("❌ 请指定要查看的插件名。")
                 return False, "未指定插件名", True
 
-            plugins_dir = self._get_plugins_directory()
-            plugins = self._scan_plugins(plugins_dir)
-            
-            target_plugin = None
-            for plugin in plugins:
-                if plugin['name'].lower() == plugin_name.lower():
-                    target_plugin = plugin
-                    break
-
+            target_plugin = await self._find_plugin(plugin_name)
             if not target_plugin:
-                await self.send_text(f"❌ 未找到插件: {plugin_name}")
                 return False, f"插件未找到: {plugin_name}", True
 
             # 构建详细信息消息
-            info_message = f"📋 **插件信息 - {target_plugin['name']}**\n\n"
-            info_message += f"🔸 **版本**: v{target_plugin['local_version']}\n"
-            info_message += f"🔸 **目录**: {target_plugin['directory_name']}\n"
-            info_message += f"🔸 **仓库**: {target_plugin['repository_url']}\n"
+            info_message = f"📋 **插件信息 - {target_plugin.name}**\n\n"
+            info_message += f"🔸 **版本**: v{target_plugin.local_version}\n"
+            info_message += f"🔸 **目录**: {target_plugin.directory_name}\n"
+            info_message += f"🔸 **仓库**: {target_plugin.repository_url}\n"
             
             # 检查远程版本
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
-            # 添加延迟避免API限制
-            await self._rate_limit_delay()
-            
             # 只使用 repository_url 字段
-            repository_url = target_plugin.get('repository_url', '')
+            repository_url = target_plugin.repository_url
             if repository_url:
-                remote_version = await self._get_remote_version(repository_url, ssl_context)
+                remote_version = await self._get_remote_version(repository_url)
                 if remote_version:
-                    status = "🟢 最新" if remote_version == target_plugin['local_version'] else "🟡 可更新"
+                    if remote_is_newer(target_plugin.local_version, remote_version):
+                        status = "🟡 可更新"
+                    elif remote_is_older(target_plugin.local_version, remote_version):
+                        status = "🔻 本地版本较新（远程较旧，不会降级）"
+                    else:
+                        status = "🟢 最新"
                     info_message += f"🔸 **远程版本**: v{remote_version}\n"
                     info_message += f"🔸 **状态**: {status}\n"
                 else:
@@ -518,9 +3852,15 @@ class PluginManagerCommand(BaseCommand):
                 info_message += "🔸 **状态**: 🔴 无仓库地址\n"
 
             # 自动更新设置
-            auto_update = self._get_plugin_auto_update_setting(target_plugin['name'])
+            settings = self._load_settings()
+            auto_update = self._get_plugin_auto_update_setting(target_plugin.name, settings)
             info_message += f"🔸 **自动更新**: {'✅ 开启' if auto_update else '❌ 关闭'}\n"
 
+            # 插件管理器安装的依赖版本
+            installed = settings.get('dependencies', {}).get(target_plugin.name, {}).get('installed')
+            if installed:
+                info_message += f"🔸 **依赖**: {', '.join(f'{name} {version}' for name, version in installed.items())}\n"
+
             await self.send_text(info_message)
             return True, f"已显示插件信息: {plugin_name}", True
 
@@ -541,9 +3881,9 @@ class PluginManagerCommand(BaseCommand):
                 plugins = self._scan_plugins(plugins_dir)
                 
                 for plugin in plugins:
-                    auto_update = settings.get('auto_update', {}).get(plugin['name'], False)
+                    auto_update = settings.get('auto_update', {}).get(plugin.name, False)
                     status = "✅ 开启" if auto_update else "❌ 关闭"
-                    message += f"• {plugin['name']}: {status}\n"
+                    message += f"• {plugin.name}: {status}\n"
                 
                 message += "\n💡 使用 `/pm settings <插件名> on/off` 修改设置"
                 message += "\n💡 例如: `/pm settings 海龟汤 on`"
@@ -565,12 +3905,8 @@ class PluginManagerCommand(BaseCommand):
                     return False, "操作参数错误", True
                 
                 # 验证插件是否存在
-                plugins_dir = self._get_plugins_directory()
-                plugins = self._scan_plugins(plugins_dir)
-                plugin_exists = any(p['name'].lower() == plugin_name.lower() for p in plugins)
-                
-                if not plugin_exists:
-                    await self.send_text(f"❌ 未找到插件: {plugin_name}")
+                target_plugin = await self._find_plugin(plugin_name)
+                if not target_plugin:
                     return False, "插件未找到", True
                 
                 # 更新设置
@@ -578,8 +3914,8 @@ class PluginManagerCommand(BaseCommand):
                 if 'auto_update' not in settings:
                     settings['auto_update'] = {}
                 
-                # 找到准确的插件名（保持大小写）
-                actual_plugin_name = next(p['name'] for p in plugins if p['name'].lower() == plugin_name.lower())
+                # 使用准确的插件名（保持大小写）
+                actual_plugin_name = target_plugin.name
                 settings['auto_update'][actual_plugin_name] = (action == 'on')
                 self._save_settings(settings)
                 
@@ -599,7 +3935,27 @@ class PluginManagerCommand(BaseCommand):
         plugins_dir = current_file.parent.parent
         return plugins_dir
 
-    def _scan_plugins(self, plugins_dir: Path) -> List[Dict[str, Any]]:
+    def _get_plugin_index(self) -> PluginIndex:
+        """扫描插件并建立查找索引，每条命令只扫描一次"""
+        if not hasattr(self, '_plugin_index'):
+            self._plugin_index = PluginIndex(self._scan_plugins(self._get_plugins_directory()),
+                                             self.get_config("lookup.aliases", {}) or {})
+        return self._plugin_index
+
+    async def _find_plugin(self, plugin_name: str) -> Optional[PluginRecord]:
+        """按插件名、目录名或别名查找插件，找不到时回复相近的插件名"""
+        index = self._get_plugin_index()
+        plugin = index.get(plugin_name)
+        if plugin is None:
+            message = f"❌ 未找到插件: {plugin_name}"
+            suggestions = index.suggest(plugin_name, int(self.get_config("lookup.suggestions", 3)))
+            if suggestions:
+                message += f"\n💡 你是不是要找: {'、'.join(suggestions)}"
+            await self.send_text(message)
+        return plugin
+
+    @TRACER.traced("scan")
+    def _scan_plugins(self, plugins_dir: Path) -> List[PluginRecord]:
         """扫描plugins目录下的所有插件"""
         plugins = []
         ignored_plugin = "Hello World 示例插件 (Hello World Plugin)"
@@ -616,169 +3972,372 @@ class PluginManagerCommand(BaseCommand):
                         if plugin_name == ignored_plugin:
                             continue
                             
-                        plugins.append({
-                            'name': plugin_name,
-                            'local_version': manifest_data.get('version', '未知'),
-                            'repository_url': manifest_data.get('repository_url', ''),
-                            'directory_name': item.name,
-                            'directory_path': item,
-                            'needs_update': False
-                        })
+                        plugins.append(PluginRecord(
+                            plugin_name,
+                            manifest_data.get('version', '未知'),
+                            manifest_data.get('repository_url', '') or '',
+                            item.name,
+                            item
+                        ))
                     except Exception as e:
-                        print(f"读取插件 {item.name} 的manifest文件失败: {e}")
+                        command_logger.warning(f"读取插件 {item.name} 的manifest文件失败: {e}")
                         continue
-        
+
+        TRACER.annotate(plugins=len(plugins))
         return plugins
 
-    async def _get_remote_version(self, repository_url: str, ssl_context: ssl.SSLContext = None) -> Optional[str]:
-        """从GitHub仓库获取最新版本号 - 支持GitHub认证"""
-        try:
-            if not repository_url or "github.com" not in repository_url:
-                print(f"无效的仓库URL: {repository_url}")
-                return None
+    def _get_source_provider(self, repository_url: str) -> Optional[Tuple[SourceProvider, RepositoryRef]]:
+        """根据仓库地址选择插件源提供者并解析仓库"""
+        provider = get_source_provider(repository_url, self.get_config)
+        if provider is None:
+            command_logger.warning(f"无效的仓库URL: {repository_url}")
+            return None
+        repo = provider.parse_repository(repository_url)
+        if repo is None:
+            return None
+        return provider, repo
 
-            # 清理和验证仓库URL
-            repo_path = repository_url.replace("https://github.com/", "").strip("/")
-            if not repo_path or '/' not in repo_path:
-                print(f"无效的仓库路径: {repo_path}")
-                return None
+    async def _get_registry_index(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """获取配置的插件索引，每条命令只下载一次"""
+        if not hasattr(self, '_registry_index'):
+            index_url = str(self.get_config("registry.index_url", "")).strip()
+            self._registry_index = None
+            if index_url:
+                self._registry_index = await REGISTRY_INDEX_CLIENT.load(index_url, self.get_config)
+        return self._registry_index
 
-            # 构建GitHub API URL
-            api_url = f"https://api.github.com/repos/{repo_path}/contents/_manifest.json"
-            print(f"请求GitHub API: {api_url}")
+    @TRACER.traced("remote_version", lambda self, repository_url, use_index=True: {'url': repository_url})
+    async def _get_remote_version(self, repository_url: str, use_index: bool = True) -> Optional[str]:
+        """从插件源获取最新版本号 - 按仓库地址选择GitHub/Gitee/GitLab/Gitea/本地路径
 
-            # 创建连接器，禁用SSL验证
-            connector = aiohttp.TCPConnector(ssl=ssl_context) if ssl_context else None
-            
-            # 获取GitHub认证头
-            headers = self._get_github_headers()
-            github_config = self._get_github_config()
-            
-            timeout = aiohttp.ClientTimeout(total=15)  # 15秒超时
-            
-            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-                async with session.get(api_url, headers=headers) as response:
-                    print(f"GitHub API响应状态: {response.status}")
-                    
-                    if response.status == 200:
-                        data = await response.json()
-                        if 'content' in data:
-                            # 解码base64内容
-                            content = base64.b64decode(data['content']).decode('utf-8')
-                            manifest_data = json.loads(content)
-                            version = manifest_data.get('version')
-                            print(f"获取到远程版本: {version}")
-                            return version
-                        else:
-                            print(f"响应中缺少content字段: {data}")
-                    elif response.status == 403:
-                        # 检查速率限制头
-                        remaining = response.headers.get('X-RateLimit-Remaining', '未知')
-                        limit = response.headers.get('X-RateLimit-Limit', '未知')
-                        reset_time = response.headers.get('X-RateLimit-Reset', '未知')
-                        print(f"GitHub API限制 - 剩余: {remaining}/{limit}, 重置: {reset_time}")
-                        
-                        if github_config.get('token'):
-                            print("即使使用Token也遇到限制，可能需要等待")
-                        else:
-                            print("未使用GitHub Token，API限制严格")
-                            
-                    elif response.status == 404:
-                        print("仓库或manifest文件不存在")
-                    elif response.status == 401:
-                        print("GitHub Token无效或过期")
-                    else:
-                        print(f"GitHub API错误: {response.status}")
-                        error_text = await response.text()
-                        print(f"错误详情: {error_text}")
-            
-            return None
+        use_index=False 时跳过插件索引直接查询插件源（Webhook通知仓库变化时索引可能还没更新）
+        """
+        try:
+            source = self._get_source_provider(repository_url)
+            if source is None:
+                return None
+            provider, repo = source
+
+            # 多个插件使用同一仓库地址时，一条命令内只查询一次
+            if not hasattr(self, '_remote_versions'):
+                self._remote_versions: Dict[str, Optional[str]] = {}
+            if use_index and repository_url in self._remote_versions:
+                return self._remote_versions[repository_url]
+            with METRICS.timer("plugin_manager_check_seconds", provider=provider.name):
+                version = await self._resolve_remote_version(provider, repo, repository_url, use_index)
+            self._remote_versions[repository_url] = version
+            return version
         except asyncio.TimeoutError:
-            print(f"获取远程版本超时: {repository_url}")
+            command_logger.warning(f"获取远程版本超时: {repository_url}")
             return None
         except Exception as e:
-            print(f"获取远程版本失败 {repository_url}: {e}")
+            command_logger.warning(f"获取远程版本失败 {repository_url}: {e}")
             return None
+        finally:
+            MIRROR_STATS.save()
+
+    async def _resolve_remote_version(self, provider: SourceProvider, repo: RepositoryRef,
+                                      repository_url: str, use_index: bool = True) -> Optional[str]:
+        """依次尝试插件索引（use_index=False 时跳过）、本机共享缓存和插件源
+
+        Webhook通知过的仓库直接查询插件源（不经过镜像），结果写回共享缓存后取消过期标记。
+        """
+        cache = get_shared_cache(self.get_config)
+        if repository_url in _STALE_REPOSITORIES:
+            token = _BYPASS_MIRRORS.set(True)
+            try:
+                version = await provider.resolve_version(repo)
+            finally:
+                _BYPASS_MIRRORS.reset(token)
+            if version:
+                _STALE_REPOSITORIES.discard(repository_url)
+                if cache is not None:
+                    cache.write_json("versions", f"{provider.name}:{repository_url}", {'version': version})
+            return version
+
+        # 插件索引中有该仓库时直接使用索引中的版本，不再单独请求仓库
+        index = await self._get_registry_index() if use_index else None
+        if index and normalize_repository_url(repository_url) in index:
+            _count_request_stat("index_hits")
+            return index[normalize_repository_url(repository_url)]['version']
+
+        if cache is None:
+            return await provider.resolve_version(repo)
+
+        # 多个进程同时检查时，只有第一个会真正请求插件源，其余等待后直接读取缓存
+        async def load() -> Optional[Dict[str, str]]:
+            version = await provider.resolve_version(repo)
+            return {'version': version} if version else None
+
+        cached = await cache.get_or_fill_json("versions", f"{provider.name}:{repository_url}",
+                                              self._version_cache_ttl(), load)
+        return cached['version'] if cached else None
+
+    def _version_cache_ttl(self) -> float:
+        """远程版本号在本机共享缓存中的有效期"""
+        if self.get_config("webhook.enabled", False):
+            # 仓库变化由Webhook通知并清除缓存，检查时可以长时间信任缓存
+            return float(self.get_config("webhook.version_ttl_seconds", 86400))
+        return float(self.get_config("cache.version_ttl_seconds", 120))
 
-    async def _perform_plugin_update(self, plugin: Dict[str, Any]) -> bool:
-        """执行插件更新：从GitHub仓库下载并覆盖文件 - 改进的网络稳定性"""
+    def _get_github_provider(self) -> Optional[GitHubProvider]:
+        """当前配置下直连GitHub的提供者（离线模式或使用局域网缓存时为None）"""
+        provider = get_source_provider("https://github.com/", self.get_config)
+        return provider if isinstance(provider, GitHubProvider) else None
+
+    async def _estimate_api_calls(self, plugin: PluginRecord, include_update: bool) -> int:
+        """估算检查（及更新）一个插件要消耗的GitHub API请求数，命中缓存、索引或走镜像的部分不计入"""
+        source = self._get_source_provider(plugin.repository_url)
+        if source is None or not isinstance(source[0], GitHubProvider):
+            return 0
+        provider, repo = source
+        calls = 1 if include_update else 0  # 更新时获取文件列表
+        repository_url = plugin.repository_url
+        if repository_url in getattr(self, '_remote_versions', {}):
+            return calls
+        index = await self._get_registry_index()
+        if index and normalize_repository_url(repository_url) in index:
+            return calls
+        cache = get_shared_cache(self.get_config)
+        if cache is not None and cache.read_json("versions", f"{provider.name}:{repository_url}",
+                                                 self._version_cache_ttl()) is not None:
+            return calls
+        if provider._get_mirror_templates():
+            return calls
+        return calls + 1
+
+    async def _plan_github_quota(self, plugins: List[PluginRecord], include_update: bool
+                                 ) -> Tuple[List[PluginRecord], List[PluginRecord], Optional[Dict[str, int]]]:
+        """按剩余GitHub API限额挑选本次处理的插件，返回 (本次处理, 推迟处理, 限额信息)
+
+        限额不足时优先处理开启了自动更新的插件，其次是最久没有检查过的插件。
+        """
+        if not plugins or not self.get_config("quota.enabled", True):
+            return plugins, [], None
+        costs = [await self._estimate_api_calls(plugin, include_update) for plugin in plugins]
+        if sum(costs) == 0:
+            return plugins, [], None
+        provider = self._get_github_provider()
+        quota = await provider.get_rate_limit() if provider else None
+        if quota is None:
+            return plugins, [], None
+        budget = quota['remaining'] - int(self.get_config("quota.reserve_calls", 5))
+        if sum(costs) <= budget:
+            return plugins, [], quota
+
+        settings = self._load_settings()
+        auto_update = settings.get('auto_update', {})
+        last_checked = settings.get('last_checked', {})
+        order = sorted(range(len(plugins)), key=lambda i: (not auto_update.get(plugins[i].name, False),
+                                                           last_checked.get(plugins[i].name, 0)))
+        selected = set()
+        for i in order:
+            if costs[i] <= budget:
+                budget -= costs[i]
+                selected.add(i)
+        allowed = [plugin for i, plugin in enumerate(plugins) if i in selected]
+        deferred = [plugin for i, plugin in enumerate(plugins) if i not in selected]
+        command_logger.info(f"GitHub API剩余 {quota['remaining']} 次，需要 {sum(costs)} 次，推迟 {len(deferred)} 个插件")
+        return allowed, deferred, quota
+
+    @TRACER.traced("prefetch_trees")
+    async def _prefetch_repository_trees(self, plugins: List[PluginRecord]) -> None:
+        """按 仓库+分支 分组，同组有多个插件时一次获取整个仓库的文件列表，供各插件的子目录共用"""
+        groups: Dict[Tuple, List[Tuple[SourceProvider, RepositoryRef]]] = {}
+        for plugin in plugins:
+            source = self._get_source_provider(plugin.repository_url)
+            if source is not None and source[1].subpath:
+                groups.setdefault((source[0].name,) + source[1].group_key, []).append(source)
+        if not hasattr(self, '_repository_trees'):
+            self._repository_trees: Dict[Tuple, Optional[List[Dict[str, Any]]]] = {}
+        for key, members in groups.items():
+            if len(members) < 2 or key in self._repository_trees:
+                continue
+            provider, repo = members[0]
+            self._repository_trees[key] = await provider.list_tree_recursive(repo)
+            if self._repository_trees[key] is not None:
+                update_logger.info(f"仓库 {repo.full_name} 的 {len(members)} 个插件共用一次文件列表")
+
+    @TRACER.traced("list_files", lambda self, provider, repo: {'repo': repo.full_name, 'path': repo.subpath})
+    async def _list_plugin_files(self, provider: SourceProvider, repo: RepositoryRef) -> Optional[List[Dict[str, Any]]]:
+        """列出插件目录（仓库根目录或子目录）下的条目"""
+        tree = getattr(self, '_repository_trees', {}).get((provider.name,) + repo.group_key)
+        if tree is None:
+            return await provider.list_tree(repo, repo.subpath)
+        prefix = f"{repo.subpath}/"
+        return [dict(entry) for entry in tree
+                if entry['path'].startswith(prefix) and "/" not in entry['path'][len(prefix):]]
+
+    @TRACER.traced("update", lambda self, plugin: {'plugin': plugin.name})
+    async def _perform_plugin_update(self, plugin: PluginRecord) -> bool:
+        """执行插件更新：从插件源下载并覆盖文件 - 改进的网络稳定性"""
+        return (await self._perform_plugin_updates([plugin]))[0]
+
+    async def _perform_plugin_updates(self, plugins: List[PluginRecord]) -> List[bool]:
+        """批量更新：依次下载到各自的暂存目录，并行验证所有暂存的插件后再逐个替换，返回每个插件是否更新成功"""
+        results = [False] * len(plugins)
+        elapsed = [0.0] * len(plugins)
         try:
-            repository_url = plugin['repository_url']
-            if not repository_url or "github.com" not in repository_url:
-                print(f"无效的仓库URL: {repository_url}")
-                return False
+            with contextlib.ExitStack() as stack:
+                staged: List[Tuple[int, Path]] = []
+                for i, plugin in enumerate(plugins):
+                    started = time.monotonic()
+                    temp_path = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+                    if await self._stage_plugin_update(plugin, temp_path):
+                        staged.append((i, temp_path))
+                    elapsed[i] += time.monotonic() - started
 
-            repo_path = repository_url.replace("https://github.com/", "").strip("/")
-            if not repo_path or '/' not in repo_path:
-                print(f"无效的仓库路径: {repo_path}")
-                return False
+                # 替换前在独立进程中验证，验证失败的插件保持不变
+                if staged and self.get_config("validation.enabled", False):
+                    started = time.monotonic()
+                    with TRACER.span("validate", plugins=len(staged)):
+                        await self._validate_staged_updates([(plugins[i], temp_path) for i, temp_path in staged])
+                    for i, _ in staged:
+                        elapsed[i] += time.monotonic() - started
 
-            api_url = f"https://api.github.com/repos/{repo_path}/contents/"
-            print(f"开始更新插件 {plugin['name']}，仓库: {repo_path}")
+                for i, temp_path in staged:
+                    if plugins[i].update_error:
+                        continue
+                    started = time.monotonic()
+                    results[i] = self._commit_staged_update(plugins[i], temp_path)
+                    elapsed[i] += time.monotonic() - started
 
-            # 创建 SSL 上下文以禁用证书验证
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            connector = aiohttp.TCPConnector(ssl=ssl_context)
+            # 先安装依赖再重载，只处理本次替换成功的插件；依赖安装失败的插件不重载
+            committed = [plugin for plugin, ok in zip(plugins, results) if ok]
+            if committed and self.get_config("dependencies.enabled", False):
+                await self._install_requirements(committed)
+            if self.get_config("reload.after_update", False):
+                for plugin in committed:
+                    if not plugin.dependency_error:
+                        plugin.reload_status = await self._reload_plugin(plugin)
+        finally:
+            for seconds in elapsed:
+                METRICS.observe("plugin_manager_update_seconds", seconds)
+            MIRROR_STATS.save()
+        return results
 
-            # 获取GitHub认证头
-            headers = self._get_github_headers()
+    async def _reload_plugin(self, plugin: PluginRecord) -> str:
+        """热重载插件并返回结果说明，失败时插件在重启MaiBot后生效"""
+        if plugin.directory_path.resolve() == Path(__file__).parent.resolve():
+            return "插件管理器自身需要重启MaiBot后生效"
+        registry = _get_plugin_registry()
+        if registry is None:
+            return "宿主不支持热重载，重启MaiBot后生效"
+        try:
+            with TRACER.span("reload", plugin=plugin.name):
+                seconds = await reload_plugin_directory(registry, plugin.directory_path)
+        except Exception as e:
+            update_logger.error(f"热重载插件 {plugin.name} 失败: {e}")
+            return f"热重载失败: {e}，重启MaiBot后生效"
+        update_logger.info(f"已热重载插件 {plugin.name}，用时 {seconds:.3f} 秒")
+        return f"已热重载，用时 {seconds:.3f} 秒"
 
-            # 创建临时目录
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_path = Path(temp_dir)
-                
-                # 获取仓库文件列表
-                async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
-                    async with session.get(api_url) as response:
-                        if response.status != 200:
-                            print(f"获取仓库文件列表失败: {response.status}")
-                            return False
-                        
-                        files_data = await response.json()
-                        print(f"找到 {len(files_data)} 个文件")
-                        
-                        # 只下载必要的文件，跳过LICENSE等非必要文件
-                        essential_files = ['plugin.py', '_manifest.json', 'config.toml', 'requirements.txt']
-                        download_tasks = []
-                        for file_info in files_data:
-                            if file_info['type'] == 'file' and file_info.get('download_url'):
-                                file_name = file_info['name']
-                                # 优先下载必要文件，其他文件可选
-                                if file_name in essential_files or file_name.endswith('.py') or file_name.endswith('.json'):
-                                    download_tasks.append(self._download_file_with_retry(session, file_info, temp_path))
-                        
-                        # 并行下载文件，但限制并发数
-                        if download_tasks:
-                            # 限制并发数为3，避免网络压力过大
-                            semaphore = asyncio.Semaphore(3)
-                            async def limited_download(task):
-                                async with semaphore:
-                                    return await task
-                            
-                            limited_tasks = [limited_download(task) for task in download_tasks]
-                            await asyncio.gather(*limited_tasks, return_exceptions=True)
+    async def _stage_plugin_update(self, plugin: PluginRecord, temp_path: Path) -> bool:
+        """把插件的新版本下载到暂存目录（按配置预编译），成功时返回True"""
+        plugin.update_error = None
+        try:
+            source = self._get_source_provider(plugin.repository_url)
+            if source is None:
+                return False
+            provider, repo = source
+            update_logger.info(f"开始更新插件 {plugin.name}，仓库: {repo.full_name}（{provider.name}）")
 
-                # 检查是否下载了必要文件
-                downloaded_files = list(temp_path.iterdir())
-                essential_downloaded = any(file.name in essential_files for file in downloaded_files)
+            # 获取插件目录的文件列表（同一仓库的多个插件共用一次完整列表）
+            files_data = await self._list_plugin_files(provider, repo)
+            if files_data is None:
+                update_logger.warning("获取仓库文件列表失败")
+                return False
+            update_logger.debug(f"找到 {len(files_data)} 个文件")
+            
+            # 只下载必要的文件，跳过LICENSE等非必要文件
+            essential_files = ['plugin.py', '_manifest.json', 'config.toml', 'requirements.txt']
+            budget = self._create_download_budget()
+            download_files = []
+            for file_info in files_data:
+                if file_info['type'] == 'file' and file_info.get('download_url'):
+                    file_name = file_info['name']
+                    # 优先下载必要文件，其他文件可选
+                    if file_name in essential_files or file_name.endswith('.py') or file_name.endswith('.json'):
+                        download_files.append(file_info)
+            
+            # 并行下载文件，但限制并发数
+            if download_files:
+                # 限制并发数为3，避免网络压力过大
+                semaphore = asyncio.Semaphore(3)
+                async def limited_download(file_info):
+                    async with semaphore:
+                        with TRACER.span("download", file=file_info['name']) as span:
+                            ok = await provider.fetch_file(file_info, temp_path, budget)
+                            if ok:
+                                span.set(bytes=(temp_path / file_info['name']).stat().st_size)
+                            return ok
                 
-                if not essential_downloaded:
-                    print("没有成功下载必要文件")
+                tasks = [asyncio.ensure_future(limited_download(file_info)) for file_info in download_files]
+                size_error: Optional[DownloadSizeExceeded] = None
+                try:
+                    for finished in asyncio.as_completed(tasks):
+                        try:
+                            await finished
+                        except DownloadSizeExceeded as e:
+                            # 超出预算后立即取消其余下载，不再继续占用带宽和磁盘
+                            size_error = e
+                            break
+                        except Exception:
+                            pass
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                if size_error is not None:
+                    plugin.update_error = f"下载大小超限: {size_error}"
+                    update_logger.warning(f"插件 {plugin.name} 更新中止，{plugin.update_error}")
+                    return False
+                results = [task.exception() or task.result() for task in tasks]
+                # 替换时会清空插件目录，任何一个选中的文件没有下载成功都不能替换，否则该文件会从插件中消失
+                failed = [file_info['name'] for file_info, result in zip(download_files, results) if result is not True]
+                if failed:
+                    plugin.update_error = f"下载失败: {', '.join(failed)}"
+                    update_logger.warning(f"插件 {plugin.name} 更新中止，{plugin.update_error}")
+                    return False
+
+            # 检查是否下载了必要文件
+            downloaded_files = list(temp_path.iterdir())
+            essential_downloaded = any(file.name in essential_files for file in downloaded_files)
+            
+            if not essential_downloaded:
+                update_logger.warning("没有成功下载必要文件")
+                return False
+
+            update_logger.debug(f"成功下载 {len(downloaded_files)} 个文件")
+
+            # 在暂存目录中预编译字节码，编译失败时不替换插件
+            if self.get_config("precompile.enabled", False):
+                with TRACER.span("precompile"):
+                    compile_error = await self._precompile_staged(temp_path, plugin.directory_path)
+                if compile_error:
+                    plugin.update_error = f"编译失败: {compile_error}"
+                    update_logger.warning(f"插件 {plugin.name} 更新中止，{plugin.update_error}")
                     return False
+            return True
 
-                print(f"成功下载 {len(downloaded_files)} 个文件")
+        except Exception as e:
+            update_logger.exception(f"执行插件更新失败 {plugin.name}: {e}")
+            return False
 
-                # 备份原插件目录
-                plugin_dir = plugin['directory_path']
-                backup_dir = plugin_dir.with_suffix('.backup')
+    def _commit_staged_update(self, plugin: PluginRecord, temp_path: Path) -> bool:
+        """用暂存目录替换插件目录，失败时从备份恢复"""
+        try:
+            # 备份原插件目录
+            plugin_dir = plugin.directory_path
+            backup_dir = plugin_dir.with_suffix('.backup')
+            with TRACER.span("backup"):
                 if backup_dir.exists():
                     shutil.rmtree(backup_dir)
                 shutil.copytree(plugin_dir, backup_dir)
-                print(f"已创建备份: {backup_dir}")
+            update_logger.debug(f"已创建备份: {backup_dir}")
 
-                try:
+            try:
+                with TRACER.span("copy_files"):
                     # 清空原目录
                     for item in plugin_dir.iterdir():
                         if item.is_file():
@@ -793,68 +4352,215 @@ class PluginManagerCommand(BaseCommand):
                         elif item.is_dir():
                             shutil.copytree(item, plugin_dir / item.name)
 
-                    print(f"成功更新插件 {plugin['name']}")
+                update_logger.info(f"成功更新插件 {plugin.name}")
 
-                    # 更新成功后删除备份
-                    if backup_dir.exists():
-                        shutil.rmtree(backup_dir)
-                    
-                    return True
+                # 更新成功后删除备份
+                if backup_dir.exists():
+                    shutil.rmtree(backup_dir)
+                
+                return True
 
-                except Exception as e:
+            except Exception as e:
+                # 恢复备份
+                update_logger.error(f"更新失败，恢复备份: {e}")
+                if backup_dir.exists():
+                    # 清空失败的文件
+                    for item in plugin_dir.iterdir():
+                        if item.is_file():
+                            item.unlink()
+                        elif item.is_dir():
+                            shutil.rmtree(item)
                     # 恢复备份
-                    print(f"更新失败，恢复备份: {e}")
-                    if backup_dir.exists():
-                        # 清空失败的文件
-                        for item in plugin_dir.iterdir():
-                            if item.is_file():
-                                item.unlink()
-                            elif item.is_dir():
-                                shutil.rmtree(item)
-                        # 恢复备份
-                        for item in backup_dir.iterdir():
-                            if item.is_file():
-                                shutil.copy2(item, plugin_dir / item.name)
-                            elif item.is_dir():
-                                shutil.copytree(item, plugin_dir / item.name)
-                        print("已从备份恢复插件")
-                    return False
+                    for item in backup_dir.iterdir():
+                        if item.is_file():
+                            shutil.copy2(item, plugin_dir / item.name)
+                        elif item.is_dir():
+                            shutil.copytree(item, plugin_dir / item.name)
+                    update_logger.info("已从备份恢复插件")
+                return False
 
         except Exception as e:
-            print(f"执行插件更新失败 {plugin['name']}: {e}")
-            import traceback
-            traceback.print_exc()
+            update_logger.exception(f"执行插件更新失败 {plugin.name}: {e}")
             return False
 
-    async def _download_file_with_retry(self, session: aiohttp.ClientSession, file_info: Dict, temp_path: Path, max_retries: int = 3) -> None:
-        """下载单个文件，带重试机制"""
-        for attempt in range(max_retries):
+    async def _validate_staged_updates(self, staged: List[Tuple[PluginRecord, Path]]) -> None:
+        """并行验证暂存的插件：每个插件在独立的子进程中导入，同时测量当前安装版本的导入耗时作为基准
+
+        验证失败或导入耗时明显变慢的插件会设置 update_error，不会被替换。
+        """
+        workers = int(self.get_config("validation.workers", 0)) or os.cpu_count() or 1
+        max_slowdown = float(self.get_config("validation.max_import_slowdown", 3.0))
+        min_regression = float(self.get_config("validation.min_regression_seconds", 0.5))
+        semaphore = asyncio.Semaphore(max(1, workers))
+
+        async def limited(directory: Path, package: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._validate_plugin_directory(directory, package)
+
+        jobs = []
+        for plugin, temp_path in staged:
+            package = plugin.directory_path.name.replace(".", "_")
+            jobs.append(limited(temp_path, package))
+            if max_slowdown > 0:
+                jobs.append(limited(plugin.directory_path, package))
+        results = iter(await asyncio.gather(*jobs))
+
+        for plugin, _ in staged:
+            result = next(results)
+            baseline = next(results) if max_slowdown > 0 else {}
+            if not result['ok']:
+                plugin.update_error = f"验证失败: {result['error']}"
+            elif result.get('missing'):
+                update_logger.warning(f"插件 {plugin.name} 缺少依赖 {result['missing']}，跳过导入检查")
+            elif baseline.get('ok') and baseline.get('import_seconds') is not None and not baseline.get('missing'):
+                seconds, previous = result['import_seconds'], baseline['import_seconds']
+                update_logger.debug(f"插件 {plugin.name} 导入耗时 {seconds:.3f} 秒（当前版本 {previous:.3f} 秒）")
+                if seconds > previous * max_slowdown and seconds - previous > min_regression:
+                    plugin.update_error = f"导入耗时从 {previous:.2f} 秒增加到 {seconds:.2f} 秒"
+            if plugin.update_error:
+                update_logger.warning(f"插件 {plugin.name} 更新中止，{plugin.update_error}")
+
+    async def _validate_plugin_directory(self, directory: Path, package: str) -> Dict[str, Any]:
+        """在新的解释器进程中检查 _manifest.json 并导入 plugin.py（src.plugin_system 为桩模块），返回验证结果"""
+        timeout = float(self.get_config("validation.timeout", 30))
+        if not sys.executable:
+            return {'ok': True, 'missing': "Python解释器", 'import_seconds': None}
+        # -B: 不在插件目录中写入以暂存路径编译的字节码
+        # 字节码缓存指向空的临时目录：暂存目录中有预编译的字节码而安装目录中不一定有，
+        # 两边都从源码编译，导入耗时才可以比较
+        with tempfile.TemporaryDirectory(prefix="plugin_manager_pycache_") as pycache_prefix:
+            env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1", PYTHONPYCACHEPREFIX=pycache_prefix)
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-B", "-c", _STAGED_VALIDATOR_SCRIPT, str(directory), package,
+                _VALIDATION_RESULT_MARKER, cwd=str(directory), env=env,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+            )
             try:
-                file_url = file_info['download_url']
-                file_path = temp_path / file_info['name']
-                
-                # 设置较短的超时时间，避免长时间等待
-                timeout = aiohttp.ClientTimeout(total=10)
-                
-                async with session.get(file_url, timeout=timeout) as response:
-                    if response.status == 200:
-                        content = await response.read()
-                        with open(file_path, 'wb') as f:
-                            f.write(content)
-                        print(f"下载成功: {file_info['name']} (尝试 {attempt + 1})")
-                        return
-                    else:
-                        print(f"下载失败 {file_info['name']}: {response.status} (尝试 {attempt + 1})")
+                output, _ = await asyncio.wait_for(process.communicate(), timeout=timeout)
             except asyncio.TimeoutError:
-                print(f"下载超时 {file_info['name']} (尝试 {attempt + 1})")
-            except Exception as e:
-                print(f"下载文件 {file_info['name']} 时出错 (尝试 {attempt + 1}): {e}")
-            
-            # 如果不是最后一次尝试，等待后重试
-            if attempt < max_retries - 1:
-                await asyncio.sleep(1)  # 等待1秒后重试
-        
-        print(f"下载失败 {file_info['name']}，已重试 {max_retries} 次")
+                process.kill()
+                await process.wait()
+                return {'ok': False, 'error': f"导入超过 {timeout:g} 秒未完成"}
+        lines = output.decode('utf-8', errors='replace').splitlines()
+        for line in reversed(lines):
+            if line.startswith(_VALIDATION_RESULT_MARKER):
+                return json.loads(line[len(_VALIDATION_RESULT_MARKER):])
+        last_line = next((line.strip() for line in reversed(lines) if line.strip()), "")
+        return {'ok': False, 'error': f"验证进程异常退出（退出码 {process.returncode}）{last_line}"}
+
+    async def _install_requirements(self, plugins: List[PluginRecord]) -> None:
+        """合并安装插件的 requirements.txt：内容与上次安装时相同的跳过，其余在一次 pip 调用中统一解析安装
+
+        安装失败时设置插件的 dependency_error；成功后在设置文件中记录依赖的哈希和已安装的版本。
+        """
+        import hashlib
+        import subprocess
+        recorded = self._load_settings().get('dependencies', {})
+        changed: List[Tuple[PluginRecord, Path, str]] = []
+        for plugin in plugins:
+            requirements = plugin.directory_path / "requirements.txt"
+            if not requirements.is_file():
+                continue
+            digest = hashlib.sha256(requirements.read_bytes().replace(b"\r\n", b"\n").strip()).hexdigest()
+            if recorded.get(plugin.name, {}).get('hash') == digest:
+                update_logger.debug(f"插件 {plugin.name} 的依赖未变化，跳过安装")
+                continue
+            changed.append((plugin, requirements, digest))
+        if not changed:
+            return
+
+        args = [sys.executable, "-m", "pip", "install", "--disable-pip-version-check", "--no-input", "-q"]
+        wheel_dir = self.get_config("dependencies.wheel_dir", "")
+        if wheel_dir:
+            args += ["--find-links", str(wheel_dir)]
+        if self.get_config("dependencies.no_index", False):
+            args.append("--no-index")
+        for _, requirements, _ in changed:
+            args += ["-r", str(requirements)]
+        timeout = float(self.get_config("dependencies.timeout", 600))
+
+        def run() -> subprocess.CompletedProcess:
+            return subprocess.run(args, capture_output=True, timeout=timeout)
+
+        started = time.monotonic()
+        error = None
+        try:
+            with TRACER.span("install_requirements", plugins=len(changed)):
+                result = await asyncio.get_running_loop().run_in_executor(None, run)
+            if result.returncode != 0:
+                output = (result.stderr or result.stdout).decode('utf-8', errors='replace').splitlines()
+                error = " ".join(line.strip() for line in output if line.strip())[-300:] or f"pip 退出码 {result.returncode}"
+        except subprocess.TimeoutExpired:
+            error = f"pip 超过 {timeout:g} 秒未完成"
+        except OSError as e:
+            error = str(e)
+        names = ", ".join(plugin.name for plugin, _, _ in changed)
+        if error:
+            update_logger.error(f"安装依赖失败（{names}）: {error}")
+            for plugin, _, _ in changed:
+                plugin.dependency_error = f"依赖安装失败: {error}"
+            return
+        update_logger.info(f"已在一次 pip 调用中安装 {len(changed)} 个插件的依赖（{names}），"
+                           f"用时 {time.monotonic() - started:.1f} 秒")
+
+        # pip 耗时较长，期间设置可能被其他命令修改，重新读取后再写入
+        importlib.invalidate_caches()
+        settings = self._load_settings()
+        dependencies = settings.setdefault('dependencies', {})
+        for plugin, requirements, digest in changed:
+            dependencies[plugin.name] = {'hash': digest, 'installed': self._installed_versions(requirements),
+                                         'installed_at': int(time.time())}
+        self._save_settings(settings)
+
+    @staticmethod
+    def _installed_versions(requirements: Path) -> Dict[str, str]:
+        """requirements.txt 中各依赖当前安装的版本，跳过选项行和未安装的包"""
+        from importlib import metadata
+        versions = {}
+        for line in requirements.read_text(encoding='utf-8', errors='replace').splitlines():
+            line = line.split("#", 1)[0].strip()
+            match = re.match(r"[A-Za-z0-9][A-Za-z0-9._-]*", line)
+            if not match:
+                continue
+            try:
+                versions[match.group(0)] = metadata.version(match.group(0))
+            except metadata.PackageNotFoundError:
+                pass
+        return versions
+
+    async def _precompile_staged(self, staged_dir: Path, target_dir: Path) -> Optional[str]:
+        """在子进程中用 compileall 的进程池把暂存目录中的 .py 编译到 __pycache__，返回编译错误，成功时返回None
+
+        字节码中记录的源文件路径指向最终的插件目录；复制文件时保留修改时间，字节码在替换后仍然有效。
+        """
+        if not sys.executable:
+            update_logger.warning("无法确定Python解释器路径，跳过预编译")
+            return None
+        workers = max(0, int(self.get_config("precompile.workers", 0)))
+        started = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "compileall", "-q", "-j", str(workers), "-d", str(target_dir), str(staged_dir),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        try:
+            output, _ = await asyncio.wait_for(process.communicate(), timeout=120)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return "预编译超时"
+        update_logger.debug(f"预编译 {target_dir.name} 用时 {time.monotonic() - started:.2f} 秒")
+        if process.returncode == 0:
+            return None
+        # 只保留出错位置和异常信息：源码行是按最终路径读取的，显示的还是旧文件的内容
+        lines = [line.strip() for line in output.decode('utf-8', errors='replace').splitlines()
+                 if line.strip() and not line.startswith(("Listing ", "***", "    "))]
+        return "\n".join(lines[-6:]) or f"compileall 退出码 {process.returncode}"
+
+    def _create_download_budget(self) -> DownloadBudget:
+        """根据配置创建单次更新的下载预算"""
+        max_file_mb = self.get_config("network.max_file_size_mb", 50)
+        max_update_mb = self.get_config("network.max_update_size_mb", 200)
+        return DownloadBudget(int(max_file_mb * 1024 * 1024), int(max_update_mb * 1024 * 1024))
 
     def _get_settings_file_path(self) -> Path:
         """获取设置文件路径"""
@@ -869,7 +4575,7 @@ class PluginManagerCommand(BaseCommand):
                 with open(settings_file, 'r', encoding='utf-8') as f:
                     return json.load(f)
             except Exception as e:
-                print(f"读取设置文件失败: {e}")
+                command_logger.warning(f"读取设置文件失败: {e}")
         return {}
 
     def _save_settings(self, settings: Dict[str, Any]) -> None:
@@ -879,11 +4585,23 @@ class PluginManagerCommand(BaseCommand):
             with open(settings_file, 'w', encoding='utf-8') as f:
                 json.dump(settings, f, ensure_ascii=False, indent=2)
         except Exception as e:
-            print(f"保存设置文件失败: {e}")
+            command_logger.warning(f"保存设置文件失败: {e}")
 
-    def _get_plugin_auto_update_setting(self, plugin_name: str) -> bool:
-        """获取插件的自动更新设置"""
+    def _record_checked(self, plugin_names: List[str]) -> None:
+        """记录插件最近一次检查更新的时间，限额不足时优先检查最久未检查的插件"""
+        if not plugin_names:
+            return
         settings = self._load_settings()
+        last_checked = settings.setdefault('last_checked', {})
+        now = int(time.time())
+        for name in plugin_names:
+            last_checked[name] = now
+        self._save_settings(settings)
+
+    def _get_plugin_auto_update_setting(self, plugin_name: str, settings: Optional[Dict[str, Any]] = None) -> bool:
+        """获取插件的自动更新设置，遍历多个插件时由调用方传入一次读取的 settings"""
+        if settings is None:
+            settings = self._load_settings()
         return settings.get('auto_update', {}).get(plugin_name, False)
 
 
@@ -904,7 +4622,25 @@ class PluginManagerPlugin(BasePlugin):
     config_section_descriptions = {
         "plugin": "插件启用配置",
         "admin": "管理员配置",
-        "github": "GitHub API配置"
+        "github": "GitHub API配置",
+        "network": "网络与下载配置",
+        "sources": "其他插件源配置（Gitee/GitLab/Gitea）",
+        "offline": "离线更新配置",
+        "lan_cache": "局域网更新缓存配置",
+        "cache": "本机共享缓存配置",
+        "registry": "插件索引配置",
+        "webhook": "Webhook接收服务配置",
+        "quota": "GitHub API限额规划配置",
+        "metrics": "指标服务配置",
+        "logging": "日志配置",
+        "tracing": "命令追踪配置",
+        "profile": "性能分析配置",
+        "transport": "HTTP录制/回放配置",
+        "lookup": "插件名查找配置",
+        "precompile": "更新后预编译配置",
+        "validation": "更新前验证配置",
+        "reload": "热重载配置",
+        "dependencies": "依赖安装配置"
     }
 
     config_schema = {
@@ -938,9 +4674,330 @@ class PluginManagerPlugin(BasePlugin):
                 default="",
                 description="GitHub Personal Access Token（获取地址：https://github.com/settings/tokens，只需要public_repo权限）"
             )
+        },
+        "network": {
+            "max_file_size_mb": ConfigField(
+                type=float,
+                default=50,
+                description="单个文件的最大下载大小（MB），超过则中止更新"
+            ),
+            "max_update_size_mb": ConfigField(
+                type=float,
+                default=200,
+                description="单个插件一次更新的最大总下载量（MB），超过则中止更新"
+            ),
+            "mirrors": ConfigField(
+                type=list,
+                default=[],
+                description="按优先级排列的下载镜像地址模板，可用占位符 {owner} {repo} {ref} {path} {raw_url}；留空则直接使用GitHub"
+            )
+        },
+        "sources": {
+            "gitee_token": ConfigField(
+                type=str,
+                default="",
+                description="Gitee 私人令牌（可选，提升API限额）"
+            ),
+            "gitlab_hosts": ConfigField(
+                type=list,
+                default=["gitlab.com"],
+                description="按GitLab API访问的域名列表（自建GitLab请添加到此处）"
+            ),
+            "gitlab_token": ConfigField(
+                type=str,
+                default="",
+                description="GitLab Personal Access Token（可选，需要 read_api 权限）"
+            ),
+            "gitea_hosts": ConfigField(
+                type=list,
+                default=["codeberg.org"],
+                description="按Gitea/Forgejo API访问的域名列表（自建Gitea请添加到此处）"
+            ),
+            "gitea_token": ConfigField(
+                type=str,
+                default="",
+                description="Gitea Access Token（可选）"
+            )
+        },
+        "offline": {
+            "enabled": ConfigField(
+                type=bool,
+                default=False,
+                description="是否启用离线模式（只从本地镜像目录检查和获取更新，不访问网络）"
+            ),
+            "mirror_dir": ConfigField(
+                type=str,
+                default="",
+                description="本地镜像目录，存放 <owner>/<repo>.git 裸仓库或 <owner>/<repo>/<版本>.zip 归档"
+            )
+        },
+        "lan_cache": {
+            "serve": ConfigField(
+                type=bool,
+                default=False,
+                description="是否对局域网内的其他实例提供更新缓存服务"
+            ),
+            "host": ConfigField(
+                type=str,
+                default="127.0.0.1",
+                description="缓存服务监听地址，对局域网提供服务时改为 0.0.0.0 或本机的局域网地址"
+            ),
+            "port": ConfigField(
+                type=int,
+                default=8790,
+                description="缓存服务监听端口"
+            ),
+            "ttl_seconds": ConfigField(
+                type=int,
+                default=300,
+                description="缓存服务中版本号和文件列表的缓存时间（秒）"
+            ),
+            "negative_ttl_seconds": ConfigField(
+                type=int,
+                default=30,
+                description="上游请求失败（不存在或故障）的结果的缓存时间（秒），避免客户端重试时反复访问上游"
+            ),
+            "allowed_repositories": ConfigField(
+                type=list,
+                default=[],
+                description="除已安装插件的仓库外，额外允许通过缓存服务访问的仓库地址"
+            ),
+            "upstream": ConfigField(
+                type=str,
+                default="",
+                description="上游缓存服务地址（如 http://192.168.1.10:8790），填写后本实例的所有检查和下载都通过它进行"
+            ),
+            "token": ConfigField(
+                type=str,
+                default="",
+                description="缓存服务的访问令牌，服务端和客户端需填写相同的值（开启服务时必须设置）"
+            )
+        },
+        "cache": {
+            "enabled": ConfigField(
+                type=bool,
+                default=True,
+                description="是否启用本机多进程共享缓存（远程版本、ETag、下载的文件）"
+            ),
+            "dir": ConfigField(
+                type=str,
+                default="",
+                description="共享缓存目录，同一主机上的多个实例需填写相同的路径；留空使用当前用户的缓存目录（~/.cache/maibot_plugin_manager）"
+            ),
+            "version_ttl_seconds": ConfigField(
+                type=int,
+                default=120,
+                description="远程版本号的缓存时间（秒）"
+            )
+        },
+        "registry": {
+            "index_url": ConfigField(
+                type=str,
+                default="",
+                description="插件索引地址（http(s):// 或 file://），收录的插件检查时不再逐个请求仓库"
+            )
+        },
+        "webhook": {
+            "enabled": ConfigField(
+                type=bool,
+                default=False,
+                description="是否启动Webhook接收服务（需要同时配置 secret）"
+            ),
+            "host": ConfigField(
+                type=str,
+                default="127.0.0.1",
+                description="Webhook服务监听地址"
+            ),
+            "port": ConfigField(
+                type=int,
+                default=8791,
+                description="Webhook服务监听端口"
+            ),
+            "secret": ConfigField(
+                type=str,
+                default="",
+                description="GitHub Webhook 中设置的 Secret，用于校验请求签名"
+            ),
+            "auto_update": ConfigField(
+                type=bool,
+                default=False,
+                description="收到通知后是否自动更新已开启自动更新的插件"
+            ),
+            "version_ttl_seconds": ConfigField(
+                type=int,
+                default=86400,
+                description="启用Webhook时远程版本号的缓存时间（秒）"
+            )
+        },
+        "quota": {
+            "enabled": ConfigField(
+                type=bool,
+                default=True,
+                description="批量检查/更新前是否根据剩余GitHub API限额规划请求"
+            ),
+            "reserve_calls": ConfigField(
+                type=int,
+                default=5,
+                description="规划时保留不用的API请求次数"
+            )
+        },
+        "metrics": {
+            "enabled": ConfigField(
+                type=bool,
+                default=False,
+                description="是否在本地端口以 Prometheus 文本格式提供指标"
+            ),
+            "host": ConfigField(
+                type=str,
+                default="127.0.0.1",
+                description="指标服务监听地址"
+            ),
+            "port": ConfigField(
+                type=int,
+                default=8792,
+                description="指标服务监听端口"
+            )
+        },
+        "logging": {
+            "level": ConfigField(
+                type=str,
+                default="INFO",
+                description="日志级别: DEBUG / INFO / WARNING / ERROR"
+            ),
+            "json": ConfigField(
+                type=bool,
+                default=False,
+                description="是否以每行一条JSON的格式输出日志"
+            ),
+            "debug_subsystems": ConfigField(
+                type=list,
+                default=[],
+                description="单独开启调试日志的子系统: command / network / sources / cache / update / services"
+            )
+        },
+        "tracing": {
+            "enabled": ConfigField(
+                type=bool,
+                default=True,
+                description="是否记录命令执行的耗时追踪"
+            ),
+            "buffer_size": ConfigField(
+                type=int,
+                default=20,
+                description="保留的最近追踪条数"
+            )
+        },
+        "profile": {
+            "top_n": ConfigField(
+                type=int,
+                default=10,
+                description="/pm profile 报告中列出的函数和分配位置数量"
+            )
+        },
+        "transport": {
+            "mode": ConfigField(
+                type=str,
+                default="live",
+                description="HTTP传输模式：live 直连，record 直连并录制响应，replay 只从录制文件回放"
+            ),
+            "cassette": ConfigField(
+                type=str,
+                default="",
+                description="录制文件路径，留空使用插件目录下的 http_cassette.json"
+            ),
+            "latency_scale": ConfigField(
+                type=float,
+                default=1.0,
+                description="回放时录制耗时的缩放倍数，0 表示不等待"
+            )
+        },
+        "lookup": {
+            "aliases": ConfigField(
+                type=dict,
+                default={},
+                description="插件别名，别名 -> 插件名，可在 update/info/settings 中代替插件名使用"
+            ),
+            "suggestions": ConfigField(
+                type=int,
+                default=3,
+                description="找不到插件时最多给出的相近插件名数量"
+            )
+        },
+        "precompile": {
+            "enabled": ConfigField(
+                type=bool,
+                default=False,
+                description="更新时在替换插件前把 .py 预编译为字节码，编译失败则中止更新"
+            ),
+            "workers": ConfigField(
+                type=int,
+                default=0,
+                description="预编译使用的进程数，0 表示使用全部CPU核心"
+            )
+        },
+        "validation": {
+            "enabled": ConfigField(
+                type=bool,
+                default=False,
+                description="替换插件前在独立进程中检查 _manifest.json 并导入 plugin.py，失败则中止更新"
+            ),
+            "workers": ConfigField(
+                type=int,
+                default=0,
+                description="同时运行的验证进程数，0 表示使用CPU核心数"
+            ),
+            "timeout": ConfigField(
+                type=float,
+                default=30.0,
+                description="单个插件导入的超时时间（秒）"
+            ),
+            "max_import_slowdown": ConfigField(
+                type=float,
+                default=3.0,
+                description="新版本导入耗时超过当前版本的多少倍时中止更新，0 表示不比较"
+            ),
+            "min_regression_seconds": ConfigField(
+                type=float,
+                default=0.5,
+                description="导入耗时至少增加多少秒才视为变慢，避免小插件的计时抖动"
+            )
+        },
+        "reload": {
+            "after_update": ConfigField(
+                type=bool,
+                default=False,
+                description="更新成功后立即热重载插件（注销旧组件、清除模块并重新注册），无需重启MaiBot"
+            )
+        },
+        "dependencies": {
+            "enabled": ConfigField(
+                type=bool,
+                default=False,
+                description="更新后安装插件的 requirements.txt，内容未变化的跳过，所有插件合并为一次 pip 调用"
+            ),
+            "wheel_dir": ConfigField(
+                type=str,
+                default="",
+                description="本地 wheel 目录（pip --find-links），留空不使用"
+            ),
+            "no_index": ConfigField(
+                type=bool,
+                default=False,
+                description="只从本地 wheel 目录安装，不访问 PyPI（pip --no-index）"
+            ),
+            "timeout": ConfigField(
+                type=float,
+                default=600.0,
+                description="pip 安装的超时时间（秒）"
+            )
         }
     }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _configure_logging(self.get_config)
+        _ensure_background_services(self.get_config)
+
     def get_plugin_components(self) -> List[Tuple[ComponentInfo, Type]]:
         """注册插件组件"""
         return [
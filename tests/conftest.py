@@ -0,0 +1,41 @@
+"""测试公共部分 - 复用基准测试的 harness 在宿主之外加载插件管理器（src.plugin_system 使用 benchmarks/stubs 中的桩模块）"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from harness import Workspace, base_config, load_plugin_module, unload_plugin_module  # noqa: E402
+
+
+@pytest.fixture
+def workspace():
+    workspace = Workspace()
+    yield workspace
+    workspace.cleanup()
+
+
+@pytest.fixture
+def pm(workspace):
+    """工作区中加载的插件管理器模块，每个测试独立加载，模块级状态互不影响"""
+    module = load_plugin_module(workspace)
+    yield module
+    unload_plugin_module(module)
+
+
+@pytest.fixture
+def make_config():
+    """返回按 "section.key" 读取配置的 get_config，默认使用基准测试的配置"""
+    def make(**overrides):
+        config = base_config(**overrides)
+
+        def get_config(key, default=None):
+            value = config
+            for part in key.split("."):
+                if not isinstance(value, dict) or part not in value:
+                    return default
+                value = value[part]
+            return value
+        return get_config
+    return make
@@ -0,0 +1,51 @@
+"""管理员列表：config.toml 修改后从文件重新读取，文件中没有该项或无法解析时使用已加载的配置"""
+import os
+
+import pytest
+
+
+@pytest.fixture
+def authorizer(pm, tmp_path):
+    authorizer = pm.AdminAuthorizer(tmp_path / "config.toml")
+    authorizer.CONFIG_CHECK_INTERVAL = 0
+    return authorizer
+
+
+def loaded_config(key, default=None):
+    return ["9"] if key == "admin.qq_list" else default
+
+
+def write_config(authorizer, text):
+    authorizer.config_path.write_text(text, encoding="utf-8")
+    # 保证修改时间变化，不依赖文件系统的时间精度
+    stat = authorizer.config_path.stat()
+    os.utime(authorizer.config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_file_list_is_used_after_edit(authorizer):
+    write_config(authorizer, '[admin]\nqq_list = ["1", 2]\n')
+    assert authorizer.admins(loaded_config) == {"1", "2"}
+    write_config(authorizer, '[admin]\nqq_list = ["3"]\n')
+    assert authorizer.admins(loaded_config) == {"3"}
+
+
+@pytest.mark.parametrize("text", [
+    '[admin]\n# qq_list = ["1"]\n',
+    '[plugin]\nenabled = true\n',
+    '[admin\nbroken',
+    '[admin]\nqq_list = "1"\n',
+])
+def test_falls_back_to_loaded_config(authorizer, text):
+    write_config(authorizer, text)
+    assert authorizer.admins(loaded_config) == {"9"}
+
+
+def test_missing_file_uses_loaded_config(authorizer):
+    assert authorizer.admins(loaded_config) == {"9"}
+
+
+def test_disagreement_is_logged(authorizer, caplog):
+    write_config(authorizer, '[admin]\nqq_list = ["1"]\n')
+    with caplog.at_level("INFO"):
+        authorizer.admins(loaded_config)
+    assert any("与已加载的配置不同" in record.getMessage() for record in caplog.records)
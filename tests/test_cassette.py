@@ -0,0 +1,43 @@
+"""HTTP录制与回放：Token查询参数不写入录制文件，回放按同样的规则匹配"""
+import asyncio
+import json
+
+
+def test_redact_url(pm):
+    redact = pm.HttpCassette.redact_url
+    assert (redact("https://gitee.com/api/v5/repos/a/b/contents/x?ref=main&access_token=secret")
+            == "https://gitee.com/api/v5/repos/a/b/contents/x?ref=main&access_token=REDACTED")
+    assert redact("https://gitlab.com/api/v4/x?private_token=secret&Token=t") == \
+        "https://gitlab.com/api/v4/x?private_token=REDACTED&Token=REDACTED"
+    assert redact("https://api.github.com/repos/a/b") == "https://api.github.com/repos/a/b"
+
+
+def test_request_key_ignores_token_and_keeps_range(pm):
+    key = pm.HttpCassette.request_key
+    assert key("https://x/y?access_token=one", None) == key("https://x/y?access_token=two", {})
+    assert key("https://x/y", {'Range': "bytes=10-"}) == "GET https://x/y [bytes=10-]"
+
+
+def test_recorded_file_contains_no_token_and_replays(pm, tmp_path):
+    path = tmp_path / "cassette.json"
+    cassette = pm.HttpCassette(path)
+    url = "https://gitee.com/api/v5/repos/a/b?access_token=secret"
+    cassette.record(pm.HttpCassette.request_key(url, None), pm.HttpCassette.redact_url(url),
+                    200, [("Content-Type", "application/json")], b'{"ok": 1}', 0.01)
+    cassette.save()
+    assert "secret" not in path.read_text(encoding="utf-8")
+
+    replay = pm.ReplaySession(pm.HttpCassette(path), latency_scale=0)
+    response = asyncio.run(replay.get("https://gitee.com/api/v5/repos/a/b?access_token=other-token"))
+    assert response.status == 200
+    assert json.loads(asyncio.run(response.read())) == {"ok": 1}
+
+
+def test_replay_miss_raises(pm, tmp_path):
+    replay = pm.ReplaySession(pm.HttpCassette(tmp_path / "empty.json"), latency_scale=0)
+    try:
+        asyncio.run(replay.get("https://x/missing"))
+    except pm.CassetteMiss:
+        pass
+    else:
+        raise AssertionError("未录制的请求应当失败")
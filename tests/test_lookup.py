@@ -0,0 +1,32 @@
+"""插件名查找与相近名称建议"""
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture
+def index(pm):
+    records = [pm.PluginRecord(name, "1.0.0", "", directory, Path(directory))
+               for name, directory in [("海龟汤", "turtle_soup"), ("TTS语音插件", "tts_voice"),
+                                       ("Weather", "weather_plugin"), ("WeatherAlert", "weather_alert")]]
+    return pm.PluginIndex(records, aliases={"海龟": "海龟汤", "Weather": "TTS语音插件", "ghost": "不存在"})
+
+
+def test_get_by_name_directory_and_alias(index):
+    assert index.get("海龟汤").directory_name == "turtle_soup"
+    assert index.get("  TURTLE_SOUP ").name == "海龟汤"
+    assert index.get("tts语音插件").name == "TTS语音插件"
+    assert index.get("海龟").name == "海龟汤"
+    assert index.get("missing") is None
+
+
+def test_alias_does_not_shadow_plugin_name(index):
+    assert index.get("weather").name == "Weather"
+    assert index.get("ghost") is None
+
+
+def test_suggest(index):
+    assert index.suggest("海龟唐")[0] == "海龟汤"
+    assert index.suggest("wether") == ["Weather", "WeatherAlert"]
+    assert index.suggest("weather", limit=1) == ["Weather"]
+    assert index.suggest("zzzzzz") == []
@@ -0,0 +1,78 @@
+"""离线镜像：裸git仓库中的非ASCII文件名、按版本命名的归档"""
+import asyncio
+import json
+import shutil
+import subprocess
+import zipfile
+
+import pytest
+
+URL = "https://github.com/o/tool"
+
+
+def git(*args):
+    subprocess.run(["git", *args], check=True, capture_output=True)
+
+
+@pytest.fixture
+def bare_mirror(tmp_path):
+    if not shutil.which("git"):
+        pytest.skip("需要git")
+    work = tmp_path / "work"
+    (work / "sub").mkdir(parents=True)
+    (work / "_manifest.json").write_text(json.dumps({'name': "Tool", 'version': "1.1.0", 'repository_url': URL}),
+                                         encoding="utf-8")
+    (work / "plugin.py").write_text("from . import 工具\n", encoding="utf-8")
+    (work / "工具.py").write_text("X = 2\n", encoding="utf-8")
+    (work / "sub" / "数据.txt").write_text("data\n", encoding="utf-8")
+    git("init", "-q", str(work))
+    git("-C", str(work), "add", ".")
+    git("-C", str(work), "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init")
+    mirror = tmp_path / "mirror"
+    (mirror / "o").mkdir(parents=True)
+    git("clone", "-q", "--bare", str(work), str(mirror / "o" / "tool.git"))
+    return mirror
+
+
+def mirror_provider(pm, make_config, mirror):
+    provider = pm.get_source_provider(URL, make_config(offline={'enabled': True, 'mirror_dir': str(mirror)}))
+    assert isinstance(provider, pm.LocalMirrorProvider)
+    return provider
+
+
+def test_bare_repo_lists_and_fetches_non_ascii_files(pm, make_config, bare_mirror, tmp_path):
+    provider = mirror_provider(pm, make_config, bare_mirror)
+    repo = provider.parse_repository(URL)
+
+    async def run():
+        assert await provider.resolve_version(repo) == "1.1.0"
+        root = {entry['name']: entry for entry in await provider.list_tree(repo)}
+        sub = await provider.list_tree(repo, "sub")
+        target = tmp_path / "out"
+        target.mkdir()
+        budget = pm.DownloadBudget(max_file_bytes=0, max_total_bytes=0)
+        assert await provider.fetch_file(root["工具.py"], target, budget)
+        return root, sub, target
+
+    root, sub, target = asyncio.run(run())
+    assert set(root) == {"_manifest.json", "plugin.py", "工具.py", "sub"}
+    assert root["sub"]['type'] == "dir"
+    assert root["工具.py"]['size'] == len("X = 2\n")
+    assert [entry['path'] for entry in sub] == ["sub/数据.txt"]
+    assert (target / "工具.py").read_text(encoding="utf-8") == "X = 2\n"
+
+
+def test_latest_archive_follows_version_order(pm, make_config, tmp_path):
+    mirror = tmp_path / "mirror"
+    archive_dir = mirror / "o" / "tool"
+    archive_dir.mkdir(parents=True)
+    for version in ["1.2.0-beta", "1.10.0", "1.2.0", "notes", "1.9.9"]:
+        with zipfile.ZipFile(archive_dir / f"{version}.zip", "w") as zf:
+            zf.writestr("tool-main/plugin.py", f"# {version}\n")
+    provider = mirror_provider(pm, make_config, mirror)
+    repo = provider.parse_repository(URL)
+
+    assert provider._latest_archive(repo).stem == "1.10.0"
+    assert asyncio.run(provider.resolve_version(repo)) == "1.10.0"
+    names = sorted(["1.2.0", "notes", "1.2.0-beta", "1.10.0"], key=pm.LocalMirrorProvider._archive_version_key)
+    assert names == ["notes", "1.2.0-beta", "1.2.0", "1.10.0"]
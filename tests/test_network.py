@@ -0,0 +1,100 @@
+"""重试策略与下载预算"""
+import asyncio
+import time
+from email.utils import formatdate
+
+import aiohttp
+import pytest
+
+
+class FakeResponse:
+    def __init__(self, status, headers=None, body=""):
+        self.status = status
+        self.headers = headers or {}
+        self.body = body
+
+    async def text(self):
+        return self.body
+
+
+@pytest.fixture
+def policy(pm):
+    return pm.RetryPolicy()
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (asyncio.TimeoutError(), "timeout"),
+    (ConnectionResetError(), "connection_reset"),
+    (aiohttp.ServerDisconnectedError(), "connection_reset"),
+    (ValueError("bad json"), None),
+])
+def test_classify_exception(policy, exc, expected):
+    assert policy.classify_exception(exc) == expected
+
+
+@pytest.mark.parametrize("status, headers, body, expected", [
+    (200, {}, "", None),
+    (404, {}, "", None),
+    (502, {}, "", "server_error"),
+    (503, {}, "", "server_error"),
+    (429, {}, "", "secondary_rate_limit"),
+    (403, {'Retry-After': "5"}, "", "secondary_rate_limit"),
+    (403, {}, "You have exceeded a secondary rate limit", "secondary_rate_limit"),
+    (403, {}, "Resource not accessible by integration", None),
+])
+def test_classify_response(policy, status, headers, body, expected):
+    assert asyncio.run(policy.classify_response(FakeResponse(status, headers, body))) == expected
+
+
+def test_exhausted_primary_quota_retries_only_when_reset_is_near(policy):
+    near = {'X-RateLimit-Remaining': "0", 'X-RateLimit-Reset': str(time.time() + 10)}
+    far = {'X-RateLimit-Remaining': "0", 'X-RateLimit-Reset': str(time.time() + 3600)}
+    assert asyncio.run(policy.classify_response(FakeResponse(403, near))) == "secondary_rate_limit"
+    assert asyncio.run(policy.classify_response(FakeResponse(403, far))) is None
+
+
+def test_parse_retry_after(policy):
+    assert policy.parse_retry_after({'Retry-After': "12"}) == 12.0
+    assert policy.parse_retry_after({'Retry-After': "-3"}) == 0.0
+    assert 25 < policy.parse_retry_after({'Retry-After': formatdate(time.time() + 30, usegmt=True)}) <= 30
+    assert policy.parse_retry_after({'Retry-After': "soon"}) is None
+    assert policy.parse_retry_after({}) is None
+
+
+def test_compute_delay_is_capped_exponential_backoff(policy):
+    attempts, base, cap = policy.rules["server_error"]
+    for attempt in range(1, 10):
+        assert 0 <= policy.compute_delay("server_error", attempt) <= min(cap, base * 2 ** (attempt - 1))
+
+
+def test_compute_delay_honours_retry_after(policy):
+    _, base, cap = policy.rules["secondary_rate_limit"]
+    assert 40 <= policy.compute_delay("secondary_rate_limit", 1, {'Retry-After': "40"}) <= 40 + base
+    assert policy.compute_delay("secondary_rate_limit", 1, {'Retry-After': str(cap + 1)}) is None
+
+
+def test_custom_rules_and_unknown_class(pm):
+    policy = pm.RetryPolicy({"timeout": (1, 0.0, 0.0)})
+    assert policy.max_attempts("timeout") == 1
+    assert policy.max_attempts("server_error") == pm.RetryPolicy.DEFAULT_RULES["server_error"][0]
+    assert policy.max_attempts("unknown") == 1
+
+
+def test_download_budget_limits_single_file(pm):
+    budget = pm.DownloadBudget(max_file_bytes=100, max_total_bytes=0)
+    budget.check_file_size("small.py", 100)
+    budget.check_file_size("unknown.py", None)
+    with pytest.raises(pm.DownloadSizeExceeded, match="big.py"):
+        budget.check_file_size("big.py", 101)
+    with pytest.raises(pm.DownloadSizeExceeded, match="stream.py"):
+        budget.consume("stream.py", 150, 150)
+
+
+def test_download_budget_limits_total_and_release(pm):
+    budget = pm.DownloadBudget(max_file_bytes=0, max_total_bytes=100)
+    budget.consume("a.py", 60, 60)
+    budget.release(60)
+    assert budget.used_bytes == 0
+    budget.consume("a.py", 60, 60)
+    with pytest.raises(pm.DownloadSizeExceeded, match="b.py.*100"):
+        budget.consume("b.py", 41, 41)
@@ -0,0 +1,50 @@
+"""插件索引客户端：条件请求在未启用共享缓存时也生效，且不再作为插件源提供者"""
+import asyncio
+import json
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+INDEX = {'format_version': 1, 'plugins': [
+    {'name': "A", 'repository_url': "https://github.com/Owner/A.git", 'version': "1.2.0"},
+    {'name': "B", 'repository_url': "https://github.com/owner/b", 'version': ""},
+]}
+
+
+def test_conditional_requests_without_shared_cache(pm, make_config):
+    requests = []
+
+    async def handle(request):
+        requests.append(request.headers.get('If-None-Match'))
+        if request.headers.get('If-None-Match') == '"v1"':
+            return web.Response(status=304, headers={'ETag': '"v1"'})
+        return web.json_response(INDEX, headers={'ETag': '"v1"'})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/index.json", handle)
+        async with TestServer(app) as server:
+            client = pm.RegistryIndexClient()
+            get_config = make_config(cache={'enabled': False})
+            url = str(server.make_url("/index.json"))
+            first = await client.load(url, get_config)
+            second = await client.load(url, get_config)
+            await client._http.close()
+            return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert list(first) == ["https://github.com/owner/a"]
+    assert requests == [None, '"v1"']
+
+
+def test_local_index_file(pm, make_config, tmp_path):
+    index_file = tmp_path / "registry_index.json"
+    index_file.write_text(json.dumps(INDEX), encoding="utf-8")
+    index = asyncio.run(pm.RegistryIndexClient().load(index_file.as_uri(), make_config()))
+    assert index["https://github.com/owner/a"]['version'] == "1.2.0"
+
+
+def test_registry_scheme_is_not_a_source_provider(pm, make_config):
+    assert pm.get_source_provider("registry://index", make_config()) is None
+    assert not isinstance(pm.RegistryIndexClient(), pm.SourceProvider)
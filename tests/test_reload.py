@@ -0,0 +1,46 @@
+"""热重载：reload_plugin_directory 之后宿主注册表中的实例和辅助模块都来自新代码"""
+import asyncio
+import sys
+
+import pytest
+
+from harness import StubPluginRegistry
+
+
+def plugin_files(version):
+    return {
+        "helper.py": f"VERSION = {version}\n".encode("utf-8"),
+        "plugin.py": (
+            "from src.plugin_system import BasePlugin, register_plugin\n"
+            "from . import helper\n\n"
+            "@register_plugin\n"
+            "class ReloadPlugin(BasePlugin):\n"
+            "    plugin_name = 'reload_plugin'\n"
+            "    VERSION = helper.VERSION\n\n"
+            "    def get_plugin_components(self):\n"
+            "        return []\n"
+        ).encode("utf-8"),
+    }
+
+
+@pytest.fixture
+def registry(pm, workspace):
+    registry = StubPluginRegistry(workspace.plugins_dir)
+    pm.PLUGIN_REGISTRY = registry
+    yield registry
+    for name in [name for name in sys.modules if name.startswith(registry.PACKAGE)]:
+        del sys.modules[name]
+
+
+def test_reload_picks_up_new_code(pm, workspace, registry):
+    plugin_dir = workspace.add_plugin("reload_plugin", "ReloadPlugin", "1.0.0", "", plugin_files(1))
+    asyncio.run(registry.load(plugin_dir))
+    assert registry.instances["reload_plugin"].VERSION == 1
+
+    for name, content in plugin_files(2).items():
+        (plugin_dir / name).write_bytes(content)
+    elapsed = asyncio.run(pm.reload_plugin_directory(registry, plugin_dir))
+
+    assert elapsed >= 0
+    assert registry.instances["reload_plugin"].VERSION == 2
+    assert sys.modules[f"{registry.PACKAGE}.reload_plugin.helper"].VERSION == 2
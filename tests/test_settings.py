@@ -0,0 +1,26 @@
+"""插件设置文件：列出插件时只读取一次"""
+import asyncio
+import json
+
+from harness import base_config, run_command
+
+
+def test_list_reads_settings_once(pm, workspace, monkeypatch):
+    for i in range(5):
+        workspace.add_plugin(f"plugin_{i}", f"Plugin{i}")
+    settings_file = workspace.manager_dir / "plugin_settings.json"
+    settings_file.write_text(json.dumps({'auto_update': {'Plugin1': True}}), encoding="utf-8")
+    loads = []
+    original = pm.PluginManagerCommand._load_settings
+
+    def counting_load(self):
+        loads.append(1)
+        return original(self)
+    monkeypatch.setattr(pm.PluginManagerCommand, "_load_settings", counting_load)
+
+    (ok, _, _), sent = asyncio.run(run_command(pm, "/pm list", base_config()))
+
+    assert ok
+    assert len(loads) == 1
+    assert "Plugin1 v1.0.0 🟢 最新 ✅" in sent[-1]
+    assert "Plugin2 v1.0.0 🟢 最新 ❌" in sent[-1]
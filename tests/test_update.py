@@ -0,0 +1,73 @@
+"""暂存更新：超出下载预算时取消其余下载，任何文件下载失败都不替换插件"""
+import asyncio
+
+import pytest
+
+
+class FakeProvider:
+    name = "fake"
+
+    def __init__(self, pm, behaviours):
+        self.pm = pm
+        self.behaviours = behaviours
+        self.cancelled = []
+
+    async def fetch_file(self, entry, temp_path, budget):
+        behaviour = self.behaviours[entry['name']]
+        if behaviour == "too_large":
+            await asyncio.sleep(0.01)
+            raise self.pm.DownloadSizeExceeded(f"文件 {entry['name']} 超过单文件上限")
+        if behaviour == "slow":
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                self.cancelled.append(entry['name'])
+                raise
+        if behaviour == "fail":
+            return False
+        (temp_path / entry['name']).write_text("x = 1\n", encoding="utf-8")
+        return True
+
+
+@pytest.fixture
+def stage(pm, workspace, make_config, tmp_path):
+    plugin_dir = workspace.add_plugin("target", "Target", repository_url="https://github.com/owner/target")
+    plugin = pm.PluginRecord("Target", "1.0.0", "https://github.com/owner/target", "target", plugin_dir)
+    command = pm._create_background_command(make_config())
+
+    def run(behaviours):
+        provider = FakeProvider(pm, behaviours)
+        files = [{'name': name, 'path': name, 'type': 'file', 'download_url': f"fake://{name}"}
+                 for name in behaviours]
+        command._get_source_provider = lambda url: (provider, pm.RepositoryRef(url, "github.com", "owner", "target"))
+
+        async def list_plugin_files(provider, repo):
+            return files
+        command._list_plugin_files = list_plugin_files
+        staged = tmp_path / "staged"
+        staged.mkdir(exist_ok=True)
+        ok = asyncio.run(asyncio.wait_for(command._stage_plugin_update(plugin, staged), 10))
+        return ok, provider
+    return plugin, run
+
+
+def test_size_cap_cancels_remaining_downloads(stage):
+    plugin, run = stage
+    ok, provider = run({'_manifest.json': "ok", 'plugin.py': "too_large", 'a.py': "slow", 'b.py': "slow"})
+    assert not ok
+    assert "plugin.py" in plugin.update_error
+    assert sorted(provider.cancelled) == ["a.py", "b.py"]
+
+
+def test_failed_file_aborts_update(stage):
+    plugin, run = stage
+    ok, _ = run({'_manifest.json': "ok", 'plugin.py': "ok", '工具.py': "fail"})
+    assert not ok
+    assert plugin.update_error == "下载失败: 工具.py"
+
+
+def test_all_files_downloaded(stage):
+    plugin, run = stage
+    ok, _ = run({'_manifest.json': "ok", 'plugin.py': "ok"})
+    assert ok
+    assert plugin.update_error is None
@@ -0,0 +1,54 @@
+"""版本号解析与比较"""
+import doctest
+
+import pytest
+
+
+@pytest.mark.parametrize("lower, higher", [
+    ("1.2.0-1", "1.2.0"),
+    ("1.2.0-beta.1", "1.2.0"),
+    ("1.2.0beta1", "1.2.0rc1"),
+    ("1.2.0-beta.2", "1.2.0-beta.10"),
+    ("1.2.0-1", "1.2.0-alpha"),
+    ("1.2.0", "1.2.0.post1"),
+    ("1.2.0.post1", "1.2.0.post2"),
+    ("1.2.0.post9", "1.2.1-beta"),
+    ("1.2.0", "1.10.0"),
+    ("v0.9", "1.0"),
+])
+def test_ordering(pm, lower, higher):
+    assert pm.parse_version(lower) < pm.parse_version(higher)
+    assert pm.compare_versions(lower, higher) == 1
+    assert pm.remote_is_newer(lower, higher)
+    assert not pm.remote_is_newer(higher, lower)
+
+
+@pytest.mark.parametrize("left, right", [
+    ("1.2", "1.2.0"),
+    ("v1.2.0", "1.2.0"),
+    ("1.2.0+build5", "1.2.0"),
+    ("1.2.0beta1", "1.2.0-beta.1"),
+    ("1.2.0.post", "1.2.0.post0"),
+    ("1.2.0-r1", "1.2.0.post1"),
+])
+def test_equivalent_forms(pm, left, right):
+    assert pm.parse_version(left) == pm.parse_version(right)
+
+
+def test_unparseable_versions_fall_back_to_string_comparison(pm):
+    assert pm.parse_version("latest") is None
+    assert pm.compare_versions("latest", "1.0.0") is None
+    assert pm.remote_is_newer("latest", "nightly")
+    assert not pm.remote_is_newer("latest", "latest")
+    assert not pm.remote_is_newer("1.0.0", None)
+
+
+def test_remote_pre_release_is_not_an_upgrade(pm):
+    assert not pm.remote_is_newer("1.2.0", "1.2.0-1")
+    assert pm.remote_is_older("1.2.0", "1.2.0-1")
+
+
+def test_docstring_examples(pm):
+    failures, attempted = doctest.testmod(pm, verbose=False, report=False)
+    assert attempted > 0
+    assert failures == 0
@@ -0,0 +1,111 @@
+"""Webhook接收服务：签名校验、按插件跟踪的分支匹配 push 事件、远程版本缓存失效"""
+import asyncio
+import hashlib
+import hmac
+import json
+
+import pytest
+
+SECRET = "test-secret"
+
+
+class FakeRequest:
+    def __init__(self, payload, event="push", secret=SECRET):
+        self.body = json.dumps(payload).encode("utf-8")
+        signature = hmac.new(secret.encode("utf-8"), self.body, hashlib.sha256).hexdigest()
+        self.headers = {"X-GitHub-Event": event, "X-Hub-Signature-256": f"sha256={signature}"}
+
+    async def read(self):
+        return self.body
+
+
+def push_payload(ref, repository="owner/repo"):
+    return {
+        "ref": ref,
+        "repository": {"full_name": repository, "default_branch": "main",
+                       "html_url": f"https://github.com/{repository}",
+                       "clone_url": f"https://github.com/{repository}.git"},
+    }
+
+
+@pytest.fixture
+def receiver(pm, workspace, make_config, tmp_path):
+    workspace.add_plugin("default_plugin", "DefaultPlugin", repository_url="https://github.com/owner/repo")
+    workspace.add_plugin("dev_plugin", "DevPlugin", repository_url="https://github.com/owner/repo/tree/dev")
+    get_config = make_config(webhook={'secret': SECRET}, cache={'enabled': True, 'dir': str(tmp_path / "cache")},
+                             network={'mirrors': ["https://mirror.example/{raw_url}"]})
+    receiver = pm.WebhookReceiver(get_config)
+    receiver._queue = asyncio.Queue()
+    return receiver
+
+
+def handle(receiver, request):
+    response = asyncio.run(receiver._handle_webhook(request))
+    return response.status, json.loads(response.body)
+
+
+def test_push_to_tracked_branch_invalidates_cached_version(pm, receiver):
+    cache = pm.get_shared_cache(receiver.get_config)
+    provider = pm.get_source_provider("https://github.com/owner/repo", receiver.get_config)
+    cache.write_json("versions", f"{provider.name}:https://github.com/owner/repo", {'version': "1.0.0"})
+
+    status, body = handle(receiver, FakeRequest(push_payload("refs/heads/main")))
+
+    assert status == 200
+    assert body['matched'] == ["DefaultPlugin"]
+    assert cache.read_json("versions", f"{provider.name}:https://github.com/owner/repo") is None
+    assert "https://github.com/owner/repo" in pm._STALE_REPOSITORIES
+    assert receiver._queue.get_nowait() == ("DefaultPlugin", False)
+
+
+def test_push_to_pinned_branch_matches_only_that_plugin(pm, receiver):
+    status, body = handle(receiver, FakeRequest(push_payload("refs/heads/dev")))
+
+    assert status == 200
+    assert body['matched'] == ["DevPlugin"]
+    assert pm._STALE_REPOSITORIES == {"https://github.com/owner/repo/tree/dev"}
+
+
+def test_push_to_untracked_branch_is_ignored(pm, receiver):
+    status, body = handle(receiver, FakeRequest(push_payload("refs/heads/feature")))
+
+    assert status == 200
+    assert body['status'] == "ignored"
+    assert not pm._STALE_REPOSITORIES
+    assert receiver._queue.empty()
+
+
+def test_bad_signature_is_rejected(pm, receiver):
+    with pytest.raises(pm.web.HTTPUnauthorized):
+        asyncio.run(receiver._handle_webhook(FakeRequest(push_payload("refs/heads/main"), secret="wrong")))
+    assert not pm._STALE_REPOSITORIES
+
+
+def test_verify_signature(receiver):
+    body = b'{"zen": "ok"}'
+    signature = hmac.new(SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    assert receiver._verify_signature(body, f"sha256={signature}")
+    assert not receiver._verify_signature(body, signature)
+    assert not receiver._verify_signature(body + b" ", f"sha256={signature}")
+
+
+def test_stale_repository_is_checked_without_index_cache_or_mirrors(pm, receiver, monkeypatch):
+    url = "https://github.com/owner/repo"
+    provider = pm.get_source_provider(url, receiver.get_config)
+    seen = []
+
+    async def resolve_version(repo):
+        seen.append((pm._BYPASS_MIRRORS.get(), provider._get_mirror_templates()))
+        return "2.0.0"
+    monkeypatch.setattr(provider, "resolve_version", resolve_version)
+    assert provider._get_mirror_templates()
+    cache = pm.get_shared_cache(receiver.get_config)
+    cache.write_json("versions", f"{provider.name}:{url}", {'version': "1.0.0"})
+    command = pm._create_background_command(receiver.get_config)
+    command._registry_index = {pm.normalize_repository_url(url): {'version': "1.0.0"}}
+    pm._STALE_REPOSITORIES.add(url)
+
+    assert asyncio.run(command._get_remote_version(url)) == "2.0.0"
+    assert seen == [(True, [])]
+    assert url not in pm._STALE_REPOSITORIES
+    assert cache.read_json("versions", f"{provider.name}:{url}") == {'version': "2.0.0"}